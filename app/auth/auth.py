@@ -1,15 +1,25 @@
 # auth.py
 from fastapi import Depends, status, Request
 from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from app.models import User
 from app.db import get_db
 import os
 from platformdirs import user_data_dir
+import asyncio
+import hashlib
+import hmac
 import json
 import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 
 data_dir = user_data_dir("atlasserver", "AtlasServer-Core")
 os.makedirs(data_dir, exist_ok=True)
@@ -21,10 +31,140 @@ SESSIONMIDDLEWARE_FILE = os.path.join(data_dir, "sessionmiddleware.json")
 
 ROTATION_DAYS = 7
 
+# Segundos que se reutiliza un usuario leído de la base de datos; cubre los
+# cambios hechos fuera de este proceso (CLI, otra instancia del panel)
+AUTH_CACHE_TTL = 30.0
+
+
+class UserCache:
+    """
+    Caché en memoria de los usuarios que se consultan en cada petición
+    (middleware de autenticación y login_required) y de si ya existe algún
+    usuario. Guarda copias desacopladas de cualquier sesión; los cambios en
+    la tabla users hechos con el ORM en este proceso la invalidan al momento.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL):
+        self.ttl = ttl
+        self._users: Dict[int, Tuple[float, User]] = {}
+        self._first_run: Optional[Tuple[float, bool]] = None
+        self._lock = threading.Lock()
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put_user(self, user: User) -> User:
+        """Guarda una copia desacoplada de `user` y la devuelve."""
+        copy = User(**{attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs})
+        # Con clave de identidad, para poder adjuntarla a una sesión con merge(load=False)
+        make_transient_to_detached(copy)
+        with self._lock:
+            self._users[user.id] = (time.monotonic() + self.ttl, copy)
+        return copy
+
+    def get_first_run(self) -> Optional[bool]:
+        entry = self._first_run
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put_first_run(self, value: bool):
+        self._first_run = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self._first_run = None
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_cache(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
 # Función para verificar contraseña
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# bcrypt tarda unos 250 ms por comprobación: se hacen en un pool propio con
+# pocos hilos para no bloquear el event loop ni acaparar el pool de Starlette
+PASSWORD_WORKERS = 2
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+
+# Segundos que se da por buena una credencial Basic ya verificada y entradas como máximo
+CREDENTIAL_CACHE_TTL = 60.0
+CREDENTIAL_CACHE_SIZE = 256
+
+
+class CredentialCache:
+    """
+    Credenciales Basic verificadas hace poco, para que /docs, /redoc y las
+    peticiones que hacen a continuación no repitan bcrypt. Solo se guarda un
+    HMAC de usuario, contraseña y hash almacenado con una clave aleatoria del
+    proceso: la contraseña no queda en memoria y al cambiarla la entrada deja
+    de coincidir.
+    """
+
+    def __init__(self, ttl: float = CREDENTIAL_CACHE_TTL, max_entries: int = CREDENTIAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, username: str, password: str, hashed_password: str) -> bytes:
+        message = "\0".join((username, password, hashed_password)).encode("utf-8", errors="surrogatepass")
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, username: str, password: str, hashed_password: str) -> bool:
+        digest = self._digest(username, password, hashed_password)
+        with self._lock:
+            expires = self._entries.get(digest)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[digest]
+                return False
+            return True
+
+    def add(self, username: str, password: str, hashed_password: str):
+        digest = self._digest(username, password, hashed_password)
+        with self._lock:
+            self._entries[digest] = time.monotonic() + self.ttl
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+credential_cache = CredentialCache()
+
+
+async def verify_password_async(plain_password, hashed_password, username: str = ""):
+    """verify_password para rutas async: usa la caché de credenciales y, si no, el pool de bcrypt."""
+    if credential_cache.check(username, plain_password, hashed_password):
+        return True
+    verified = await asyncio.get_running_loop().run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password
+    )
+    if verified:
+        credential_cache.add(username, plain_password, hashed_password)
+    return verified
+
 # Función para generar hash de contraseña
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -49,19 +189,38 @@ def create_user(db: Session, username: str, password: str, is_admin: bool = Fals
     db.refresh(db_user)
     return db_user
 
+# Función para obtener un usuario por id, de la caché o de la base de datos.
+# Devuelve una copia sin sesión: sirve para leer, no para modificar
+def get_cached_user(db: Session, user_id: int) -> Optional[User]:
+    user = user_cache.get_user(user_id)
+    if user is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            user = user_cache.put_user(user)
+    return user
+
 # Función para obtener el usuario actual desde la sesión
 def get_current_user(request: Request, db: Session = Depends(get_db)):
     user_id = request.session.get("user_id")
     if user_id is None:
         return None
     
-    user = db.query(User).filter(User.id == user_id).first()
-    return user
+    user = get_cached_user(db, user_id)
+    if user is None:
+        return None
+    # Adjuntar la copia a la sesión de la petición sin consultar la base de
+    # datos, para que la ruta pueda modificarla y hacer commit
+    return db.merge(user, load=False)
 
 # Middleware para verificar si el usuario está autenticado
 async def login_required(request: Request, db: Session = Depends(get_db)):
     try:
-        user = get_current_user(request, db)
+        user_id = request.session.get("user_id")
+        if user_id is not None and user_cache.get_user(user_id) is None:
+            # Sin caché hay que consultar la base de datos: fuera del event loop
+            user = await run_in_threadpool(get_current_user, request, db)
+        else:
+            user = get_current_user(request, db)
         if user is None:
             # Usar la redirección asíncrona y forzar la redirección
             return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
@@ -73,7 +232,11 @@ async def login_required(request: Request, db: Session = Depends(get_db)):
 
 # Función para verificar si es la primera ejecución
 def is_first_run(db: Session):
-    return db.query(User).count() == 0
+    first_run = user_cache.get_first_run()
+    if first_run is None:
+        first_run = db.query(User.id).first() is None
+        user_cache.put_first_run(first_run)
+    return first_run
 
 # Función para verificar si el registro está abierto
 def is_registration_open(db: Session):
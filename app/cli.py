@@ -1,13 +1,15 @@
 #!/usr/bin/env python
 # app/cli.py
+import asyncio
 import click
 import os
 import subprocess
 import time
 import psutil
 from app.models import Application
-from app.db import get_db
-from app.services import ProcessManager
+from app.db import get_db, init_db
+from app.services import ProcessManager, LifecycleEngine, select_applications, DEFAULT_CONCURRENCY, load_metrics_snapshot, SERVER_KEY, APP_SERVERS, normalize_worker_setting, rotation_settings
+from app.configs import load_server_config
 from platformdirs import user_data_dir
 
 data_dir = user_data_dir("atlasserver", "AtlasServer-Core")
@@ -16,6 +18,12 @@ os.makedirs(data_dir, exist_ok=True)
 # Definir la ruta completa del archivo PID
 SERVER_PID_FILE = os.path.join(data_dir, "atlas_server.pid")
 
+def get_precomputed_sample(key):
+    """Última muestra del muestreador del panel, o None si no hay una reciente."""
+    interval = float(load_server_config().get("metrics_interval", 5))
+    return load_metrics_snapshot(max_age=interval * 3).get(str(key))
+
+
 def get_server_pid():
     """Obtiene el PID del servidor si está en ejecución"""
     if os.path.exists(SERVER_PID_FILE):
@@ -37,7 +45,7 @@ def get_server_pid():
 @click.group()
 def cli():
     """AtlasServer - CLI for managing the server and applications."""
-    pass
+    init_db()
 
 
 @cli.command("start")
@@ -121,8 +129,14 @@ def server_status():
     if pid:
         try:
             process = psutil.Process(pid)
-            mem = process.memory_info().rss / (1024 * 1024)
-            cpu = process.cpu_percent(interval=0.1)
+            # Preferir la muestra del panel; medir aquí bloquea 0.1 s
+            sample = get_precomputed_sample(SERVER_KEY)
+            if sample:
+                mem = sample["rss_bytes"] / (1024 * 1024)
+                cpu = sample["cpu_percent"]
+            else:
+                mem = process.memory_info().rss / (1024 * 1024)
+                cpu = process.cpu_percent(interval=0.1)
             
             click.echo(f"✅ AtlasServer is running")
             click.echo(f"   PID: {pid}")
@@ -166,10 +180,69 @@ def list_apps():
         db.close()
 
 
+def bulk_options(func):
+    """Opciones comunes para operar sobre varias aplicaciones a la vez."""
+    func = click.option("--concurrency", default=DEFAULT_CONCURRENCY, show_default=True, help="Maximum number of applications processed in parallel")(func)
+    func = click.option("--status", "status_filter", default=None, help="Only applications with this status (running, stopped, error)")(func)
+    func = click.option("--name", "name_pattern", default=None, help="Only applications whose name matches this pattern (e.g. 'api-*')")(func)
+    func = click.option("--all", "all_apps", is_flag=True, help="Apply to all registered applications")(func)
+    return click.argument("app_id", type=int, required=False)(func)
+
+
+def run_bulk_action(action, all_apps, name_pattern, status_filter, concurrency):
+    """Ejecuta una operación sobre varias aplicaciones en paralelo y muestra el resultado de cada una."""
+    db = next(get_db())
+    try:
+        apps = select_applications(db, all_apps=all_apps, name=name_pattern, status=status_filter)
+        names = {a.id: a.name for a in apps}
+    finally:
+        db.close()
+
+    if not names:
+        click.echo("⚠️ No applications match the selection")
+        return
+
+    concurrency = max(1, concurrency)
+    click.echo(f"🚀 Running '{action}' on {len(names)} applications (concurrency: {concurrency})...")
+
+    async def run():
+        engine = LifecycleEngine(max_workers=concurrency)
+        batch = engine.submit_batch(action, list(names), concurrency)
+        await engine.wait_batch(batch.id)
+        await engine.shutdown()
+        return batch.to_dict()
+
+    summary = asyncio.run(run())
+
+    for result in summary["results"]:
+        icon = "✅" if result["status"] == "succeeded" else "❌"
+        duration = f"{result['duration_ms']:.0f} ms" if result["duration_ms"] is not None else "N/A"
+        line = f"{icon} {result['app_id']} | {names[result['app_id']]} | {result['status']} | {duration}"
+        if result["error"]:
+            line += f" | {result['error']}"
+        click.echo(line)
+
+    click.echo(f"\n⏱️  {summary['succeeded']} succeeded, {summary['failed']} failed in {summary['wall_time_ms'] / 1000:.2f} s")
+
+
+def resolve_bulk(app_id, all_apps, name_pattern, status_filter):
+    """Devuelve True si se pidió una operación masiva; aborta si la combinación no es válida."""
+    is_bulk = bool(all_apps or name_pattern or status_filter)
+    if is_bulk and app_id is not None:
+        raise click.UsageError("Use either APP_ID or --all/--name/--status, not both")
+    if not is_bulk and app_id is None:
+        raise click.UsageError("Missing APP_ID (or use --all/--name/--status)")
+    return is_bulk
+
+
 @app.command("start")
-@click.argument("app_id", type=int)
-def start_app(app_id):
-    """Iniciar una aplicación específica."""
+@bulk_options
+def start_app(app_id, all_apps, name_pattern, status_filter, concurrency):
+    """Iniciar una aplicación específica o varias en paralelo."""
+    if resolve_bulk(app_id, all_apps, name_pattern, status_filter):
+        run_bulk_action("start", all_apps, name_pattern, status_filter, concurrency)
+        return
+
     db = next(get_db())
     try:
         process_manager = ProcessManager(db)
@@ -196,9 +269,13 @@ def start_app(app_id):
 
 
 @app.command("stop")
-@click.argument("app_id", type=int)
-def stop_app(app_id):
-    """Detener una aplicación específica."""
+@bulk_options
+def stop_app(app_id, all_apps, name_pattern, status_filter, concurrency):
+    """Detener una aplicación específica o varias en paralelo."""
+    if resolve_bulk(app_id, all_apps, name_pattern, status_filter):
+        run_bulk_action("stop", all_apps, name_pattern, status_filter, concurrency)
+        return
+
     db = next(get_db())
     try:
         process_manager = ProcessManager(db)
@@ -220,9 +297,13 @@ def stop_app(app_id):
 
 
 @app.command("restart")
-@click.argument("app_id", type=int)
-def restart_app(app_id):
-    """Reiniciar una aplicación específica."""
+@bulk_options
+def restart_app(app_id, all_apps, name_pattern, status_filter, concurrency):
+    """Reiniciar una aplicación específica o varias en paralelo."""
+    if resolve_bulk(app_id, all_apps, name_pattern, status_filter):
+        run_bulk_action("restart", all_apps, name_pattern, status_filter, concurrency)
+        return
+
     db = next(get_db())
     try:
         process_manager = ProcessManager(db)
@@ -265,10 +346,22 @@ def app_info(app_id):
         click.echo(f"   Status: {status_icon} {app.status}")
         click.echo(f"   Type: {app.app_type}")
         click.echo(f"   Port: {app.port or 'Not assigned'}")
+        if app.backend_port:
+            click.echo(f"   Internal port: {app.backend_port} (public port served by the panel)")
+        if app.proxy_host or app.proxy_path:
+            click.echo(f"   Proxy route: {app.proxy_host or '*'}{app.proxy_path or '/'}")
         click.echo(f"   PID: {app.pid or 'N/A'}")
         click.echo(f"   Directory: {app.directory}")
         click.echo(f"   Main file: {app.main_file}")
         click.echo(f"   Created: {app.created_at}")
+        if app.server or app.workers or app.threads:
+            click.echo(f"   Server: {app.server or 'default'} (workers: {app.workers or 'default'}, threads: {app.threads or 'default'})")
+        if app.startup_time_ms is not None:
+            click.echo(f"   Last startup time: {app.startup_time_ms:.0f} ms")
+        if app.last_exit_at is not None:
+            click.echo(f"   Last unexpected exit: code {app.last_exit_code if app.last_exit_code is not None else 'unknown'} at {app.last_exit_at}")
+        if app.restart_count:
+            click.echo(f"   Automatic restarts: {app.restart_count}")
         
         if app.ngrok_enabled:
             click.echo(f"   Ngrok enabled: Yes")
@@ -278,12 +371,20 @@ def app_info(app_id):
         if app.status == "running" and app.pid:
             try:
                 process = psutil.Process(app.pid)
-                mem = process.memory_info().rss / (1024 * 1024)
-                cpu = process.cpu_percent(interval=0.1)
+                sample = get_precomputed_sample(app.id)
                 
                 click.echo(f"\n   Performance:")
-                click.echo(f"   - Memory: {mem:.2f} MB")
-                click.echo(f"   - CPU: {cpu:.1f}%")
+                if sample:
+                    click.echo(f"   - Memory: {sample['rss_bytes'] / (1024 * 1024):.2f} MB ({sample['processes']} processes)")
+                    click.echo(f"   - CPU: {sample['cpu_percent']:.1f}%")
+                    click.echo(f"   - Threads: {sample['threads']}")
+                    click.echo(f"   - Open files: {sample['open_files']}")
+                    click.echo(f"   - Connections: {sample['connections']}")
+                else:
+                    mem = process.memory_info().rss / (1024 * 1024)
+                    cpu = process.cpu_percent(interval=0.1)
+                    click.echo(f"   - Memory: {mem:.2f} MB")
+                    click.echo(f"   - CPU: {cpu:.1f}%")
                 click.echo(f"   - Uptime: {time.time() - process.create_time():.0f} seconds")
             except psutil.NoSuchProcess:
                 click.echo(f"\n   ⚠️ PID exists but the process is not running")
@@ -291,6 +392,104 @@ def app_info(app_id):
         db.close()
 
 
+@app.command("set")
+@click.argument("app_id", type=int)
+@click.option("--server", help="Server to launch with (waitress, uvicorn, gunicorn); 'default' resets it")
+@click.option("--workers", help="Number of worker processes or 'auto'; 'default' resets it")
+@click.option("--threads", help="Threads per worker or 'auto'; 'default' resets it")
+@click.option("--health-check-path", help="Path probed before marking the app as running; 'default' resets it")
+@click.option("--restart-policy", type=click.Choice(["default", "no", "on-failure", "always"]), help="Restart policy after an unexpected exit")
+@click.option("--proxy-host", help="Host name routed to this app by the reverse proxy; 'default' removes it")
+@click.option("--proxy-path", help="Path prefix routed to this app by the reverse proxy; 'default' removes it")
+@click.option("--log-max-size", help="Rotate stdout/stderr logs above this size in MB (0 disables); 'default' resets it")
+@click.option("--log-max-age", help="Rotate stdout/stderr logs older than this many hours (0 disables); 'default' resets it")
+@click.option("--log-keep", help="Number of rotated log segments to keep; 'default' resets it")
+@click.option("--log-compress", type=click.Choice(["default", "yes", "no"]), help="Gzip rotated log segments")
+@click.option("--output-capture", type=click.Choice(["default", "file", "pipe"]), help="Write output straight to logs/ or capture it through the panel")
+def app_set(app_id, server, workers, threads, health_check_path, restart_policy, proxy_host, proxy_path,
+            log_max_size, log_max_age, log_keep, log_compress, output_capture):
+    """Change the launch settings of an application (applied on the next start)."""
+    db = next(get_db())
+    try:
+        app = db.query(Application).filter(Application.id == app_id).first()
+        
+        if not app:
+            click.echo(f"❌ Application with ID {app_id} not found")
+            return
+
+        def reset(value):
+            return None if value == "default" else value
+
+        if server is not None:
+            server = reset(server.lower())
+            if server and server not in APP_SERVERS.get(app.app_type.lower(), ()):
+                choices = ", ".join(APP_SERVERS.get(app.app_type.lower(), ()))
+                click.echo(f"❌ Server '{server}' is not available for {app.app_type} applications (choose from: {choices})")
+                return
+            app.server = server
+        try:
+            if workers is not None:
+                app.workers = normalize_worker_setting(reset(workers))
+            if threads is not None:
+                app.threads = normalize_worker_setting(reset(threads))
+        except ValueError as e:
+            click.echo(f"❌ {e}")
+            return
+        if health_check_path is not None:
+            health_check_path = reset(health_check_path)
+            if health_check_path and not health_check_path.startswith("/"):
+                health_check_path = f"/{health_check_path}"
+            app.health_check_path = health_check_path
+        if restart_policy is not None:
+            app.restart_policy = reset(restart_policy)
+        if proxy_host is not None:
+            app.proxy_host = (reset(proxy_host) or "").strip().lower() or None
+        if proxy_path is not None:
+            proxy_path = (reset(proxy_path) or "").strip().rstrip("/")
+            if proxy_path and not proxy_path.startswith("/"):
+                proxy_path = f"/{proxy_path}"
+            app.proxy_path = proxy_path or None
+        log_limits = (
+            ("log_max_size_mb", "--log-max-size", log_max_size),
+            ("log_max_age_hours", "--log-max-age", log_max_age),
+            ("log_keep", "--log-keep", log_keep),
+        )
+        for field, option, value in log_limits:
+            if value is None:
+                continue
+            value = reset(value)
+            if value is not None and not value.isdigit():
+                click.echo(f"❌ {option} must be a non-negative integer or 'default'")
+                return
+            setattr(app, field, int(value) if value is not None else None)
+        if log_compress is not None:
+            app.log_compress = {"yes": True, "no": False}.get(log_compress)
+        if output_capture is not None:
+            app.output_capture = reset(output_capture)
+        db.commit()
+
+        click.echo(f"✅ Settings saved for '{app.name}'")
+        click.echo(f"   Server: {app.server or 'default'}")
+        click.echo(f"   Workers: {app.workers or 'default'}")
+        click.echo(f"   Threads: {app.threads or 'default'}")
+        click.echo(f"   Health check path: {app.health_check_path or 'none'}")
+        click.echo(f"   Restart policy: {app.restart_policy or 'default'}")
+        if app.proxy_host or app.proxy_path:
+            click.echo(f"   Proxy route: {app.proxy_host or '*'}{app.proxy_path or '/'}")
+        rotation = rotation_settings(app)
+        click.echo(
+            f"   Log rotation: {rotation['max_size_mb']} MB / {rotation['max_age_hours']} h, "
+            f"keep {rotation['keep']}{', gzip' if rotation['compress'] else ''}"
+        )
+        click.echo(f"   Output capture: {app.output_capture or 'default'}")
+        if app.output_capture == "pipe":
+            click.echo("   ℹ️ Pipe capture only applies when the app is started from the web panel")
+        if app.status == "running":
+            click.echo(f"   Restart the application to apply them: atlasserver app restart {app.id}")
+    finally:
+        db.close()
+
+
 @cli.group()
 def ai():
     """AI-assisted commands for deployment."""
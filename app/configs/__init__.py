@@ -1 +1 @@
-from .configs import NGROK_CONFIG_FILE, SWAGGER_CONFIG_FILE, save_ngrok_config, save_swagger_config, load_swagger_config, load_ngrok_config
\ No newline at end of file
+from .configs import NGROK_CONFIG_FILE, SWAGGER_CONFIG_FILE, save_ngrok_config, save_swagger_config, load_swagger_config, load_ngrok_config, SERVER_CONFIG_FILE, METRICS_SNAPSHOT_FILE, SEARCH_INDEX_FILE, DEFAULT_SERVER_CONFIG, load_server_config, save_server_config, ConfigStore, config_store
\ No newline at end of file
@@ -1,8 +1,13 @@
 import os
 from platformdirs import user_data_dir
+import copy
 import json
 import secrets
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
 
 data_dir = user_data_dir("atlasserver", "AtlasServer-Core")
 os.makedirs(data_dir, exist_ok=True)
@@ -11,30 +16,174 @@ NGROK_CONFIG_FILE = os.path.join(data_dir, "ngrok_config.json")
 
 SWAGGER_CONFIG_FILE = os.path.join(data_dir, "swagger_config.json")
 
+SERVER_CONFIG_FILE = os.path.join(data_dir, "server_config.json")
 
-def load_swagger_config():
-    if os.path.exists(SWAGGER_CONFIG_FILE):
+# Última muestra de métricas por aplicación, escrita por el panel para la CLI
+METRICS_SNAPSHOT_FILE = os.path.join(data_dir, "metrics_snapshot.json")
+
+# Índice de búsqueda de texto completo de los logs (SQLite FTS5), separado de la base de datos principal
+SEARCH_INDEX_FILE = os.path.join(data_dir, "log_search.db")
+
+# Valores por defecto de la configuración del servidor; server_config.json solo
+# necesita contener las claves que se quieran cambiar
+DEFAULT_SERVER_CONFIG = {
+    "port_range_start": 8000,
+    "port_range_end": 9000,
+    # Segundos que se espera a que una aplicación acepte conexiones tras arrancar
+    "readiness_timeout": 30,
+    # Política de reinicio por defecto del supervisor: "no", "on-failure" o "always"
+    "restart_policy": "on-failure",
+    "restart_backoff_initial": 1,
+    "restart_backoff_max": 60,
+    # Más de N reinicios dentro de la ventana (segundos) se considera crash loop
+    "crash_loop_max_restarts": 5,
+    "crash_loop_window": 300,
+    # Segundos que se espera a que terminen las conexiones de la instancia anterior en un reinicio sin cortes
+    "drain_timeout": 30,
+    # Hilos del pool de operaciones (arrancar/detener/reiniciar) del panel; también es
+    # la concurrencia máxima de las operaciones masivas. Se aplica al reiniciar el panel
+    "lifecycle_workers": 8,
+    # Muestreo de recursos: segundos entre muestras y muestras guardadas por aplicación
+    "metrics_interval": 5,
+    "metrics_history": 720,
+    # Proxy inverso opcional que publica las aplicaciones por host o prefijo de ruta en un solo puerto
+    "proxy_enabled": False,
+    "proxy_host": "0.0.0.0",
+    "proxy_port": 7070,
+    # Conexiones keep-alive inactivas por aplicación y segundos que se conservan
+    # (por debajo del keep-alive de uvicorn y gunicorn, unos 5 s, para no reutilizar conexiones cerradas)
+    "proxy_pool_size": 32,
+    "proxy_idle_timeout": 4,
+    # Segundos máximos de espera por la respuesta de una aplicación
+    "proxy_timeout": 60,
+    # Rotación de logs/stdout.log y logs/stderr.log: tamaño máximo, antigüedad
+    # máxima (0 desactiva), segmentos conservados y compresión de los antiguos
+    "log_max_size_mb": 50,
+    "log_max_age_hours": 0,
+    "log_keep": 5,
+    "log_compress": True,
+    "log_rotation_interval": 60,
+    # Salida de las aplicaciones: "file" (directa a logs/) o "pipe" (la lee el
+    # panel, sella la hora de cada línea y guarda las últimas en memoria)
+    "output_capture": "file",
+    "output_buffer_lines": 1000,
+    # Búsqueda en los logs: segundos entre ciclos de indexado y días que se
+    # conservan las entradas en el índice (0 las conserva siempre)
+    "search_enabled": True,
+    "search_index_interval": 10,
+    "search_retention_days": 30,
+    # Retraso del event loop (ms) a partir del cual se registra un aviso
+    "loop_lag_warn_ms": 100,
+}
+
+
+class ConfigStore:
+    """
+    Ficheros de configuración JSON ya interpretados y en memoria. Como mucho
+    una vez cada `check_interval` segundos se comprueba con stat si el
+    fichero cambió (mtime, inode o tamaño, p. ej. al editarlo con la CLI) y
+    solo entonces se vuelve a leer. Las escrituras son atómicas (fichero
+    temporal y rename): un lector nunca ve un JSON a medio escribir.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        # ruta -> (identidad del fichero, contenido o None, última comprobación)
+        self._entries: Dict[str, Tuple[Optional[tuple], Any, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _identity(path: str) -> Optional[tuple]:
         try:
-            with open(SWAGGER_CONFIG_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {"enabled": False, "username": "", "password": "", "use_admin_credentials": False}
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def load(self, path: str) -> Any:
+        """
+        Contenido del fichero, o None si no existe o no es JSON válido.
+        Devuelve una copia que el llamador puede modificar.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry[2] < self.check_interval:
+                return copy.deepcopy(entry[1])
+
+        identity = self._identity(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == identity:
+                self._entries[path] = (identity, entry[1], now)
+                return copy.deepcopy(entry[1])
+
+        data = None
+        if identity is not None:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+        with self._lock:
+            self._entries[path] = (identity, data, now)
+        return copy.deepcopy(data)
+
+    def save(self, path: str, data: Any, indent: Optional[int] = None):
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                # Conservar los permisos del fichero; uno nuevo queda solo para el usuario (0600)
+                os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._entries[path] = (self._identity(path), copy.deepcopy(data), time.monotonic())
+
+    def invalidate(self, path: Optional[str] = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+config_store = ConfigStore()
+
+
+def load_swagger_config():
+    config = config_store.load(SWAGGER_CONFIG_FILE)
+    if isinstance(config, dict):
+        return config
     return {"enabled": False, "username": "", "password": "", "use_admin_credentials": False}
 
 def save_swagger_config(config):
-    with open(SWAGGER_CONFIG_FILE, "w") as f:
-        json.dump(config, f)
+    config_store.save(SWAGGER_CONFIG_FILE, config)
 
 # Funciones para cargar y guardar la configuración de ngrok
 def load_ngrok_config():
-    if os.path.exists(NGROK_CONFIG_FILE):
-        try:
-            with open(NGROK_CONFIG_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    config = config_store.load(NGROK_CONFIG_FILE)
+    return config if isinstance(config, dict) else {}
 
 def save_ngrok_config(config):
-    with open(NGROK_CONFIG_FILE, "w") as f:
-        json.dump(config, f)
\ No newline at end of file
+    config_store.save(NGROK_CONFIG_FILE, config)
+
+# Funciones para cargar y guardar la configuración del servidor
+def load_server_config():
+    config = dict(DEFAULT_SERVER_CONFIG)
+    saved = config_store.load(SERVER_CONFIG_FILE)
+    if isinstance(saved, dict):
+        config.update(saved)
+    return config
+
+def save_server_config(config):
+    config_store.save(SERVER_CONFIG_FILE, config, indent=2)
\ No newline at end of file
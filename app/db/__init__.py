@@ -1 +1,3 @@
-from .db import engine, create_engine, SessionLocal, Base, get_db
\ No newline at end of file
+from .db import engine, writer_engine, create_engine, create_sqlite_engine, RoutingSession, SessionLocal, Base, get_db, \
+    async_engine, async_writer_engine, AsyncSessionLocal, get_async_db
+from .migrations import init_db
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
 import sqlalchemy
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql.dml import UpdateBase
 from platformdirs import user_data_dir
 
 
@@ -10,16 +12,101 @@ data_dir = user_data_dir("atlasserver", "AtlasServer-Core")
 os.makedirs(data_dir, exist_ok=True)
 
 DATABASE_URL = f"sqlite:///{os.path.join(data_dir, 'applications.db')}"
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    poolclass=sqlalchemy.pool.QueuePool,
-    pool_size=20,
-    max_overflow=20,
-    pool_timeout=60,
-    pool_recycle=3600
+# Misma base de datos para las rutas async, a través de aiosqlite
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(data_dir, 'applications.db')}"
+
+# Ajustes de cada conexión. WAL deja leer mientras alguien escribe; con
+# synchronous=NORMAL un commit no espera a fsync (en WAL no arriesga la
+# integridad, solo las últimas transacciones ante un corte de luz)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # Milisegundos que se espera a que otro proceso (p. ej. la CLI) suelte el bloqueo
+    "busy_timeout": 30000,
+    # Caché de páginas por conexión en KiB (valor negativo)
+    "cache_size": -8000,
+    "temp_store": "MEMORY",
+}
+
+# Conexiones de lectura: SQLite no gana nada con muchas más que hilos activos
+READ_POOL_SIZE = 5
+READ_POOL_OVERFLOW = 10
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_sqlite_engine(url: str, pool_size: int, max_overflow: int, pool_timeout: float = 60):
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000},
+        poolclass=sqlalchemy.pool.QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=3600
+    )
+    event.listen(sqlite_engine, "connect", _apply_pragmas)
+    return sqlite_engine
+
+
+def create_async_sqlite_engine(url: str, pool_size: int, max_overflow: int, pool_timeout: float = 60):
+    async_engine = create_async_engine(
+        url,
+        connect_args={"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000},
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=3600
+    )
+    # aiosqlite expone una conexión compatible con DB-API: los pragmas se aplican igual
+    event.listen(async_engine.sync_engine, "connect", _apply_pragmas)
+    return async_engine
+
+
+class RoutingSession(Session):
+    """
+    Sesión que lee por el pool de `reader` y escribe (flush del ORM e
+    INSERT/UPDATE/DELETE explícitos) por `writer`, un pool de una sola
+    conexión. SQLite solo admite un escritor a la vez: así las escrituras del
+    panel hacen cola en Python en lugar de competir por el bloqueo del
+    fichero y fallar con "database is locked". La conexión de escritura se
+    libera al hacer commit o rollback.
+    """
+
+    def __init__(self, reader=None, writer=None, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.writer = writer
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            return self.writer
+        return self.reader
+
+
+engine = create_sqlite_engine(DATABASE_URL, pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_OVERFLOW)
+writer_engine = create_sqlite_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, reader=engine, writer=writer_engine, autocommit=False, autoflush=False
+)
+
+# Capa async para las rutas `async def` y los websockets: las consultas se
+# esperan con await y nunca bloquean el event loop. Como en SessionLocal, las
+# escrituras van por una única conexión
+async_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL, pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_OVERFLOW)
+async_writer_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL, pool_size=1, max_overflow=0)
+
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=RoutingSession,
+    reader=async_engine.sync_engine, writer=async_writer_engine.sync_engine,
+    autoflush=False, expire_on_commit=False
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 # Función para obtener la sesión de la base de datos
@@ -28,4 +115,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Función para obtener la sesión async de la base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
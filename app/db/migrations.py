@@ -0,0 +1,67 @@
+import logging
+from sqlalchemy import inspect, text
+from app.db.db import engine, Base
+
+logger = logging.getLogger(__name__)
+
+
+def init_db(bind=None):
+    """
+    Crea las tablas que falten y añade las columnas e índices nuevos de los
+    modelos a las tablas existentes. `create_all` no modifica tablas ya
+    creadas, así que las bases de datos de versiones anteriores necesitan este paso.
+    """
+    import app.models  # noqa: F401  Registrar los modelos en Base.metadata
+
+    bind = bind or engine
+    Base.metadata.create_all(bind)
+    _rebuild_autoincrement_tables(bind)
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                logger.info(f"Columna añadida: {table.name}.{column.name}")
+
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                # En tablas grandes puede tardar; solo ocurre una vez
+                index.create(bind)
+                logger.info(f"Índice creado: {index.name}")
+
+
+def _rebuild_autoincrement_tables(bind):
+    """
+    SQLite no permite añadir AUTOINCREMENT a una tabla existente: las tablas
+    del modelo que lo piden y se crearon sin él se reconstruyen copiando las
+    filas con sus ids, de modo que los ids nuevos ya no reutilizan los borrados.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    for table in Base.metadata.sorted_tables:
+        if not table.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        with bind.begin() as conn:
+            ddl = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+            ).scalar()
+            if not ddl or "AUTOINCREMENT" in ddl.upper():
+                continue
+            old_name = f"{table.name}__old"
+            existing = [column["name"] for column in inspect(conn).get_columns(table.name)]
+            columns = ", ".join(f'"{name}"' for name in existing if name in table.columns)
+            conn.execute(text(f'ALTER TABLE {table.name} RENAME TO "{old_name}"'))
+            # Los índices siguen a la tabla renombrada; se quitan para crearlos en la nueva
+            for index in inspect(conn).get_indexes(old_name):
+                conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+            table.create(conn)
+            conn.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM "{old_name}"'))
+            conn.execute(text(f'DROP TABLE "{old_name}"'))
+            logger.info(f"Tabla reconstruida con AUTOINCREMENT: {table.name}")
@@ -1,5 +1,6 @@
 #main.py
 
+import asyncio
 import logging
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -9,15 +10,22 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware import Middleware
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import pathlib
 import uvicorn
 from starlette import status
-from app.auth import authenticate_user, create_user, login_required, is_first_run, is_registration_open, get_current_user
-from app.db import engine, Base, get_db
+from app.auth import authenticate_user, create_user, login_required, is_first_run, is_registration_open, get_current_user, get_cached_user, user_cache, verify_password_async
+from app.db import engine, Base, get_db, get_async_db, init_db, async_engine, async_writer_engine
 from app.models import User, Application, Log
-from app.services import ProcessManager
+from app.services import (
+    ProcessManager, lifecycle_engine, supervisor, metrics_sampler, front_manager, reverse_proxy, log_sink,
+    log_rotator, log_search, get_log_page, APP_SERVERS, rotation_settings, list_segments, OUTPUT_LOGS, output_capture,
+    CAPTURE_MODES, loop_monitor
+)
 from app.utils import get_local_ip
 import sys
 import secrets
@@ -25,7 +33,7 @@ from platformdirs import user_data_dir
 from app.utils import get_local_ip
 from app.configs import load_swagger_config
 from app.auth import get_or_refresh_token
-from app.routes import websockets, api, applications, configroutes, enviro
+from app.routes import websockets, api, applications, configroutes, enviro, jobs, system
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
@@ -33,12 +41,46 @@ logger = logging.getLogger(__name__)
 secret = get_or_refresh_token()
 
 
-app = FastAPI(title="Application Administration Panel", docs_url=None, redoc_url=None)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear tablas y columnas nuevas antes de atender peticiones
+    init_db()
+    # Mide el retraso del event loop mientras el panel está en marcha
+    await loop_monitor.start()
+    await supervisor.start()
+    await metrics_sampler.start()
+    await log_rotator.start()
+    await log_search.start()
+    # Publicar los puertos de las aplicaciones que usan el listener frontal
+    await front_manager.start()
+    # Solo arranca si proxy_enabled está activo en server_config.json
+    await reverse_proxy.start()
+    yield
+    await reverse_proxy.stop()
+    await metrics_sampler.stop()
+    await log_rotator.stop()
+    await log_search.stop()
+    await supervisor.stop()
+    # Esperar a que terminen las operaciones de ciclo de vida en curso
+    await lifecycle_engine.shutdown()
+    await front_manager.stop()
+    # Escribir los logs que queden en cola antes de salir
+    await asyncio.get_running_loop().run_in_executor(None, log_sink.close)
+    await asyncio.get_running_loop().run_in_executor(None, output_capture.close)
+    # Cerrar las conexiones aiosqlite mientras el loop sigue vivo
+    await async_engine.dispose()
+    await async_writer_engine.dispose()
+    await loop_monitor.stop()
+
+
+app = FastAPI(title="Application Administration Panel", docs_url=None, redoc_url=None, lifespan=lifespan)
 app.include_router(websockets.router)
 app.include_router(api.router)
 app.include_router(applications.router)
 app.include_router(configroutes.router)
 app.include_router(enviro.router)
+app.include_router(jobs.router)
+app.include_router(system.router)
 
 data_dir = user_data_dir("atlasserver", "AtlasServer-Core")
 os.makedirs(data_dir, exist_ok=True)
@@ -54,6 +96,46 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 security = HTTPBasic()
 
 
+def _authentication_redirect(request: Request):
+    """
+    Comprobación completa con la base de datos. Devuelve la redirección a
+    aplicar o None si la petición puede seguir. Es síncrona: el middleware la
+    ejecuta en el pool de hilos para no bloquear el event loop.
+    """
+    # Obtener DB de manera más eficiente
+    try:
+        db = next(get_db())
+        
+        # Verificar si es la primera ejecución - solo si no hay tablas
+        try:
+            if is_first_run(db):
+                if request.url.path != "/register":
+                    return RedirectResponse(url="/register", status_code=status.HTTP_302_FOUND)
+            else:
+                # Verificar la autenticación
+                user_id = request.session.get("user_id")
+                if user_id is None:
+                    return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
+                
+                # Verificar que el usuario existe; normalmente sale de la caché, sin consultas
+                user = get_cached_user(db, user_id)
+                if not user:
+                    request.session.clear()
+                    return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
+        except Exception as e:
+            # Si hay error en la consulta (por ejemplo, si las tablas no existen)
+            print(f"Error en middleware de autenticación: {str(e)}")
+            return RedirectResponse(url="/register", status_code=status.HTTP_302_FOUND)
+        finally:
+            db.close()  # Cerrar siempre la conexión
+            
+    except Exception as e:
+        # Error al obtener la sesión de DB
+        print(f"Error al obtener la sesión de DB: {str(e)}")
+        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
+    return None
+
+
 # Rutas API
 @app.middleware("http")
 async def authenticate_middleware(request: Request, call_next):
@@ -69,41 +151,12 @@ async def authenticate_middleware(request: Request, call_next):
     
     # Para rutas que requieren autenticación
     if not is_public:
-        # Obtener DB de manera más eficiente
-        try:
-            db = next(get_db())
-            
-            # Verificar si es la primera ejecución - solo si no hay tablas
-            try:
-                if is_first_run(db):
-                    if request.url.path != "/register":
-                        db.close()  # Cerrar explícitamente la conexión
-                        return RedirectResponse(url="/register", status_code=status.HTTP_302_FOUND)
-                else:
-                    # Verificar la autenticación
-                    user_id = request.session.get("user_id")
-                    if user_id is None:
-                        db.close()  # Cerrar explícitamente la conexión
-                        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
-                    
-                    # Verificar que el usuario existe - optimizado para no hacer consultas innecesarias
-                    user = db.query(User).filter(User.id == user_id).first()
-                    if not user:
-                        request.session.clear()
-                        db.close()  # Cerrar explícitamente la conexión
-                        return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
-            except Exception as e:
-                # Si hay error en la consulta (por ejemplo, si las tablas no existen)
-                print(f"Error en middleware de autenticación: {str(e)}")
-                db.close()  # Cerrar explícitamente la conexión
-                return RedirectResponse(url="/register", status_code=status.HTTP_302_FOUND)
-            finally:
-                db.close()  # Cerrar siempre la conexión
-                
-        except Exception as e:
-            # Error al obtener la sesión de DB
-            print(f"Error al obtener la sesión de DB: {str(e)}")
-            return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
+        user_id = request.session.get("user_id")
+        # Caso habitual: ya hay usuarios y el de la sesión está en caché, sin tocar la base de datos
+        if not (user_cache.get_first_run() is False and user_id is not None and user_cache.get_user(user_id)):
+            redirect = await run_in_threadpool(_authentication_redirect, request)
+            if redirect is not None:
+                return redirect
     
     # Continuar con la solicitud si todo está bien
     try:
@@ -118,7 +171,7 @@ async def authenticate_middleware(request: Request, call_next):
 async def get_documentation(
     request: Request,
     credentials: HTTPBasicCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Cargar configuración de Swagger
     swagger_config = load_swagger_config()
@@ -126,14 +179,15 @@ async def get_documentation(
     if swagger_config.get("enabled", False):
         if swagger_config.get("use_admin_credentials", False):
             # Verificar contra credenciales de administrador
-            admin_user = db.query(User).filter(User.is_admin == True).first()
+            admin_user = await db.scalar(select(User).where(User.is_admin == True).limit(1))
             if admin_user:
                 # Verificar si las credenciales coinciden con las del administrador
                 is_username_correct = secrets.compare_digest(credentials.username, admin_user.username)
                 
-                # Para la contraseña, usamos la función de verificación segura
-                from app.auth import verify_password
-                is_password_correct = admin_user and verify_password(credentials.password, admin_user.password)
+                # Para la contraseña, bcrypt fuera del event loop (o la caché de credenciales ya verificadas)
+                is_password_correct = await verify_password_async(
+                    credentials.password, admin_user.password, admin_user.username
+                )
                 
                 if not (is_username_correct and is_password_correct):
                     raise HTTPException(
@@ -166,7 +220,7 @@ async def get_documentation(
 async def get_redoc(
     request: Request,
     credentials: HTTPBasicCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Mismo código de verificación que en /docs
     swagger_config = load_swagger_config()
@@ -174,14 +228,15 @@ async def get_redoc(
     if swagger_config.get("enabled", False):
         if swagger_config.get("use_admin_credentials", False):
             # Verificar contra credenciales de administrador
-            admin_user = db.query(User).filter(User.is_admin == True).first()
+            admin_user = await db.scalar(select(User).where(User.is_admin == True).limit(1))
             if admin_user:
                 # Verificar si las credenciales coinciden con las del administrador
                 is_username_correct = secrets.compare_digest(credentials.username, admin_user.username)
                 
-                # Para la contraseña, usamos la función de verificación segura
-                from app.auth import verify_password
-                is_password_correct = admin_user and verify_password(credentials.password, admin_user.password)
+                # Para la contraseña, bcrypt fuera del event loop (o la caché de credenciales ya verificadas)
+                is_password_correct = await verify_password_async(
+                    credentials.password, admin_user.password, admin_user.username
+                )
                 
                 if not (is_username_correct and is_password_correct):
                     raise HTTPException(
@@ -233,7 +288,7 @@ def view_application(app_id: int, request: Request, current_user: User = Depends
     if not application:
         return RedirectResponse(url="/", status_code=303)
     
-    logs = db.query(Log).filter(Log.application_id == app_id).order_by(Log.timestamp.desc()).limit(50).all()
+    logs, next_cursor = get_log_page(db, app_id, limit=50)
     
     # Verificar el estado real de la aplicación
     process_manager = ProcessManager(db)
@@ -251,8 +306,19 @@ def view_application(app_id: int, request: Request, current_user: User = Depends
             "request": request, 
             "application": application, 
             "logs": logs,
+            "next_cursor": next_cursor,
             "local_ip": local_ip,
-            "user": current_user
+            "user": current_user,
+            "job_id": request.query_params.get("job"),
+            "settings_success_message": request.query_params.get("settings_success", None),
+            "settings_error_message": request.query_params.get("settings_error", None),
+            "app_servers": APP_SERVERS.get(application.app_type.lower(), ()),
+            "log_rotation": rotation_settings(application),
+            "capture_modes": CAPTURE_MODES,
+            "output_segments": {
+                log_type: list_segments(os.path.join(application.directory, "logs", f"{log_type}.log"))
+                for log_type in OUTPUT_LOGS
+            }
         }
     )
 
@@ -261,10 +327,10 @@ async def application_logs_page(
     request: Request,
     app_id: int,
     current_user: User = Depends(login_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Busca la aplicación
-    application = db.query(Application).filter(Application.id == app_id).first()
+    application = await db.get(Application, app_id)
     if not application:
         raise HTTPException(status_code=404, detail="Aplicación no encontrada")
 
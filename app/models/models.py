@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 import datetime
 from app.db import Base
@@ -12,7 +12,10 @@ class Application(Base):
     main_file = Column(String)
     app_type = Column(String)  # "flask" o "fastapi"
     port = Column(Integer, nullable=True)
-    status = Column(String, default="stopped")  # "running", "stopped", "error"
+    backend_port = Column(Integer, nullable=True)         # puerto interno cuando el panel publica `port` con su listener frontal
+    proxy_host = Column(String, nullable=True)           # nombre de host que el proxy inverso envía a esta aplicación
+    proxy_path = Column(String, nullable=True)           # prefijo de ruta del proxy inverso, p. ej. "/api"
+    status = Column(String, default="stopped")  # "starting", "running", "stopped", "error"
     pid = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     logs = relationship("Log", back_populates="application", cascade="all, delete-orphan")
@@ -20,6 +23,20 @@ class Application(Base):
     ngrok_url = Column(String, nullable=True)
     environment_type = Column(String, default="system")  # "system", "virtualenv", "conda"
     environment_path = Column(String, nullable=True)     # ruta al entorno virtual o nombre del entorno conda
+    server = Column(String, nullable=True)               # "waitress", "uvicorn" o "gunicorn"; None usa el predeterminado del tipo
+    workers = Column(String, nullable=True)              # número de procesos o "auto"; None usa el predeterminado del servidor
+    threads = Column(String, nullable=True)              # hilos por proceso o "auto"
+    health_check_path = Column(String, nullable=True)    # ruta HTTP opcional para comprobar que la app está lista, p. ej. "/health"
+    startup_time_ms = Column(Float, nullable=True)       # tiempo hasta aceptar conexiones en el último arranque
+    restart_policy = Column(String, nullable=True)       # "no", "on-failure", "always"; None usa el valor de server_config.json
+    restart_count = Column(Integer, default=0)           # reinicios automáticos realizados por el supervisor
+    last_exit_code = Column(Integer, nullable=True)
+    last_exit_at = Column(DateTime, nullable=True)
+    log_max_size_mb = Column(Integer, nullable=True)     # rotación de stdout/stderr; None usa el valor de server_config.json
+    log_max_age_hours = Column(Integer, nullable=True)
+    log_keep = Column(Integer, nullable=True)
+    log_compress = Column(Boolean, nullable=True)
+    output_capture = Column(String, nullable=True)       # "file" o "pipe"; None usa el valor de server_config.json
 
 class Log(Base):
     __tablename__ = "logs"
@@ -32,6 +49,14 @@ class Log(Base):
     
     application = relationship("Application", back_populates="logs")
 
+    # Sirve las consultas por aplicación ordenadas por fecha (páginas y exportaciones).
+    # AUTOINCREMENT: el índice de búsqueda avanza por id y SQLite reutilizaría los
+    # ids de las últimas filas borradas (p. ej. al eliminar una aplicación)
+    __table_args__ = (
+        Index("ix_logs_application_id_timestamp", "application_id", "timestamp"),
+        {"sqlite_autoincrement": True},
+    )
+
 class User(Base):
     __tablename__ = "users"
 
@@ -1,117 +1,354 @@
 from fastapi import Depends, HTTPException, APIRouter
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from app.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_db, get_async_db
 import datetime
 import os
-import json
-import tempfile
-import csv
-import io
-from starlette.background import BackgroundTask
+import urllib.parse
 from app.auth import login_required
-from app.models import User, Application, Log
-import subprocess
+from app.models import User, Application
+from app.services import (
+    lifecycle_engine, select_applications_async, JOB_ACTIONS, metrics_sampler,
+    get_log_page, export_logs, EXPORT_FORMATS, list_segments, segment_path, OUTPUT_LOGS,
+    log_search, SEARCH_STREAMS, tail_lines, read_since
+)
+from app.utils import run_command
+from typing import Optional
 
 router = APIRouter(prefix="/api/applications", tags=["applications_api"])
 
+
+def _attachment(filename: str) -> str:
+    """
+    Content-Disposition de descarga para un nombre arbitrario: `filename` en
+    ASCII sin comillas para clientes antiguos y `filename*` (RFC 5987) con el
+    nombre real en UTF-8, como hace FileResponse.
+    """
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{urllib.parse.quote(filename)}"
+
+
+def _as_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Las fechas de los logs se guardan en UTC sin zona: una fecha con zona se convierte a UTC."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+@router.get("/{app_id}/logs")
+def list_application_logs(
+    app_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    level: Optional[str] = None,
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """
+    Logs de la aplicación de más reciente a más antiguo. Para la página
+    siguiente, pasar el `next_cursor` de la respuesta como `cursor`.
+    """
+    application = db.query(Application).filter(Application.id == app_id).first()
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+
+    try:
+        logs, next_cursor = get_log_page(db, app_id, limit=limit, cursor=cursor, level=level)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+
+    return {
+        "app_id": app_id,
+        "logs": [
+            {"id": log.id, "timestamp": log.timestamp.isoformat(), "level": log.level, "message": log.message}
+            for log in logs
+        ],
+        "next_cursor": next_cursor
+    }
+
+
 @router.get("/{app_id}/logs/download")
 def download_application_logs(
     app_id: int, 
     format: str = "csv", 
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    level: Optional[str] = None,
+    gzip: bool = False,
     current_user: User = Depends(login_required), 
     db: Session = Depends(get_db)
 ):
-    logs = db.query(Log).filter(Log.application_id == app_id).order_by(Log.timestamp.desc()).all()
-    
+    """
+    Descarga los logs de la aplicación en CSV, JSON o NDJSON. La respuesta se
+    genera por trozos mientras se leen las filas; con `gzip=true` se comprime
+    sobre la marcha. `since`/`until` (ISO 8601) y `level` filtran los registros.
+    """
     application = db.query(Application).filter(Application.id == app_id).first()
     if not application:
         raise HTTPException(status_code=404, detail="Aplicación no encontrada")
-    
-    filename = f"{application.name}_logs_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    
-    if format.lower() == "json":
-        # Crear archivo JSON para descargar
-        logs_data = []
-        for log in logs:
-            logs_data.append({
-                "id": log.id,
-                "message": log.message,
-                "level": log.level,
-                "timestamp": log.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            })
-        
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        with open(temp_file.name, "w", encoding="utf-8") as f:
-            json.dump(logs_data, f, indent=2, ensure_ascii=False)
-        
-        return FileResponse(
-            path=temp_file.name, 
-            filename=f"{filename}.json",
-            media_type="application/json",
-            background=BackgroundTask(lambda: os.unlink(temp_file.name))
-        )
-    
-    else:  # CSV por defecto
-        # Crear archivo CSV para descargar
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["ID", "Fecha", "Nivel", "Mensaje"])
-        
-        for log in logs:
-            writer.writerow([
-                log.id,
-                log.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                log.level,
-                log.message
-            ])
-        
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
-        with open(temp_file.name, "w", encoding="utf-8") as f:
-            f.write(output.getvalue())
-        
-        return FileResponse(
-            path=temp_file.name, 
-            filename=f"{filename}.csv",
-            media_type="text/csv",
-            background=BackgroundTask(lambda: os.unlink(temp_file.name))
+
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+    extension, media_type = EXPORT_FORMATS[fmt]
+
+    filename = f"{application.name}_logs_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        export_logs(app_id, fmt, since=_as_utc(since), until=_as_utc(until), level=level, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": _attachment(filename)}
+    )
+
+
+@router.get("/{app_id}/logs/search")
+def search_application_logs(
+    app_id: int,
+    q: str,
+    stream: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """
+    Busca texto en los eventos del panel y en la salida (stdout/stderr) de la
+    aplicación. Todas las palabras de `q` deben aparecer; `palabra*` busca por
+    prefijo. `stream` admite varios valores separados por comas. Para la página
+    siguiente, pasar el `next_cursor` de la respuesta como `cursor`.
+    """
+    application = db.query(Application).filter(Application.id == app_id).first()
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+    if not log_search.available:
+        raise HTTPException(status_code=503, detail="La búsqueda de logs no está disponible en este servidor")
+
+    streams = [value.strip() for value in stream.split(",") if value.strip()] if stream else None
+    if streams and any(value not in SEARCH_STREAMS for value in streams):
+        raise HTTPException(status_code=400, detail=f"Flujo no válido. Valores admitidos: {', '.join(SEARCH_STREAMS)}")
+
+    try:
+        results, next_cursor = log_search.search(
+            app_id, q, streams=streams, level=level, since=_as_utc(since), until=_as_utc(until),
+            limit=limit, cursor=cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"app_id": app_id, "query": q, "results": results, "next_cursor": next_cursor}
+
+
+def _output_log(db: Session, app_id: int, log_type: str):
+    """Aplicación y ruta de su stdout.log o stderr.log, o el error HTTP correspondiente."""
+    application = db.query(Application).filter(Application.id == app_id).first()
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+    if log_type not in OUTPUT_LOGS:
+        raise HTTPException(status_code=400, detail=f"Tipo de log no soportado: {log_type}")
+    return application, os.path.join(application.directory, "logs", f"{log_type}.log")
+
+
+@router.get("/{app_id}/output-logs")
+def list_application_output_logs(
+    app_id: int,
+    log_type: str = "stdout",
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """Segmentos de stdout.log o stderr.log: 0 es el actual y los siguientes los rotados, del más reciente al más antiguo."""
+    _, log_file = _output_log(db, app_id, log_type)
+    return {"app_id": app_id, "log_type": log_type, "segments": list_segments(log_file)}
+
+
+@router.get("/{app_id}/output-logs/tail")
+def tail_application_output_log(
+    app_id: int,
+    log_type: str = "stdout",
+    lines: int = 100,
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """
+    Últimas `lines` líneas del log. `next_offset` se puede pasar como `since`
+    a /output-logs/read para recibir solo lo que se escriba después.
+    """
+    _, log_file = _output_log(db, app_id, log_type)
+    try:
+        result, size = tail_lines(log_file, lines)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archivo de logs {log_type}.log no encontrado")
+    return {"app_id": app_id, "log_type": log_type, "lines": result, "next_offset": size}
+
+
+@router.get("/{app_id}/output-logs/read")
+def read_application_output_log(
+    app_id: int,
+    log_type: str = "stdout",
+    since: int = 0,
+    segment: int = 0,
+    max_bytes: int = 1024 * 1024,
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """
+    Lo escrito en el log desde el desplazamiento `since` (bytes), en líneas
+    completas, y el `next_offset`/`next_segment` para la siguiente consulta
+    (como `since` y `segment`). Con `more` a true queda contenido pendiente;
+    `rotated` indica que el log se rotó entre dos consultas: se entrega lo que
+    faltaba del segmento anterior y se sigue desde el principio del nuevo fichero.
+    """
+    _, log_file = _output_log(db, app_id, log_type)
+    if since < 0:
+        raise HTTPException(status_code=400, detail="El desplazamiento no puede ser negativo")
+    if segment not in (0, 1):
+        raise HTTPException(status_code=400, detail="El segmento debe ser 0 (actual) o 1 (anterior)")
+    try:
+        result = read_since(log_file, since, max_bytes, segment)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archivo de logs {log_type}.log no encontrado")
+    return {"app_id": app_id, "log_type": log_type, **result}
 
 
 @router.get("/{app_id}/output-logs/download")
 def download_application_output_logs(
     app_id: int, 
     log_type: str = "stdout", 
+    segment: int = 0,
     current_user: User = Depends(login_required), 
     db: Session = Depends(get_db)
 ):
-    application = db.query(Application).filter(Application.id == app_id).first()
-    if not application:
-        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
-    
-    log_file = os.path.join(application.directory, "logs", f"{log_type}.log")
-    if not os.path.exists(log_file):
+    """
+    Descarga un segmento del log. FileResponse atiende por sí mismo las
+    cabeceras `Range` (uno o varios tramos, `If-Range`, 416) para descargas
+    parciales o reanudadas.
+    """
+    application, log_file = _output_log(db, app_id, log_type)
+    log_file = segment_path(log_file, segment) if segment >= 0 else None
+    if log_file is None:
         raise HTTPException(status_code=404, detail=f"Archivo de logs {log_type}.log no encontrado")
     
-    filename = f"{application.name}_{log_type}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
+    filename = f"{application.name}_{log_type}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if segment:
+        filename += f"_{segment}"
+    compressed = log_file.endswith(".gz")
+
     return FileResponse(
         path=log_file,
-        filename=filename,
-        media_type="text/plain"
+        filename=f"{filename}.log.gz" if compressed else f"{filename}.log",
+        media_type="application/gzip" if compressed else "text/plain"
     )
 
 
+# Debe declararse antes que /{app_id}/start para que "bulk" no se interprete como app_id
+@router.post("/bulk/{action}", status_code=202)
+async def api_bulk_lifecycle(
+    action: str,
+    all: bool = False,
+    ids: Optional[str] = None,
+    name: Optional[str] = None,
+    status: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    wait: bool = False,
+    current_user: User = Depends(login_required),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Inicia, detiene o reinicia (también sin cortes, con `blue-green`) varias aplicaciones en paralelo.
+    Selección: `all=true`, `ids=1,2,3`, `name` (comodines estilo shell) y/o `status`.
+    Con `wait=true` responde cuando termina el lote, con el resultado por aplicación.
+    """
+    if action not in JOB_ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Acción no soportada: {action}")
+
+    try:
+        app_ids = [int(i) for i in ids.split(",") if i.strip()] if ids else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El parámetro ids debe ser una lista de enteros separada por comas")
+
+    applications = await select_applications_async(db, app_ids=app_ids, all_apps=all, name=name, status=status)
+    if not applications:
+        raise HTTPException(status_code=400, detail="Ninguna aplicación coincide con la selección")
+
+    try:
+        batch = lifecycle_engine.submit_batch(action, [a.id for a in applications], concurrency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if wait:
+        await lifecycle_engine.wait_batch(batch.id)
+    return batch.to_dict()
+
+
+async def _submit_lifecycle_job(action: str, app_id: int, db: AsyncSession):
+    application = await db.get(Application, app_id)
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+    job = lifecycle_engine.submit(action, app_id)
+    return job.to_dict()
+
+
+@router.post("/{app_id}/start", status_code=202)
+async def api_start_application(app_id: int, current_user: User = Depends(login_required),
+                                db: AsyncSession = Depends(get_async_db)):
+    return await _submit_lifecycle_job("start", app_id, db)
+
+
+@router.post("/{app_id}/stop", status_code=202)
+async def api_stop_application(app_id: int, current_user: User = Depends(login_required),
+                               db: AsyncSession = Depends(get_async_db)):
+    return await _submit_lifecycle_job("stop", app_id, db)
+
+
+@router.post("/{app_id}/restart", status_code=202)
+async def api_restart_application(
+    app_id: int,
+    mode: str = "stop-start",
+    current_user: User = Depends(login_required),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    `mode=stop-start` detiene y vuelve a arrancar la aplicación. `mode=blue-green`
+    arranca la nueva instancia en un puerto interno y cambia el tráfico sin cortes.
+    """
+    if mode not in ("stop-start", "blue-green"):
+        raise HTTPException(status_code=400, detail=f"Modo de reinicio no soportado: {mode}")
+    return await _submit_lifecycle_job("restart" if mode == "stop-start" else "blue-green", app_id, db)
+
+
+@router.get("/{app_id}/metrics")
+def get_application_metrics(
+    app_id: int,
+    limit: Optional[int] = None,
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    """Muestras de CPU, memoria, hilos, ficheros y conexiones precalculadas por el muestreador."""
+    application = db.query(Application).filter(Application.id == app_id).first()
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+
+    return {
+        "app_id": app_id,
+        "interval": metrics_sampler.interval,
+        "samples": metrics_sampler.get_samples(app_id, limit)
+    }
+
+
 @router.get("/{app_id}/django-migrations")
 async def check_django_migrations(
     app_id: int,
     current_user: User = Depends(login_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verifica el estado de las migraciones de una aplicación Django"""
     
     # Obtener la aplicación
-    application = db.query(Application).filter(Application.id == app_id).first()
+    application = await db.get(Application, app_id)
     if not application:
         raise HTTPException(status_code=404, detail="Aplicación no encontrada")
     
@@ -132,23 +369,21 @@ async def check_django_migrations(
                 else:  # Unix/Mac
                     python_cmd = os.path.join(application.environment_path, "bin", "python")
         
-        # Ejecutar comando para verificar migraciones
-        result = subprocess.run(
+        # Ejecutar comando para verificar migraciones sin bloquear el event loop
+        returncode, stdout, stderr = await run_command(
             [python_cmd, "manage.py", "showmigrations", "--list"],
             cwd=application.directory,
-            env=env,
-            capture_output=True,
-            text=True
+            env=env
         )
         
         # Procesar la salida
         migrations = []
         
-        if result.returncode == 0:
+        if returncode == 0:
             # Analizar la salida del comando showmigrations
             current_app = None
             
-            for line in result.stdout.split('\n'):
+            for line in stdout.split('\n'):
                 line = line.strip()
                 
                 # Línea de aplicación
@@ -178,7 +413,7 @@ async def check_django_migrations(
             }
         else:
             # Error al ejecutar el comando
-            error_msg = result.stderr or "Error desconocido al verificar migraciones"
+            error_msg = stderr or "Error desconocido al verificar migraciones"
             return {
                 "success": False,
                 "error": error_msg,
@@ -1,13 +1,15 @@
-from fastapi import Depends, Request, Form, APIRouter
+from fastapi import Depends, Request, Form, APIRouter, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 from typing import Optional
 from app.auth import login_required
-from app.db import get_db
+from app.db import get_db, get_async_db
 from app.models import User, Application, Log
-from app.services import ProcessManager
+from app.services import ProcessManager, lifecycle_engine, launch_plans, output_capture, log_search, APP_SERVERS, normalize_worker_setting, CAPTURE_MODES
+from app.services.port_allocator import port_allocator
 from app.utils import find_available_port, detect_environments
 from app.packdir import package_dir
 
@@ -29,8 +31,13 @@ def create_application_form(
     ngrok_enabled: bool = Form(False),  # Nuevo campo como checkbox
     current_user: User = Depends(login_required),
     environment_type: str = Form("system"),
+    health_check_path: Optional[str] = Form(None),
+    server: Optional[str] = Form(None),
+    workers: Optional[str] = Form(None),
+    threads: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
+    reserved_port = None
     try:
         # Validar que el directorio existe
         if not os.path.isdir(directory):
@@ -70,9 +77,31 @@ def create_application_form(
                 status_code=400
             )
         
-        # Asignar un puerto si no se proporciona
+        # Validar el servidor y el número de workers e hilos
+        server = server.lower() if server else None
+        if server and server not in APP_SERVERS[app_type.lower()]:
+            return templates.TemplateResponse(
+                "new_application.html", 
+                {"request": request, "error": f"El servidor {server} no está disponible para aplicaciones {app_type}", "form_data": locals(), "user": current_user},
+                status_code=400
+            )
+        try:
+            workers = normalize_worker_setting(workers)
+            threads = normalize_worker_setting(threads)
+        except ValueError as e:
+            return templates.TemplateResponse(
+                "new_application.html", 
+                {"request": request, "error": str(e), "form_data": locals(), "user": current_user},
+                status_code=400
+            )
+
+        # La ruta de salud debe ser una ruta HTTP absoluta
+        if health_check_path and not health_check_path.startswith("/"):
+            health_check_path = f"/{health_check_path}"
+
+        # Asignar un puerto si no se proporciona; queda reservado hasta guardar la aplicación
         if not port:
-            port = find_available_port(db=db)
+            port = reserved_port = find_available_port(db=db)
             if not port:
                 return templates.TemplateResponse(
                     "new_application.html", 
@@ -89,7 +118,11 @@ def create_application_form(
             port=port,
             ngrok_enabled=ngrok_enabled,
             environment_type=env_type,
-            environment_path=env_path 
+            environment_path=env_path,
+            health_check_path=health_check_path or None,
+            server=server,
+            workers=workers,
+            threads=threads
         )
         
         db.add(db_application)
@@ -108,24 +141,112 @@ def create_application_form(
             {"request": request, "error": f"Error: {str(e)}", "form_data": locals(), "user": current_user},
             status_code=500
         )
+    finally:
+        # Guardado el puerto en la base de datos (o descartada la creación) la reserva sobra
+        port_allocator.release(reserved_port)
+
+# Las operaciones de ciclo de vida se encolan en segundo plano; la vista
+# de la aplicación consulta el progreso del trabajo con /api/jobs/{job_id}
+async def _submit_lifecycle_form(action: str, app_id: int, db: AsyncSession):
+    application = await db.get(Application, app_id)
+    if not application:
+        raise HTTPException(status_code=404, detail="Aplicación no encontrada")
+    job = lifecycle_engine.submit(action, app_id)
+    return RedirectResponse(url=f"/applications/{app_id}?job={job.id}", status_code=303)
 
 @router.post("/{app_id}/start")
-def start_application_form(app_id: int, current_user: User = Depends(login_required), db: Session = Depends(get_db)):
-    process_manager = ProcessManager(db)
-    process_manager.start_application(app_id)
-    return RedirectResponse(url=f"/applications/{app_id}", status_code=303)
+async def start_application_form(app_id: int, current_user: User = Depends(login_required),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await _submit_lifecycle_form("start", app_id, db)
 
 @router.post("/{app_id}/stop")
-def stop_application_form(app_id: int, current_user: User = Depends(login_required), db: Session = Depends(get_db)):
-    process_manager = ProcessManager(db)
-    process_manager.stop_application(app_id)
-    return RedirectResponse(url=f"/applications/{app_id}", status_code=303)
+async def stop_application_form(app_id: int, current_user: User = Depends(login_required),
+                                db: AsyncSession = Depends(get_async_db)):
+    return await _submit_lifecycle_form("stop", app_id, db)
 
 @router.post("/{app_id}/restart")
-def restart_application_form(app_id: int, current_user: User = Depends(login_required), db: Session = Depends(get_db)):
-    process_manager = ProcessManager(db)
-    process_manager.restart_application(app_id)
-    return RedirectResponse(url=f"/applications/{app_id}", status_code=303)
+async def restart_application_form(
+    app_id: int,
+    mode: Optional[str] = Form(None),
+    current_user: User = Depends(login_required),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _submit_lifecycle_form("blue-green" if mode == "blue-green" else "restart", app_id, db)
+
+@router.post("/{app_id}/settings")
+def save_application_settings(
+    app_id: int,
+    server: Optional[str] = Form(None),
+    workers: Optional[str] = Form(None),
+    threads: Optional[str] = Form(None),
+    health_check_path: Optional[str] = Form(None),
+    restart_policy: Optional[str] = Form(None),
+    proxy_host: Optional[str] = Form(None),
+    proxy_path: Optional[str] = Form(None),
+    log_max_size_mb: Optional[str] = Form(None),
+    log_max_age_hours: Optional[str] = Form(None),
+    log_keep: Optional[str] = Form(None),
+    log_compress: Optional[str] = Form(None),
+    output_capture_mode: Optional[str] = Form(None, alias="output_capture"),
+    current_user: User = Depends(login_required),
+    db: Session = Depends(get_db)
+):
+    application = db.query(Application).filter(Application.id == app_id).first()
+    if not application:
+        return RedirectResponse(url="/", status_code=303)
+
+    try:
+        log_limits = [
+            int(value) if value and value.strip() else None
+            for value in (log_max_size_mb, log_max_age_hours, log_keep)
+        ]
+    except ValueError:
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error=Los límites de rotación de logs deben ser números enteros", status_code=303)
+    if any(value is not None and value < 0 for value in log_limits):
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error=Los límites de rotación de logs no pueden ser negativos", status_code=303)
+
+    proxy_host = proxy_host.strip().lower() if proxy_host and proxy_host.strip() else None
+    proxy_path = proxy_path.strip().rstrip("/") if proxy_path and proxy_path.strip() else None
+    if proxy_path and not proxy_path.startswith("/"):
+        proxy_path = f"/{proxy_path}"
+    if proxy_host or proxy_path:
+        taken = db.query(Application).filter(
+            Application.id != app_id,
+            Application.proxy_host == proxy_host,
+            Application.proxy_path == proxy_path
+        ).first()
+        if taken:
+            return RedirectResponse(url=f"/applications/{app_id}?settings_error=The proxy route is already used by {taken.name}", status_code=303)
+
+    server = server.lower() if server else None
+    if server and server not in APP_SERVERS.get(application.app_type.lower(), ()):
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error=Servidor no disponible para este tipo de aplicación", status_code=303)
+    if output_capture_mode and output_capture_mode not in CAPTURE_MODES:
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error=Modo de captura de salida no válido", status_code=303)
+    if restart_policy and restart_policy not in ("no", "on-failure", "always"):
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error=Política de reinicio no válida", status_code=303)
+    try:
+        workers = normalize_worker_setting(workers)
+        threads = normalize_worker_setting(threads)
+    except ValueError as e:
+        return RedirectResponse(url=f"/applications/{app_id}?settings_error={e}", status_code=303)
+
+    if health_check_path and not health_check_path.startswith("/"):
+        health_check_path = f"/{health_check_path}"
+
+    application.server = server
+    application.workers = workers
+    application.threads = threads
+    application.health_check_path = health_check_path or None
+    application.restart_policy = restart_policy or None
+    application.proxy_host = proxy_host
+    application.proxy_path = proxy_path
+    application.log_max_size_mb, application.log_max_age_hours, application.log_keep = log_limits
+    application.log_compress = {"yes": True, "no": False}.get(log_compress)
+    application.output_capture = output_capture_mode or None
+    db.commit()
+
+    return RedirectResponse(url=f"/applications/{app_id}?settings_success=Settings saved. They apply on the next start or restart.", status_code=303)
 
 @router.post("/{app_id}/delete")
 def delete_application_form(app_id: int, current_user: User = Depends(login_required), db: Session = Depends(get_db)):
@@ -139,5 +260,8 @@ def delete_application_form(app_id: int, current_user: User = Depends(login_requ
         # Eliminar la aplicación
         db.delete(db_application)
         db.commit()
+        launch_plans.invalidate(app_id)
+        output_capture.forget(app_id)
+        log_search.forget(app_id)
     
     return RedirectResponse(url="/", status_code=303)
\ No newline at end of file
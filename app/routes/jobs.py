@@ -0,0 +1,30 @@
+from fastapi import Depends, HTTPException, APIRouter
+from typing import Optional
+from app.auth import login_required
+from app.models import User
+from app.services import lifecycle_engine
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+@router.get("")
+def list_jobs(
+    app_id: Optional[int] = None,
+    limit: int = 50,
+    current_user: User = Depends(login_required)
+):
+    jobs = lifecycle_engine.list_jobs(app_id=app_id, limit=max(1, min(limit, 500)))
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+@router.get("/batches/{batch_id}")
+def get_batch(batch_id: str, current_user: User = Depends(login_required)):
+    batch = lifecycle_engine.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return batch.to_dict()
+
+@router.get("/{job_id}")
+def get_job(job_id: str, current_user: User = Depends(login_required)):
+    job = lifecycle_engine.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job.to_dict()
@@ -0,0 +1,11 @@
+from fastapi import Depends, APIRouter
+from app.auth import login_required
+from app.models import User
+from app.services import loop_monitor
+
+router = APIRouter(prefix="/api/system", tags=["system"])
+
+@router.get("/loop-lag")
+def get_loop_lag(current_user: User = Depends(login_required)):
+    """Retraso del event loop del panel medido por el monitor, en milisegundos."""
+    return loop_monitor.stats()
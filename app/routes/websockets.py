@@ -1,47 +1,206 @@
 #main.py
-from fastapi import Depends, WebSocket, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import WebSocket, WebSocketDisconnect, APIRouter
+import asyncio
+import datetime
 import os
-from app.db import get_db
+from typing import Optional
+from app.db import AsyncSessionLocal
 from app.models import Application
-from app.utils import tail_file
+from app.services import metrics_sampler, tail_hub, output_capture, read_missed
+from app.services.tail import FRAME_MAX_SIZE
 
 router = APIRouter(prefix="/api/applications", tags=["websockets"])
 
+
+def _frame(lines, timestamps=None, skipped: int = 0, position=None, capture: Optional[str] = None):
+    frame = {"timestamp": datetime.datetime.utcnow().isoformat(), "lines": lines, "skipped": skipped}
+    if timestamps:
+        # Hora de llegada de cada línea (captura por pipes)
+        frame["timestamps"] = timestamps
+    if isinstance(position, tuple):
+        # Posición en el fichero tras la última línea, para reanudar con ?file=&offset=
+        frame["file"], frame["offset"] = position
+    elif position is not None:
+        # Número de la última línea del buffer y su captura, para reanudar con ?seq=&capture=
+        frame["seq"] = position
+        frame["capture"] = capture
+    return frame
+
+
+async def _send_batches(websocket: WebSocket, subscription, capture: Optional[str] = None):
+    while True:
+        lines, timestamps, skipped, position = await subscription.next_batch()
+        await websocket.send_json(_frame(lines, timestamps, skipped, position, capture))
+
+
+async def _send_replay(websocket: WebSocket, lines, positions, timestamps=None, capture: Optional[str] = None):
+    """Envía líneas ya conocidas en frames de hasta FRAME_MAX_SIZE caracteres, cada uno con su posición."""
+    start, size = 0, 0
+    for i, line in enumerate(lines):
+        size += len(line)
+        if size > FRAME_MAX_SIZE or i == len(lines) - 1:
+            await websocket.send_json(_frame(
+                lines[start:i + 1], timestamps[start:i + 1] if timestamps else None,
+                position=positions[i], capture=capture
+            ))
+            start, size = i + 1, 0
+
+
+async def stream_log_file(websocket: WebSocket, file_path: str, file_id: Optional[str] = None,
+                          offset: Optional[int] = None):
+    """
+    Envía por el websocket las últimas líneas del fichero y después las
+    líneas nuevas, agrupadas en frames `{"timestamp", "lines", "skipped"}`
+    con la posición tras la última línea (`file`, `offset`). La lectura la
+    hace el TailHub, compartida entre todos los clientes que siguen el mismo
+    fichero. Mientras un envío está en curso las líneas se acumulan en la
+    suscripción; si el cliente es demasiado lento se descartan las más
+    antiguas y `skipped` indica cuántas.
+
+    Un cliente que se reconecta pasa la última posición recibida y, en lugar
+    del historial, recibe exactamente lo escrito desde entonces (hasta
+    REPLAY_MAX_BYTES), aunque el log se haya rotado entre medias.
+    """
+    subscription = tail_hub.subscribe(file_path)
+    try:
+        position = tail_hub.position(file_path)
+        if file_id is not None and offset is not None and position is not None:
+            await websocket.send_json(_frame(["✓ Conexión reanudada, monitoreando logs..."]))
+            try:
+                entries, dropped = await asyncio.get_running_loop().run_in_executor(
+                    None, read_missed, file_path, file_id, offset, position[0], position[1]
+                )
+            except OSError as e:
+                entries, dropped = [], 0
+                await websocket.send_json(_frame([f"⚠️ No se pudo recuperar lo perdido: {e}"]))
+            if dropped:
+                await websocket.send_json(_frame([f"--- {dropped} bytes anteriores no recuperados ---"]))
+            await _send_replay(websocket, [line for line, _ in entries], [pos for _, pos in entries])
+        else:
+            await websocket.send_json(_frame(["✓ Conexión establecida, monitoreando logs..."], position=position))
+            history = tail_hub.history(file_path)
+            if history:
+                await websocket.send_json(_frame([f"[Histórico] {line}" for line in history], position=position))
+        await _send_batches(websocket, subscription)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: envío sobre una conexión ya cerrada
+        pass
+    finally:
+        await tail_hub.unsubscribe(file_path, subscription)
+
+
+async def stream_captured_output(websocket: WebSocket, stream, history_lines: int = 200, after: Optional[int] = None,
+                                 capture: Optional[str] = None):
+    """
+    Como stream_log_file, pero para una aplicación en modo de captura "pipe":
+    el historial sale del buffer en memoria y cada línea lleva su hora de
+    llegada, sin leer el fichero. Los frames llevan el número de la última
+    línea (`seq`) y la captura que la numeró (`capture`); al reconectar con
+    ambos se reenvían las posteriores que sigan en el buffer. Con una captura
+    distinta (el panel se reinició) se trata como una conexión nueva.
+    """
+    if capture != stream.capture_id:
+        after = None
+    subscription, history, missed = stream.subscribe(history_lines, after, capture)
+    try:
+        if after is None:
+            await websocket.send_json(_frame(["✓ Conexión establecida, monitoreando salida capturada..."]))
+        else:
+            await websocket.send_json(_frame(["✓ Conexión reanudada, monitoreando salida capturada..."]))
+        if missed:
+            await websocket.send_json(_frame([f"--- {missed} líneas anteriores ya no están en el buffer ---"]))
+        if history:
+            prefix = "[Histórico] " if after is None else ""
+            await _send_replay(
+                websocket,
+                [f"{prefix}{line}" for _, line, _ in history],
+                [seq for _, _, seq in history],
+                [timestamp for timestamp, _, _ in history],
+                stream.capture_id
+            )
+        await _send_batches(websocket, subscription, stream.capture_id)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        stream.unsubscribe(subscription)
+
+
+async def _get_application(app_id: int) -> Optional[Application]:
+    # Sesión async y corta: un websocket puede durar horas y no debe retener
+    # una conexión del pool ni bloquear el event loop con la consulta
+    async with AsyncSessionLocal() as db:
+        return await db.get(Application, app_id)
+
+
+async def _stream_output(websocket: WebSocket, application: Application, log_type: str,
+                         file_id: Optional[str] = None, offset: Optional[int] = None, seq: Optional[int] = None,
+                         capture: Optional[str] = None):
+    stream = output_capture.get(application.id, log_type)
+    if stream is not None and stream.active:
+        await stream_captured_output(websocket, stream, after=seq, capture=capture)
+        return
+    log_file = os.path.join(application.directory, "logs", f"{log_type}.log")
+    if not os.path.exists(log_file):
+        await websocket.close(code=1008, reason=f"{log_type}.log no encontrado")
+        return
+    await stream_log_file(websocket, log_file, file_id, offset)
+
 @router.websocket("/{app_id}/stdout-logs/")
 async def api_stdout_logs(
     websocket: WebSocket,
     app_id: int,
-    db: Session = Depends(get_db)
+    file: Optional[str] = None,
+    offset: Optional[int] = None,
+    seq: Optional[int] = None,
+    capture: Optional[str] = None
 ):
     # Aceptar la conexión WebSocket
     await websocket.accept()
     # Validar existencia de la aplicación
-    application = db.query(Application).filter(Application.id == app_id).first()
+    application = await _get_application(app_id)
     if not application:
         await websocket.close(code=1008, reason="Aplicación no encontrada")
         return
-    # Ruta del archivo stdout.log
-    log_file = os.path.join(application.directory, "logs", "stdout.log")
-    if not os.path.exists(log_file):
-        await websocket.close(code=1008, reason="stdout.log no encontrado")
-        return
-    # Iniciar streaming del archivo
-    await tail_file(websocket, log_file)
+    # Iniciar streaming de la salida (buffer en memoria o archivo stdout.log);
+    # file/offset o seq y capture reanudan desde la última posición recibida
+    await _stream_output(websocket, application, "stdout", file, offset, seq, capture)
 
 @router.websocket("/{app_id}/stderr-logs/")
 async def api_stderr_logs(
     websocket: WebSocket,
     app_id: int,
-    db: Session = Depends(get_db)
+    file: Optional[str] = None,
+    offset: Optional[int] = None,
+    seq: Optional[int] = None,
+    capture: Optional[str] = None
 ):
     await websocket.accept()
-    application = db.query(Application).filter(Application.id == app_id).first()
+    application = await _get_application(app_id)
     if not application:
         await websocket.close(code=1008, reason="Aplicación no encontrada")
         return
-    log_file = os.path.join(application.directory, "logs", "stderr.log")
-    if not os.path.exists(log_file):
-        await websocket.close(code=1008, reason="stderr.log no encontrado")
+    await _stream_output(websocket, application, "stderr", file, offset, seq, capture)
+
+@router.websocket("/{app_id}/metrics/ws")
+async def api_metrics_stream(
+    websocket: WebSocket,
+    app_id: int
+):
+    await websocket.accept()
+    application = await _get_application(app_id)
+    if not application:
+        await websocket.close(code=1008, reason="Aplicación no encontrada")
         return
-    await tail_file(websocket, log_file)
\ No newline at end of file
+
+    # Historial disponible y después cada muestra nueva
+    queue = metrics_sampler.subscribe(app_id)
+    try:
+        await websocket.send_json({"history": metrics_sampler.get_samples(app_id)})
+        while True:
+            sample = await queue.get()
+            await websocket.send_json({"sample": sample})
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: envío sobre una conexión ya cerrada
+        pass
+    finally:
+        metrics_sampler.unsubscribe(app_id, queue)
\ No newline at end of file
@@ -1 +1,16 @@
-from .process_manager import ProcessManager
\ No newline at end of file
+from .process_manager import ProcessManager, APP_SERVERS, normalize_worker_setting, resolve_worker_settings
+from .lifecycle import LifecycleEngine, lifecycle_engine, select_applications, select_applications_async, DEFAULT_CONCURRENCY, JOB_ACTIONS
+from .log_sink import LogSink, log_sink
+from .log_queries import get_log_page
+from .log_export import export_logs, EXPORT_FORMATS
+from .launch_plans import LaunchPlan, LaunchPlanCache, launch_plans
+from .front import FrontManager, front_manager
+from .proxy import ReverseProxy, reverse_proxy
+from .log_rotation import LogRotator, log_rotator, list_segments, segment_path, file_identity, rotation_settings, OUTPUT_LOGS
+from .log_reader import tail_lines, read_since, read_missed
+from .tail import FileTail, TailHub, TailSubscription, tail_hub
+from .output_capture import OutputCapture, output_capture, CAPTURE_MODES
+from .log_search import LogSearchIndex, log_search, SEARCH_STREAMS
+from .supervisor import Supervisor, supervisor
+from .metrics import MetricsSampler, metrics_sampler, load_metrics_snapshot, SERVER_KEY
+from .loop_monitor import LoopLagMonitor, loop_monitor
\ No newline at end of file
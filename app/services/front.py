@@ -0,0 +1,229 @@
+#front.py
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+from app.db import SessionLocal
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de lectura al copiar datos entre el cliente y la aplicación
+CHUNK_SIZE = 64 * 1024
+
+
+class FrontListener:
+    """
+    Escucha en el puerto público de una aplicación y reenvía cada conexión TCP
+    al puerto interno de la instancia activa. Cambiar de instancia solo afecta
+    a las conexiones nuevas; las abiertas siguen con la instancia anterior y se
+    cuentan por puerto para poder esperar a que terminen.
+    """
+
+    def __init__(self, app_id: int, public_port: int, backend_port: int):
+        self.app_id = app_id
+        self.public_port = public_port
+        self.backend_port = backend_port
+        self.active: Dict[int, int] = defaultdict(int)
+        self._tasks = set()
+        self._changed = asyncio.Condition()
+        self._server = None
+
+    async def open(self, reuse_port: bool = False):
+        """
+        Abre el socket de escucha. Con `reuse_port` se activa SO_REUSEPORT para
+        compartir el puerto con una instancia que también lo usa; si esta no lo
+        usa (o la plataforma no lo admite) falla en lugar de esperar a que se libere.
+        """
+        self._server = await asyncio.start_server(
+            self._handle, host="0.0.0.0", port=self.public_port, reuse_address=True,
+            reuse_port=reuse_port or None
+        )
+
+    async def close(self):
+        if self._server is not None:
+            # Sin wait_closed(): desde Python 3.12 espera también a las conexiones abiertas
+            self._server.close()
+            self._server = None
+
+    async def drain(self, backend_port: int, timeout: float) -> bool:
+        """Espera a que no queden conexiones abiertas hacia `backend_port`. Devuelve False si vence el plazo."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.active.get(backend_port, 0) == 0), timeout
+                )
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        backend_port = self.backend_port
+        self.active[backend_port] += 1
+        # asyncio suelta su referencia a la tarea cuando el cliente cierra; sin
+        # esta, el recolector podría destruirla mientras la respuesta sigue en curso
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", backend_port)
+            except OSError:
+                writer.close()
+                return
+            await asyncio.gather(
+                self._pipe(reader, upstream_writer),
+                self._pipe(upstream_reader, writer)
+            )
+            upstream_writer.close()
+            writer.close()
+        finally:
+            self._tasks.discard(task)
+            self.active[backend_port] -= 1
+            if not self.active[backend_port]:
+                del self.active[backend_port]
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.read(CHUNK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            # Medio cierre: el otro sentido puede seguir enviando la respuesta
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (ConnectionError, OSError):
+            # Al cerrar este extremo, la copia en sentido contrario recibe EOF y termina
+            writer.close()
+
+
+class FrontManager:
+    """
+    Gestiona los FrontListener del panel para las aplicaciones con puerto
+    interno (`Application.backend_port`). Vive en el event loop del panel; los
+    hilos de trabajo (p. ej. ProcessManager dentro del LifecycleEngine) usan
+    los métodos síncronos, que se ejecutan en ese loop y esperan el resultado.
+
+    Periódicamente se sincroniza con la base de datos, de modo que las
+    aplicaciones arrancadas desde la CLI también quedan publicadas y las
+    detenidas liberan su puerto público.
+    """
+
+    def __init__(self, sync_interval: float = 2.0):
+        self.sync_interval = sync_interval
+        self._listeners: Dict[int, FrontListener] = {}
+        self._loop = None
+        self._task = None
+
+    @property
+    def available(self) -> bool:
+        """True si el panel está en marcha en este proceso (la CLI no tiene listeners)."""
+        return self._loop is not None and self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for app_id in list(self._listeners):
+            await self._close(app_id)
+        self._loop = None
+
+    def get(self, app_id: int) -> Optional[FrontListener]:
+        return self._listeners.get(app_id)
+
+    # --- API síncrona para hilos de trabajo ---
+
+    def publish(self, app_id: int, public_port: int, backend_port: int, reuse_port: bool = False):
+        """Abre el listener del puerto público, o cambia su destino si ya existe."""
+        return self._call(self._publish(app_id, public_port, backend_port, reuse_port))
+
+    def drain(self, app_id: int, backend_port: int, timeout: float) -> bool:
+        return self._call(self._drain(app_id, backend_port, timeout), timeout + 5)
+
+    def close(self, app_id: int):
+        if self.available:
+            self._call(self._close(app_id))
+
+    def _call(self, coro, timeout: Optional[float] = 30):
+        if not self.available:
+            coro.close()
+            raise RuntimeError("El listener frontal solo está disponible dentro del panel")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    # --- Implementación en el event loop ---
+
+    async def _publish(self, app_id: int, public_port: int, backend_port: int, reuse_port: bool = False):
+        listener = self._listeners.get(app_id)
+        if listener is not None and listener.public_port != public_port:
+            await self._close(app_id)
+            listener = None
+        if listener is None:
+            listener = FrontListener(app_id, public_port, backend_port)
+            await listener.open(reuse_port)
+            self._listeners[app_id] = listener
+            logger.info(f"App {app_id}: puerto {public_port} publicado hacia {backend_port}")
+        elif listener.backend_port != backend_port:
+            listener.backend_port = backend_port
+            logger.info(f"App {app_id}: tráfico de {public_port} cambiado a {backend_port}")
+
+    async def _drain(self, app_id: int, backend_port: int, timeout: float) -> bool:
+        listener = self._listeners.get(app_id)
+        if listener is None:
+            return True
+        return await listener.drain(backend_port, timeout)
+
+    async def _close(self, app_id: int):
+        listener = self._listeners.pop(app_id, None)
+        if listener is not None:
+            await listener.close()
+
+    async def _run(self):
+        while True:
+            try:
+                fronted = await self._loop.run_in_executor(None, self._load_fronted)
+                await self._sync(fronted)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al sincronizar los listeners frontales")
+            await asyncio.sleep(self.sync_interval)
+
+    def _load_fronted(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(Application.id, Application.port, Application.backend_port).filter(
+                Application.status == "running",
+                Application.backend_port.isnot(None),
+                Application.port.isnot(None)
+            ).all()
+            return {app_id: (port, backend_port) for app_id, port, backend_port in rows}
+        finally:
+            db.close()
+
+    async def _sync(self, fronted):
+        for app_id in list(self._listeners):
+            if app_id not in fronted:
+                await self._close(app_id)
+        for app_id, (public_port, backend_port) in fronted.items():
+            try:
+                await self._publish(app_id, public_port, backend_port)
+            except OSError as e:
+                logger.warning(f"App {app_id}: no se pudo publicar el puerto {public_port}: {e}")
+
+
+front_manager = FrontManager()
@@ -0,0 +1,89 @@
+#launch_plans.py
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Marcador del puerto dentro de los argumentos; el puerto cambia en cada
+# arranque (p. ej. en un reinicio sin cortes) y no forma parte del plan
+PORT = "\0port\0"
+
+
+def file_signature(path: Optional[str]):
+    """(mtime, inodo, tamaño) de un fichero o directorio, o None si no existe."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+class LaunchPlan:
+    """
+    Resultado de la detección de una aplicación: argumentos, entorno y
+    directorio ya resueltos. `watched` son las rutas cuyo cambio invalida el
+    plan (wsgi.py de Django, python del entorno virtual, script de conda) y
+    `settings` los campos de la aplicación con los que se construyó.
+    """
+
+    def __init__(self, argv: List[str], env: Dict[str, str], cwd: str,
+                 settings: Tuple, watched: List[str]):
+        self.argv = argv
+        self.env = env
+        self.cwd = cwd
+        self.settings = settings
+        self.watched = watched
+        self.signatures = [file_signature(path) for path in watched]
+        self.environ_size = len(os.environ)
+
+    def is_valid(self, settings: Tuple) -> bool:
+        # El entorno del panel casi nunca cambia; basta con detectar variables añadidas o quitadas
+        if settings != self.settings or len(os.environ) != self.environ_size:
+            return False
+        return all(file_signature(path) == signature for path, signature in zip(self.watched, self.signatures))
+
+    def command(self, port: int):
+        """(cmd, env, cwd) para lanzar en `port`. El entorno se copia para que Popen no comparta el del plan."""
+        port = str(port)
+        return [arg.replace(PORT, port) for arg in self.argv], dict(self.env), self.cwd
+
+
+def plan_settings(application) -> Tuple:
+    """Campos de la aplicación que determinan su plan de arranque."""
+    return (
+        application.directory, application.main_file, application.app_type,
+        application.environment_type, application.environment_path,
+        application.server, application.workers, application.threads,
+        os.cpu_count()
+    )
+
+
+class LaunchPlanCache:
+    """Planes de arranque por aplicación, válidos mientras no cambien sus ajustes ni los ficheros vigilados."""
+
+    def __init__(self):
+        self._plans: Dict[int, LaunchPlan] = {}
+        self._lock = threading.Lock()
+
+    def get(self, application) -> Optional[LaunchPlan]:
+        with self._lock:
+            plan = self._plans.get(application.id)
+        if plan is not None and plan.is_valid(plan_settings(application)):
+            return plan
+        return None
+
+    def put(self, app_id: int, plan: LaunchPlan):
+        with self._lock:
+            self._plans[app_id] = plan
+
+    def invalidate(self, app_id: Optional[int] = None):
+        with self._lock:
+            if app_id is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(app_id, None)
+
+
+launch_plans = LaunchPlanCache()
@@ -0,0 +1,343 @@
+#lifecycle.py
+
+import asyncio
+import datetime
+import fnmatch
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.configs import load_server_config
+from app.db import SessionLocal
+from app.models import Application
+from app.services.process_manager import ProcessManager
+
+logger = logging.getLogger(__name__)
+
+JOB_ACTIONS = ("start", "stop", "restart", "blue-green")
+
+DEFAULT_CONCURRENCY = 8
+
+
+def _selection_query(app_ids: Optional[List[int]], status: Optional[str]):
+    query = select(Application)
+    if app_ids:
+        query = query.where(Application.id.in_(app_ids))
+    if status:
+        query = query.where(Application.status == status)
+    return query.order_by(Application.id)
+
+
+def _filter_by_name(applications: List[Application], name: Optional[str]) -> List[Application]:
+    if not name:
+        return list(applications)
+    pattern = name.lower()
+    return [a for a in applications if fnmatch.fnmatchcase((a.name or "").lower(), pattern)]
+
+
+def select_applications(db: Session, app_ids: Optional[List[int]] = None, all_apps: bool = False,
+                        name: Optional[str] = None, status: Optional[str] = None) -> List[Application]:
+    """
+    Selecciona aplicaciones para una operación masiva.
+    `name` admite comodines estilo shell (p. ej. "api-*") y no distingue mayúsculas.
+    Sin ningún criterio no se selecciona nada, para evitar operar sobre todas por accidente.
+    """
+    if not (app_ids or all_apps or name or status):
+        return []
+    return _filter_by_name(db.scalars(_selection_query(app_ids, status)).all(), name)
+
+
+async def select_applications_async(db: AsyncSession, app_ids: Optional[List[int]] = None, all_apps: bool = False,
+                                    name: Optional[str] = None, status: Optional[str] = None) -> List[Application]:
+    """Igual que `select_applications`, con la sesión async de las rutas."""
+    if not (app_ids or all_apps or name or status):
+        return []
+    return _filter_by_name((await db.scalars(_selection_query(app_ids, status))).all(), name)
+
+
+class Job:
+    """
+    Operación de ciclo de vida (start/stop/restart/blue-green) que se ejecuta en segundo plano.
+    Los pasos se registran desde el hilo del worker a través de `step`.
+    """
+
+    def __init__(self, action: str, app_id: int):
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.app_id = app_id
+        self.status = "queued"  # "queued", "running", "succeeded", "failed"
+        self.error = None
+        self.steps = []
+        self.created_at = datetime.datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._started = None
+        self._step_started = None
+        self._duration_ms = None
+
+    def step(self, name: str):
+        """Cierra el paso en curso y abre uno nuevo."""
+        now = time.monotonic()
+        with self._lock:
+            self._close_step(now, "done")
+            self.steps.append({
+                "name": name,
+                "status": "running",
+                "started_at": datetime.datetime.utcnow().isoformat(),
+                "duration_ms": None
+            })
+            self._step_started = now
+
+    def mark_running(self):
+        with self._lock:
+            self.status = "running"
+            self.started_at = datetime.datetime.utcnow()
+            self._started = time.monotonic()
+
+    def finish(self, success: bool, error: Optional[str] = None):
+        now = time.monotonic()
+        with self._lock:
+            self._close_step(now, "done" if success else "failed")
+            self.status = "succeeded" if success else "failed"
+            self.error = error
+            self.finished_at = datetime.datetime.utcnow()
+            if self._started is not None:
+                self._duration_ms = round((now - self._started) * 1000, 1)
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def _close_step(self, now: float, status: str):
+        if self.steps and self.steps[-1]["status"] == "running":
+            self.steps[-1]["status"] = status
+            self.steps[-1]["duration_ms"] = round((now - self._step_started) * 1000, 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "action": self.action,
+                "app_id": self.app_id,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "duration_ms": self._duration_ms,
+                "steps": [dict(step) for step in self.steps]
+            }
+
+
+class Batch:
+    """Grupo de trabajos de una operación masiva, con resultado por aplicación y tiempo total."""
+
+    def __init__(self, action: str, app_ids: List[int], concurrency: int):
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.app_ids = list(app_ids)
+        self.concurrency = concurrency
+        self.jobs = {}
+        self.created_at = datetime.datetime.utcnow()
+        self.finished_at = None
+        self._started = time.monotonic()
+        self._wall_time_ms = None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def finish(self):
+        self.finished_at = datetime.datetime.utcnow()
+        self._wall_time_ms = round((time.monotonic() - self._started) * 1000, 1)
+
+    def to_dict(self):
+        results = []
+        for app_id in self.app_ids:
+            job = self.jobs.get(app_id)
+            if job is None:
+                results.append({"app_id": app_id, "job_id": None, "status": "queued", "error": None, "duration_ms": None})
+                continue
+            data = job.to_dict()
+            results.append({
+                "app_id": app_id,
+                "job_id": job.id,
+                "status": data["status"],
+                "error": data["error"],
+                "duration_ms": data["duration_ms"]
+            })
+
+        return {
+            "id": self.id,
+            "action": self.action,
+            "status": "finished" if self.done else "running",
+            "concurrency": self.concurrency,
+            "total": len(self.app_ids),
+            "succeeded": sum(1 for r in results if r["status"] == "succeeded"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "wall_time_ms": self._wall_time_ms,
+            "results": results
+        }
+
+
+class LifecycleEngine:
+    """
+    Cola asíncrona de operaciones de ciclo de vida.
+
+    Cada trabajo se ejecuta en un pool de hilos con su propia sesión de base de
+    datos, de modo que las esperas de psutil o ngrok no bloquean el event loop.
+    Las operaciones sobre una misma aplicación se serializan; las de
+    aplicaciones distintas corren en paralelo.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_history: int = 500):
+        # Sin valor explícito, el tamaño del pool sale de `lifecycle_workers` en server_config.json
+        if max_workers is None:
+            max_workers = int(load_server_config().get("lifecycle_workers", 8))
+        self.max_workers = max(1, max_workers)
+        self.max_history = max_history
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._batches = OrderedDict()
+        self._tasks = {}
+        self._app_locks = {}
+
+    def submit(self, action: str, app_id: int) -> Job:
+        """Encola una operación y devuelve el trabajo inmediatamente. Requiere un event loop activo."""
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"Acción no soportada: {action}")
+
+        job = Job(action, app_id)
+        self._remember(job)
+
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def wait(self, job_id: str) -> Optional[Job]:
+        """Espera a que termine un trabajo en curso y lo devuelve."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self._jobs.get(job_id)
+
+    def submit_batch(self, action: str, app_ids: List[int], concurrency: Optional[int] = None) -> Batch:
+        """
+        Encola la misma operación para varias aplicaciones. Se ejecutan como
+        mucho `concurrency` a la vez; por defecto DEFAULT_CONCURRENCY, sin
+        pasar del tamaño del pool de hilos. Un valor explícito fuera de
+        1..max_workers lanza ValueError en lugar de recortarse sin avisar.
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"Acción no soportada: {action}")
+
+        if concurrency is None:
+            concurrency = min(DEFAULT_CONCURRENCY, self.max_workers)
+        elif not 1 <= concurrency <= self.max_workers:
+            raise ValueError(f"La concurrencia debe estar entre 1 y {self.max_workers}")
+        batch = Batch(action, app_ids, concurrency)
+        self._batches[batch.id] = batch
+        while len(self._batches) > self.max_history and next(iter(self._batches.values())).done:
+            self._batches.popitem(last=False)
+
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._tasks[batch.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch.id, None))
+        return batch
+
+    async def wait_batch(self, batch_id: str) -> Optional[Batch]:
+        task = self._tasks.get(batch_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self._batches.get(batch_id)
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self._batches.get(batch_id)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, app_id: Optional[int] = None, limit: int = 50) -> List[Job]:
+        jobs = [job for job in reversed(self._jobs.values()) if app_id is None or job.app_id == app_id]
+        return jobs[:limit]
+
+    def active_jobs(self, app_id: Optional[int] = None) -> List[Job]:
+        return [job for job in self.list_jobs(app_id, limit=self.max_history) if not job.done]
+
+    async def shutdown(self):
+        """Espera los trabajos pendientes y libera el pool de hilos."""
+        pending = list(self._tasks.values())
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        # Descartar el historial más antiguo, pero nunca trabajos en curso
+        while len(self._jobs) > self.max_history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done:
+                break
+            self._jobs.pop(oldest_id)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="lifecycle")
+        return self._executor
+
+    async def _run(self, job: Job):
+        lock = self._app_locks.setdefault(job.app_id, asyncio.Lock())
+        async with lock:
+            job.mark_running()
+            loop = asyncio.get_running_loop()
+            try:
+                success, error = await loop.run_in_executor(self._get_executor(), self._execute, job)
+                job.finish(success, error)
+            except Exception as e:
+                logger.exception(f"Error en el trabajo {job.id} ({job.action} app {job.app_id})")
+                job.finish(False, str(e))
+
+    async def _run_batch(self, batch: Batch):
+        semaphore = asyncio.Semaphore(batch.concurrency)
+
+        async def run_one(app_id):
+            async with semaphore:
+                job = self.submit(batch.action, app_id)
+                batch.jobs[app_id] = job
+                await self.wait(job.id)
+
+        try:
+            await asyncio.gather(*(run_one(app_id) for app_id in batch.app_ids))
+        finally:
+            batch.finish()
+
+    def _execute(self, job: Job):
+        db = SessionLocal()
+        try:
+            process_manager = ProcessManager(db, progress=job.step)
+            if job.action == "start":
+                success = process_manager.start_application(job.app_id)
+            elif job.action == "stop":
+                success = process_manager.stop_application(job.app_id)
+            elif job.action == "blue-green":
+                success = process_manager.blue_green_restart(job.app_id)
+            else:
+                success = process_manager.restart_application(job.app_id)
+            return bool(success), None if success else process_manager.last_error
+        finally:
+            db.close()
+
+
+lifecycle_engine = LifecycleEngine()
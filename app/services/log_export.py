@@ -0,0 +1,129 @@
+#log_export.py
+
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import Iterator, Optional
+from app.db import SessionLocal
+from app.models import Log
+
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "json": ("json", "application/json"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+}
+
+# Filas que se leen de la base de datos en cada vuelta del cursor
+FETCH_SIZE = 1000
+# Bytes que se acumulan antes de entregar un trozo a la respuesta
+CHUNK_SIZE = 64 * 1024
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _rows(app_id: int, since: Optional[datetime.datetime], until: Optional[datetime.datetime],
+          level: Optional[str]):
+    """
+    Recorre los logs de la aplicación de más reciente a más antiguo sin
+    cargarlos todos: `yield_per` va pidiendo lotes al cursor de la base de
+    datos. Usa su propia sesión porque el generador se consume después de que
+    la ruta haya devuelto la respuesta.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(Log.id, Log.timestamp, Log.level, Log.message).filter(Log.application_id == app_id)
+        if since is not None:
+            query = query.filter(Log.timestamp >= since)
+        if until is not None:
+            query = query.filter(Log.timestamp < until)
+        if level:
+            query = query.filter(Log.level == level)
+        query = query.order_by(Log.timestamp.desc(), Log.id.desc()).yield_per(FETCH_SIZE)
+        for row in query:
+            yield row
+    finally:
+        db.close()
+
+
+def _csv_lines(rows) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["ID", "Fecha", "Nivel", "Mensaje"])
+    for log_id, timestamp, level, message in rows:
+        writer.writerow([log_id, timestamp.strftime(TIMESTAMP_FORMAT), level, message])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _record(log_id, timestamp, level, message) -> str:
+    return json.dumps({
+        "id": log_id,
+        "message": message,
+        "level": level,
+        "timestamp": timestamp.strftime(TIMESTAMP_FORMAT)
+    }, ensure_ascii=False)
+
+
+def _json_lines(rows) -> Iterator[str]:
+    separator = "[\n  "
+    for row in rows:
+        yield separator + _record(*row)
+        separator = ",\n  "
+    # Sin filas el documento sigue siendo un array válido
+    yield "[]\n" if separator == "[\n  " else "\n]\n"
+
+
+def _ndjson_lines(rows) -> Iterator[str]:
+    for row in rows:
+        yield _record(*row) + "\n"
+
+
+def _buffered(parts: Iterator[str]) -> Iterator[bytes]:
+    """Agrupa los fragmentos en trozos de ~CHUNK_SIZE bytes para no escribir una vez por fila."""
+    pending, size = [], 0
+    for part in parts:
+        data = part.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def _gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # wbits=31: cabecera y cola gzip, para que el fichero descargado sea un .gz normal
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_logs(app_id: int, fmt: str = "csv", since: Optional[datetime.datetime] = None,
+                until: Optional[datetime.datetime] = None, level: Optional[str] = None,
+                compress: bool = False) -> Iterator[bytes]:
+    """
+    Genera la exportación de los logs de una aplicación por trozos, para
+    servirla con StreamingResponse sin tener el historial entero en memoria
+    ni en un fichero temporal. `fmt` es una de EXPORT_FORMATS; con
+    `compress` la salida se comprime en gzip sobre la marcha.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    rows = _rows(app_id, since, until, level)
+    if fmt == "json":
+        parts = _json_lines(rows)
+    elif fmt == "ndjson":
+        parts = _ndjson_lines(rows)
+    else:
+        parts = _csv_lines(rows)
+    chunks = _buffered(parts)
+    return _gzipped(chunks) if compress else chunks
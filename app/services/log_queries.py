@@ -0,0 +1,46 @@
+#log_queries.py
+
+import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.models import Log
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(log: Log) -> str:
+    return f"{log.timestamp.isoformat()}_{log.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Inversa de `encode_cursor`; lanza ValueError si el cursor no es válido."""
+    timestamp, _, log_id = cursor.rpartition("_")
+    return datetime.datetime.fromisoformat(timestamp), int(log_id)
+
+
+def get_log_page(db: Session, app_id: int, limit: int = 50, cursor: Optional[str] = None,
+                 level: Optional[str] = None) -> Tuple[List[Log], Optional[str]]:
+    """
+    Página de logs de una aplicación, de más reciente a más antiguo, y el
+    cursor de la siguiente (None si no hay más).
+
+    Paginación por clave (timestamp, id) en lugar de OFFSET: cada página
+    continúa justo después de la última fila vista usando el índice
+    (application_id, timestamp), así que su coste no depende de la
+    profundidad ni del tamaño de la tabla.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(Log).filter(Log.application_id == app_id)
+    if level:
+        query = query.filter(Log.level == level)
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Log.timestamp < timestamp,
+            and_(Log.timestamp == timestamp, Log.id < log_id)
+        ))
+
+    logs = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return logs[:limit], next_cursor
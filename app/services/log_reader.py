@@ -0,0 +1,160 @@
+#log_reader.py
+
+import os
+from typing import List, Tuple
+from app.services.log_rotation import segment_path
+
+# Bloque leído hacia atrás desde el final al buscar las últimas líneas
+TAIL_BLOCK = 64 * 1024
+# Máximo que se recorre hacia atrás (líneas muy largas) y líneas que se pueden pedir
+TAIL_MAX_BYTES = 16 * 1024 * 1024
+TAIL_MAX_LINES = 10000
+# Bytes devueltos por defecto y como máximo en cada consulta incremental
+SINCE_DEFAULT_BYTES = 1024 * 1024
+SINCE_MAX_BYTES = 8 * 1024 * 1024
+# Máximo que se recupera al reanudar un websocket; de lo perdido se envía lo más reciente
+REPLAY_MAX_BYTES = 1024 * 1024
+
+
+def tail_lines(path: str, lines: int) -> Tuple[List[str], int]:
+    """
+    Últimas `lines` líneas de `path` y el tamaño del fichero al leerlas, que
+    sirve como desplazamiento para seguir con `read_since`. Lee bloques hacia
+    atrás desde el final, así que el coste no depende del tamaño del log.
+    """
+    lines = max(1, min(lines, TAIL_MAX_LINES))
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        position = size
+        blocks = []
+        newlines = 0
+        # Un salto final no abre una línea nueva
+        needed = lines + 1
+        while position > 0 and newlines < needed and size - position < TAIL_MAX_BYTES:
+            step = min(TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    data = b"".join(reversed(blocks))
+    result = data.decode("utf-8", errors="replace").splitlines()
+    if position > 0 and result:
+        # La primera línea puede estar incompleta
+        result = result[1:]
+    return result[-lines:], size
+
+
+def read_since(path: str, offset: int, max_bytes: int = SINCE_DEFAULT_BYTES, segment: int = 0) -> dict:
+    """
+    Lo escrito en `path` desde el desplazamiento `offset`, solo líneas
+    completas y como mucho `max_bytes`. Devuelve también `next_offset` y
+    `next_segment` para la siguiente consulta y `more` si quedó contenido por leer.
+
+    Si el fichero es más pequeño que `offset` se ha rotado (copytruncate): se
+    devuelve lo que faltaba del segmento `.1`, con `rotated` a True, y se
+    sigue desde el principio del fichero nuevo. Si lo pendiente de `.1` no
+    cabe en `max_bytes`, `next_segment` vale 1 y `next_offset` apunta dentro
+    de `.1`. Para detectar la rotación hay que consultar más a menudo de lo
+    que tarda el log en volver a crecer hasta `offset`.
+    """
+    max_bytes = max(1, min(max_bytes, SINCE_MAX_BYTES))
+    size = os.path.getsize(path)
+    rotated = segment == 0 and offset > size
+    data = b""
+    if rotated or segment == 1:
+        previous = segment_path(path, 1)
+        if previous and not previous.endswith(".gz"):
+            # .1 ya no crece: su última línea se entrega aunque no acabe en salto
+            data, offset, more = _read_complete(previous, offset, max_bytes, final=True)
+            if more:
+                return _since_result(data, offset, 1, size, rotated, more)
+        offset = 0
+
+    chunk, offset, more = _read_complete(path, offset, max_bytes - len(data))
+    return _since_result(data + chunk, offset, 0, size, rotated, more)
+
+
+def _since_result(data: bytes, offset: int, segment: int, size: int, rotated: bool, more: bool) -> dict:
+    return {
+        "data": data.decode("utf-8", errors="replace"),
+        "next_offset": offset,
+        "next_segment": segment,
+        "size": size,
+        "rotated": rotated,
+        "more": more
+    }
+
+
+def _read_complete(path: str, offset: int, max_bytes: int, final: bool = False) -> Tuple[bytes, int, bool]:
+    """
+    Lee desde `offset` hasta el último salto de línea; una línea más larga
+    que `max_bytes` se entrega partida, y con `final` (fichero que ya no
+    crece) también la última sin salto. Devuelve (datos, nuevo
+    desplazamiento, si se llegó al límite y puede quedar más).
+    """
+    if max_bytes <= 0:
+        return b"", offset, True
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    full = len(data) == max_bytes
+    if final and not full:
+        return data, offset + len(data), False
+    end = data.rfind(b"\n") + 1
+    if end == 0 and full:
+        end = len(data)
+    return data[:end], offset + end, full
+
+
+def read_missed(path: str, file_id: str, offset: int, current_id: str, end: int,
+                max_bytes: int = REPLAY_MAX_BYTES) -> Tuple[List[Tuple[str, Tuple[str, int]]], int]:
+    """
+    Líneas que un cliente no recibió entre su última posición (`file_id`,
+    `offset`) y la posición (`current_id`, `end`) desde la que el tail le
+    enviará lo nuevo. Si el log se rotó entre medias se incluye el resto del
+    segmento `.1`; si se sustituyó o truncó, el fichero actual desde el
+    principio.
+
+    Devuelve ([(línea, (identidad, desplazamiento tras ella)), ...], bytes
+    omitidos). Con más de `max_bytes` pendientes se recuperan los últimos.
+    """
+    inode, _, rotated_at = file_id.partition("-")
+    current_inode, _, current_rotated_at = current_id.partition("-")
+    sources = []
+    if inode == current_inode and rotated_at != current_rotated_at:
+        previous = segment_path(path, 1)
+        if previous and not previous.endswith(".gz"):
+            sources.append((previous, offset, max(offset, os.path.getsize(previous)), file_id))
+        offset = 0
+    elif inode != current_inode or offset > os.path.getsize(path):
+        offset = 0
+    sources.append((path, min(offset, end), end, current_id))
+
+    dropped = max(0, sum(stop - start for _, start, stop, _ in sources) - max_bytes)
+    skip = dropped
+    entries = []
+    for source, start, stop, identity in sources:
+        if skip >= stop - start:
+            skip -= stop - start
+            continue
+        with open(source, "rb") as f:
+            f.seek(start + skip)
+            data = f.read(stop - start - skip)
+        start += skip
+        if skip:
+            # Empezar en la primera línea completa
+            cut = data.find(b"\n") + 1 or len(data)
+            data = data[cut:]
+            start += cut
+            dropped += cut
+            skip = 0
+        parts = data.split(b"\n")
+        if parts and not parts[-1]:
+            parts.pop()
+        for part in parts:
+            start = min(start + len(part) + 1, stop)
+            line = part.decode("utf-8", errors="replace").rstrip("\r")
+            if line.strip():
+                entries.append((line, (identity, start)))
+    return entries, dropped
@@ -0,0 +1,223 @@
+#log_rotation.py
+
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+from app.configs import load_server_config
+from app.db import SessionLocal
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_LOGS = ("stdout", "stderr")
+COPY_SIZE = 1024 * 1024
+
+
+def output_log_path(application, log_type: str) -> str:
+    return os.path.join(application.directory, "logs", f"{log_type}.log")
+
+
+def segment_path(path: str, index: int) -> Optional[str]:
+    """
+    Fichero del segmento `index` de un log: 0 es el actual, 1 el último
+    rotado (sin comprimir) y los siguientes, más antiguos, pueden estar en
+    .gz. None si no existe.
+    """
+    if index == 0:
+        return path if os.path.exists(path) else None
+    for candidate in (f"{path}.{index}", f"{path}.{index}.gz"):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def file_identity(path: str) -> str:
+    """
+    Identifica el contenido actual de un log para reanudar lecturas por
+    desplazamiento: el inodo del fichero (cambia si se sustituye) y la fecha
+    de su segmento `.1` (cambia con cada rotación, que conserva el inodo).
+    """
+    inode = os.stat(path).st_ino
+    previous = segment_path(path, 1)
+    rotated_at = os.stat(previous).st_mtime_ns // 1000000 if previous else 0
+    return f"{inode}-{rotated_at}"
+
+
+def list_segments(path: str) -> List[dict]:
+    """Segmentos existentes de un log, del actual al más antiguo."""
+    segments = []
+    index = 0
+    while True:
+        current = segment_path(path, index)
+        if current is None:
+            if index == 0:
+                index += 1
+                continue
+            return segments
+        st = os.stat(current)
+        segments.append({
+            "segment": index,
+            "file": os.path.basename(current),
+            "size": st.st_size,
+            "modified_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(st.st_mtime)),
+            "compressed": current.endswith(".gz")
+        })
+        index += 1
+
+
+def rotation_settings(application, config: Optional[dict] = None) -> dict:
+    """Ajustes de rotación de la aplicación; los campos vacíos toman el valor de server_config.json."""
+    config = config or load_server_config()
+
+    def pick(value, key):
+        return config[key] if value is None else value
+
+    return {
+        "max_size_mb": pick(application.log_max_size_mb, "log_max_size_mb"),
+        "max_age_hours": pick(application.log_max_age_hours, "log_max_age_hours"),
+        "keep": pick(application.log_keep, "log_keep"),
+        "compress": pick(application.log_compress, "log_compress"),
+    }
+
+
+def _compress(source: str):
+    with open(source, "rb") as src, gzip.open(f"{source}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_SIZE)
+    os.remove(source)
+
+
+def rotate_file(path: str, keep: int, compress: bool):
+    """
+    Rota un log mientras la aplicación lo sigue escribiendo (copytruncate):
+    el contenido se copia a `.1` y el original se trunca. El proceso hijo lo
+    abrió en modo append, así que sus siguientes escrituras van al principio
+    del fichero vacío sin necesidad de reabrirlo.
+
+    Se conservan `keep` segmentos. El `.1` se deja sin comprimir para que el
+    tail y el historial puedan leerlo; se comprime al pasar a `.2`.
+    """
+    # Desplazar los segmentos: .N-1 -> .N, descartando los que sobran
+    for index in range(max(keep, 0), 0, -1):
+        current = segment_path(path, index)
+        if current is None:
+            continue
+        if index >= keep:
+            os.remove(current)
+            continue
+        target = f"{path}.{index + 1}" + (".gz" if current.endswith(".gz") else "")
+        os.replace(current, target)
+        if compress and index + 1 >= 2 and not target.endswith(".gz"):
+            _compress(target)
+    # Quitar restos de una configuración anterior con más segmentos
+    index = max(keep, 0) + 1
+    while True:
+        extra = segment_path(path, index)
+        if extra is None:
+            break
+        os.remove(extra)
+        index += 1
+
+    if keep <= 0:
+        os.truncate(path, 0)
+        return
+
+    with open(path, "rb") as src, open(f"{path}.1", "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_SIZE)
+        # Lo escrito durante la copia se recoge justo antes de truncar para
+        # reducir al mínimo la ventana en la que se podrían perder líneas
+        dst.write(src.read())
+        os.truncate(path, 0)
+
+
+class LogRotator:
+    """
+    Comprueba periódicamente logs/stdout.log y logs/stderr.log de cada
+    aplicación y los rota por tamaño (`log_max_size_mb`) o antigüedad
+    (`log_max_age_hours`, 0 desactiva) según sus ajustes o los de
+    server_config.json. El trabajo de disco se hace en un hilo, nunca en el
+    event loop.
+    """
+
+    def __init__(self):
+        self.interval = 60.0
+        # Momento desde el que se cuenta la antigüedad de cada log
+        self._since: Dict[str, float] = {}
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                config = load_server_config()
+                self.interval = max(5.0, float(config.get("log_rotation_interval", 60)))
+                await loop.run_in_executor(None, self.check_all, config)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al rotar los logs de salida")
+            await asyncio.sleep(self.interval)
+
+    def check_all(self, config: Optional[dict] = None):
+        config = config or load_server_config()
+        db = SessionLocal()
+        try:
+            applications = db.query(Application).all()
+            targets = [(application.id, application.directory, rotation_settings(application, config))
+                       for application in applications]
+        finally:
+            db.close()
+
+        for app_id, directory, settings in targets:
+            for log_type in OUTPUT_LOGS:
+                path = os.path.join(directory, "logs", f"{log_type}.log")
+                try:
+                    if self.check(path, settings):
+                        logger.info(f"App {app_id}: {log_type}.log rotado")
+                except OSError as e:
+                    logger.warning(f"App {app_id}: no se pudo rotar {log_type}.log: {e}")
+
+    def check(self, path: str, settings: dict) -> bool:
+        """Rota `path` si supera el tamaño o la antigüedad configurados. Devuelve True si se rotó."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            self._since.pop(path, None)
+            return False
+
+        now = time.time()
+        if path not in self._since:
+            # Tras reiniciar el panel la antigüedad se cuenta desde la última rotación
+            previous = segment_path(path, 1)
+            self._since[path] = os.path.getmtime(previous) if previous else now
+
+        max_size = (settings["max_size_mb"] or 0) * 1024 * 1024
+        max_age = (settings["max_age_hours"] or 0) * 3600
+        too_big = max_size and size >= max_size
+        too_old = max_age and size and now - self._since[path] >= max_age
+        if not (too_big or too_old):
+            return False
+
+        rotate_file(path, int(settings["keep"]), bool(settings["compress"]))
+        self._since[path] = now
+        return True
+
+
+log_rotator = LogRotator()
@@ -0,0 +1,328 @@
+#log_search.py
+
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from app.configs import SEARCH_INDEX_FILE, load_server_config
+from app.db import SessionLocal
+from app.models import Application, Log
+from app.services.log_rotation import OUTPUT_LOGS, segment_path
+from app.services.tail import MAX_LINE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# "events" son los registros de la tabla logs (eventos del panel); el resto, la salida de la aplicación
+SEARCH_STREAMS = ("events",) + OUTPUT_LOGS
+MAX_RESULTS = 200
+# Registros de la base de datos y bytes de cada fichero que se indexan por ciclo
+DB_BATCH = 5000
+FILE_BATCH = 8 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    app_id INTEGER NOT NULL,
+    stream TEXT NOT NULL,
+    level TEXT,
+    ts TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_app_ts ON entries (app_id, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    message, content='entries', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, message) VALUES (new.id, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, message) VALUES ('delete', old.id, old.message);
+END;
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    inode INTEGER
+);
+"""
+
+
+def build_match_query(text: str) -> str:
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5 segura: cada
+    palabra se busca como término literal (todas deben aparecer) y un `*`
+    final la convierte en prefijo, p. ej. `timeout conn*`.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class LogSearchIndex:
+    """
+    Índice de búsqueda de texto completo (SQLite FTS5) en una base de datos
+    aparte dentro del directorio de datos, para no cargar la principal.
+
+    Un ciclo periódico añade de forma incremental los registros nuevos de la
+    tabla logs y las líneas nuevas de logs/stdout.log y logs/stderr.log de
+    cada aplicación; la posición de cada fuente se guarda en `sources`, así
+    que tras reiniciar el panel continúa donde lo dejó. Las líneas de los
+    ficheros no tienen hora propia y se fechan al indexarlas.
+    """
+
+    def __init__(self, path: str = SEARCH_INDEX_FILE):
+        self.path = path
+        self.interval = 10.0
+        self._available = None
+        self._write_lock = threading.Lock()
+        self._task = None
+
+    @property
+    def available(self) -> bool:
+        if self._available is None:
+            try:
+                self._connect().close()
+                self._available = True
+            except sqlite3.Error as e:
+                logger.warning(f"Búsqueda de logs no disponible (¿SQLite sin FTS5?): {e}")
+                self._available = False
+        return self._available
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL: las búsquedas no esperan a que termine un ciclo de indexado
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                config = load_server_config()
+                self.interval = max(1.0, float(config.get("search_index_interval", 10)))
+                if config.get("search_enabled", True) and self.available:
+                    await loop.run_in_executor(None, self.ingest, config)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al indexar los logs para la búsqueda")
+            await asyncio.sleep(self.interval)
+
+    # --- Indexado ---
+
+    def ingest(self, config: Optional[dict] = None) -> int:
+        """Un ciclo de indexado. Devuelve el número de entradas añadidas."""
+        config = config or load_server_config()
+        db = SessionLocal()
+        try:
+            applications = [(a.id, a.directory) for a in db.query(Application.id, Application.directory).all()]
+        finally:
+            db.close()
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                added = self._ingest_events(conn)
+                for app_id, directory in applications:
+                    for stream in OUTPUT_LOGS:
+                        path = os.path.join(directory, "logs", f"{stream}.log")
+                        try:
+                            added += self._ingest_file(conn, app_id, stream, path)
+                        except OSError as e:
+                            logger.warning(f"App {app_id}: no se pudo indexar {stream}.log: {e}")
+                self._apply_retention(conn, config)
+                return added
+            finally:
+                conn.close()
+
+    def _ingest_events(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT position FROM sources WHERE source = 'events'").fetchone()
+        last_id = row[0] if row else 0
+        db = SessionLocal()
+        try:
+            # La tabla usa AUTOINCREMENT, pero una base anterior a la migración pudo
+            # reutilizar ids ya indexados. Si el cursor supera al id más alto, se
+            # retrocede hasta el último evento con fecha ya indexada
+            max_id = db.query(func.max(Log.id)).scalar() or 0
+            if max_id < last_id:
+                last_ts = conn.execute("SELECT MAX(ts) FROM entries WHERE stream = 'events'").fetchone()[0]
+                last_id = 0
+                if last_ts:
+                    last_id = db.query(func.max(Log.id)).filter(
+                        Log.timestamp <= datetime.datetime.fromisoformat(last_ts)
+                    ).scalar() or 0
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO sources (source, position) VALUES ('events', ?)", (last_id,))
+            rows = db.query(Log.id, Log.application_id, Log.level, Log.timestamp, Log.message).filter(
+                Log.id > last_id
+            ).order_by(Log.id).limit(DB_BATCH).all()
+        finally:
+            db.close()
+        if not rows:
+            return 0
+        with conn:
+            conn.executemany(
+                "INSERT INTO entries (app_id, stream, level, ts, message) VALUES (?, 'events', ?, ?, ?)",
+                [(app_id, level, timestamp.isoformat(), message or "") for _, app_id, level, timestamp, message in rows]
+            )
+            conn.execute("INSERT OR REPLACE INTO sources (source, position) VALUES ('events', ?)", (rows[-1][0],))
+        return len(rows)
+
+    def _ingest_file(self, conn: sqlite3.Connection, app_id: int, stream: str, path: str) -> int:
+        source = f"{app_id}:{stream}"
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        row = conn.execute("SELECT position, inode FROM sources WHERE source = ?", (source,)).fetchone()
+        position, inode = row if row else (0, st.st_ino)
+
+        chunks = []
+        if inode != st.st_ino:
+            # Fichero sustituido: empezar el nuevo desde el principio
+            position = 0
+        elif st.st_size < position:
+            # Rotado (copytruncate): lo que faltaba por indexar está al final de .1
+            previous = segment_path(path, 1)
+            if previous and not previous.endswith(".gz") and os.path.getsize(previous) > position:
+                chunks.append(self._read_lines(previous, position, FILE_BATCH)[0])
+            position = 0
+
+        data, position = self._read_lines(path, position, FILE_BATCH)
+        chunks.append(data)
+
+        timestamp = datetime.datetime.utcnow().isoformat()
+        entries = [
+            (app_id, stream, timestamp, line.rstrip("\r"))
+            for chunk in chunks
+            for line in chunk.decode("utf-8", errors="replace").split("\n")
+            if line.strip()
+        ]
+        with conn:
+            if entries:
+                conn.executemany(
+                    "INSERT INTO entries (app_id, stream, level, ts, message) VALUES (?, ?, NULL, ?, ?)", entries
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO sources (source, position, inode) VALUES (?, ?, ?)",
+                (source, position, st.st_ino)
+            )
+        return len(entries)
+
+    @staticmethod
+    def _read_lines(path: str, position: int, max_bytes: int) -> Tuple[bytes, int]:
+        """
+        Lee desde `position` hasta el último salto de línea completo (como
+        mucho `max_bytes`). Si el bloque está lleno y no tiene ningún salto,
+        se indexa el principio de la línea (MAX_LINE_LENGTH) y se avanza igual:
+        si no, la fuente se quedaría atascada en esa posición para siempre.
+        """
+        with open(path, "rb") as f:
+            f.seek(position)
+            data = f.read(max_bytes)
+        end = data.rfind(b"\n") + 1
+        if end == 0 and len(data) == max_bytes:
+            return data[:MAX_LINE_LENGTH] + b"\n", position + len(data)
+        return data[:end], position + end
+
+    def _apply_retention(self, conn: sqlite3.Connection, config: dict):
+        days = config.get("search_retention_days", 30)
+        if not days:
+            return
+        cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=days)).isoformat()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE id IN (SELECT id FROM entries WHERE ts < ? LIMIT 10000)", (cutoff,))
+
+    def forget(self, app_id: int):
+        """Borra del índice las entradas de una aplicación eliminada."""
+        if not self.available:
+            return
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM entries WHERE app_id = ?", (app_id,))
+                    conn.execute("DELETE FROM sources WHERE source LIKE ?", (f"{app_id}:%",))
+            finally:
+                conn.close()
+
+    # --- Búsqueda ---
+
+    def search(self, app_id: int, text: str, streams: Optional[List[str]] = None, level: Optional[str] = None,
+               since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+               limit: int = 50, cursor: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Entradas de la aplicación que contienen todos los términos de `text`,
+        de la última indexada a la primera. Devuelve (resultados, cursor de
+        la página siguiente o None). Lanza ValueError si la consulta está vacía.
+        """
+        match = build_match_query(text)
+        if not match:
+            raise ValueError("La búsqueda está vacía")
+        limit = max(1, min(limit, MAX_RESULTS))
+
+        sql = [
+            "SELECT e.id, e.stream, e.level, e.ts, e.message FROM entries_fts f",
+            "JOIN entries e ON e.id = f.rowid",
+            "WHERE entries_fts MATCH ? AND e.app_id = ?",
+        ]
+        params: list = [match, app_id]
+        if streams:
+            sql.append(f"AND e.stream IN ({', '.join('?' for _ in streams)})")
+            params.extend(streams)
+        if level:
+            sql.append("AND e.level = ?")
+            params.append(level)
+        if since is not None:
+            sql.append("AND e.ts >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            sql.append("AND e.ts < ?")
+            params.append(until.isoformat())
+        if cursor:
+            sql.append("AND f.rowid < ?")
+            params.append(cursor)
+        # Orden de indexado, no de fecha: los eventos atrasados llegan por lotes y
+        # las líneas de los ficheros se fechan al indexarlas. Se ordena por
+        # rowid porque FTS5 lo recorre sin ordenar todas las coincidencias
+        sql.append("ORDER BY f.rowid DESC LIMIT ?")
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(" ".join(sql), params).fetchall()
+        finally:
+            conn.close()
+
+        results = [
+            {"id": row[0], "stream": row[1], "level": row[2], "timestamp": row[3], "message": row[4]}
+            for row in rows[:limit]
+        ]
+        next_cursor = results[-1]["id"] if len(rows) > limit else None
+        return results, next_cursor
+
+
+log_search = LogSearchIndex()
@@ -0,0 +1,121 @@
+#log_sink.py
+
+import atexit
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+from sqlalchemy import insert
+from app.db import SessionLocal
+from app.models import Log
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """
+    Escritor en segundo plano de los logs de ciclo de vida.
+
+    `emit` solo encola el registro (con su marca de tiempo) y vuelve; un hilo
+    los inserta por lotes en una sola transacción cuando se juntan
+    `batch_size` registros o pasan `flush_interval` segundos. Así una
+    operación de arranque no paga un commit de SQLite por cada mensaje.
+    `flush` espera a que todo lo encolado esté escrito y se llama al cerrar
+    el panel y al salir del proceso (p. ej. la CLI).
+    """
+
+    def __init__(self, flush_interval: float = 0.5, batch_size: int = 200, max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._flush_waiters = 0
+        # Contadores para saber en flush() cuándo se ha escrito todo lo anterior
+        self._written = 0
+        self._enqueued = 0
+
+    def emit(self, app_id: int, message: str, level: str = "info"):
+        record = {
+            "application_id": app_id,
+            "message": message,
+            "level": level,
+            "timestamp": datetime.datetime.utcnow()
+        }
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                # La base de datos no da abasto: se descarta lo más antiguo
+                self._pending.popleft()
+                self._written += 1
+            self._pending.append(record)
+            self._enqueued += 1
+            self._ensure_thread()
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Espera a que se escriba todo lo encolado hasta ahora. Devuelve False si vence el plazo."""
+        with self._condition:
+            target = self._enqueued
+            if self._written >= target:
+                return True
+            self._ensure_thread()
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: self._written >= target, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout: float = 10.0):
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Esperar a completar un lote, a que venza el intervalo o a un flush()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closed and not self._flush_waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+            self._write(batch)
+            with self._condition:
+                self._written += len(batch)
+                self._condition.notify_all()
+
+    def _write(self, batch):
+        db = SessionLocal()
+        try:
+            db.execute(insert(Log), batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception(f"No se pudieron guardar {len(batch)} registros de log")
+        finally:
+            db.close()
+
+
+log_sink = LogSink()
+atexit.register(log_sink.close)
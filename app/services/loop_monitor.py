@@ -0,0 +1,91 @@
+#loop_monitor.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+from app.configs import load_server_config
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se mide y cuántas medidas se conservan (10 minutos)
+PROBE_INTERVAL = 0.1
+HISTORY = 6000
+# Cada cuánto se vuelve a leer el umbral de aviso
+CONFIG_REFRESH = 30.0
+
+
+class LoopLagMonitor:
+    """
+    Mide el retraso del event loop: una tarea duerme PROBE_INTERVAL y anota
+    cuánto más tarde de lo previsto vuelve a ejecutarse. Si una ruta async o
+    un websocket bloquea el loop (una consulta o un subproceso síncronos), el
+    retraso sube en la misma medida. Por encima de `loop_lag_warn_ms` se
+    registra un aviso y se cuenta como bloqueo.
+    """
+
+    def __init__(self):
+        self.warn_ms = 100.0
+        self._samples = deque(maxlen=HISTORY)
+        self._blocked = 0
+        self._max = 0.0
+        self._started_at: Optional[float] = None
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._started_at = time.time()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        refresh_at = 0.0
+        while True:
+            now = loop.time()
+            if now >= refresh_at:
+                try:
+                    self.warn_ms = max(1.0, float(load_server_config().get("loop_lag_warn_ms", 100)))
+                except Exception:
+                    logger.exception("Error al leer loop_lag_warn_ms")
+                refresh_at = now + CONFIG_REFRESH
+            expected = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            self.record(max(0.0, (loop.time() - expected) * 1000))
+
+    def record(self, lag_ms: float):
+        self._samples.append(lag_ms)
+        self._max = max(self._max, lag_ms)
+        if lag_ms >= self.warn_ms:
+            self._blocked += 1
+            logger.warning(f"El event loop estuvo bloqueado {lag_ms:.0f} ms")
+
+    def stats(self) -> dict:
+        """Retraso actual, medio, p99 y máximo de las últimas medidas, en milisegundos."""
+        samples = list(self._samples)
+        ordered = sorted(samples)
+        return {
+            "running": self._task is not None,
+            "interval_ms": PROBE_INTERVAL * 1000,
+            "warn_ms": self.warn_ms,
+            "samples": len(samples),
+            "current_ms": round(samples[-1], 2) if samples else None,
+            "mean_ms": round(sum(samples) / len(samples), 2) if samples else None,
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2) if ordered else None,
+            "max_ms": round(self._max, 2),
+            "blocked": self._blocked,
+            "since": self._started_at
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,212 @@
+#metrics.py
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+from collections import deque
+from typing import Dict, List, Optional
+import psutil
+from app.configs import METRICS_SNAPSHOT_FILE, load_server_config
+from app.db import SessionLocal
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+# Clave de las métricas del propio panel en el snapshot
+SERVER_KEY = "server"
+
+
+def load_metrics_snapshot(max_age: Optional[float] = None):
+    """
+    Lee la última muestra por aplicación escrita por el panel. Con `max_age`
+    (segundos) devuelve {} si el snapshot es más antiguo, p. ej. si el panel no está en marcha.
+    """
+    try:
+        with open(METRICS_SNAPSHOT_FILE, "r") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if max_age is not None:
+        written_at = snapshot.get("written_at")
+        if not written_at:
+            return {}
+        age = datetime.datetime.utcnow() - datetime.datetime.fromisoformat(written_at)
+        if age.total_seconds() > max_age:
+            return {}
+    return snapshot.get("samples", {})
+
+
+class MetricsSampler:
+    """
+    Muestrea periódicamente el árbol de procesos de cada aplicación en ejecución
+    (CPU, RSS, hilos, ficheros abiertos y conexiones) y guarda las muestras en
+    un buffer circular de tamaño fijo por aplicación.
+
+    Los objetos psutil.Process se conservan entre muestras para que
+    `cpu_percent(interval=None)` calcule el uso desde la muestra anterior sin
+    bloquear. Las lecturas se hacen en un hilo y nunca en el event loop.
+    """
+
+    def __init__(self):
+        self.interval = 5.0
+        self.history = 720
+        self._buffers: Dict[str, deque] = {}
+        self._processes: Dict[int, psutil.Process] = {}
+        self._subscribers: Dict[str, set] = {}
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def get_samples(self, app_id, limit: Optional[int] = None) -> List[dict]:
+        samples = list(self._buffers.get(str(app_id), ()))
+        return samples[-limit:] if limit else samples
+
+    def latest(self, app_id) -> Optional[dict]:
+        buffer = self._buffers.get(str(app_id))
+        return buffer[-1] if buffer else None
+
+    def subscribe(self, app_id) -> asyncio.Queue:
+        """Cola que recibe cada nueva muestra de la aplicación; si el cliente se retrasa se descartan las más antiguas."""
+        queue = asyncio.Queue(maxsize=10)
+        self._subscribers.setdefault(str(app_id), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, app_id, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(str(app_id))
+        if subscribers:
+            subscribers.discard(queue)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                config = load_server_config()
+                self.interval = max(1.0, float(config.get("metrics_interval", 5)))
+                self.history = max(1, int(config.get("metrics_history", 720)))
+
+                samples = await loop.run_in_executor(None, self._sample_all)
+                self._store(samples)
+                await loop.run_in_executor(None, self._write_snapshot, samples)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al muestrear métricas")
+            await asyncio.sleep(self.interval)
+
+    def _store(self, samples: Dict[str, dict]):
+        for key, sample in samples.items():
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.maxlen != self.history:
+                buffer = deque(buffer or (), maxlen=self.history)
+                self._buffers[key] = buffer
+            buffer.append(sample)
+
+            for queue in self._subscribers.get(key, ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(sample)
+
+        # Olvidar las aplicaciones que ya no están en ejecución
+        for key in list(self._buffers):
+            if key not in samples and not self._subscribers.get(key):
+                del self._buffers[key]
+
+    def _sample_all(self) -> Dict[str, dict]:
+        db = SessionLocal()
+        try:
+            running = db.query(Application.id, Application.pid).filter(
+                Application.status.in_(["running", "starting"]), Application.pid.isnot(None)
+            ).all()
+        finally:
+            db.close()
+
+        seen = set()
+        samples = {}
+        for app_id, pid in running:
+            sample = self._sample_tree(pid, seen)
+            if sample is not None:
+                samples[str(app_id)] = sample
+
+        server_sample = self._sample_tree(os.getpid(), seen, include_children=False)
+        if server_sample is not None:
+            samples[SERVER_KEY] = server_sample
+
+        for pid in list(self._processes):
+            if pid not in seen:
+                del self._processes[pid]
+        return samples
+
+    def _sample_tree(self, pid: int, seen: set, include_children: bool = True) -> Optional[dict]:
+        try:
+            root = self._process(pid)
+            processes = [root] + (root.children(recursive=True) if include_children else [])
+        except psutil.NoSuchProcess:
+            return None
+
+        sample = {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "processes": 0,
+            "cpu_percent": 0.0,
+            "rss_bytes": 0,
+            "threads": 0,
+            "open_files": 0,
+            "connections": 0
+        }
+        for process in processes:
+            try:
+                # Un hijo puede terminar entre children() y aquí
+                process = self._process(process.pid)
+                seen.add(process.pid)
+                with process.oneshot():
+                    sample["cpu_percent"] += process.cpu_percent(interval=None)
+                    sample["rss_bytes"] += process.memory_info().rss
+                    sample["threads"] += process.num_threads()
+                sample["processes"] += 1
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+            except psutil.AccessDenied:
+                pass
+            try:
+                sample["open_files"] += len(process.open_files())
+                connections = process.net_connections if hasattr(process, "net_connections") else process.connections
+                sample["connections"] += len(connections(kind="inet"))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+
+        sample["cpu_percent"] = round(sample["cpu_percent"], 1)
+        return sample
+
+    def _process(self, pid: int) -> psutil.Process:
+        process = self._processes.get(pid)
+        if process is None or not process.is_running():
+            process = psutil.Process(pid)
+            self._processes[pid] = process
+        return process
+
+    def _write_snapshot(self, samples: Dict[str, dict]):
+        snapshot = {
+            "written_at": datetime.datetime.utcnow().isoformat(),
+            "interval": self.interval,
+            "samples": samples
+        }
+        tmp_path = f"{METRICS_SNAPSHOT_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, METRICS_SNAPSHOT_FILE)
+
+
+metrics_sampler = MetricsSampler()
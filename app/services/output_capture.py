@@ -0,0 +1,332 @@
+#output_capture.py
+
+import asyncio
+import codecs
+import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from app.services.tail import TailSubscription, MAX_LINE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MODES = ("file", "pipe")
+READ_SIZE = 64 * 1024
+# Bytes pendientes de escribir en disco antes de empezar a descartar
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+# Cada cuánto se vuelcan a disco los buffers de escritura
+FLUSH_INTERVAL = 0.2
+# Ficheros sin escrituras durante este tiempo se cierran
+IDLE_CLOSE = 60.0
+
+
+class _DiskWriter:
+    """
+    Un único hilo que escribe en disco la salida capturada de todas las
+    aplicaciones, con un fichero en modo append y buffer por ruta. Agrupa lo
+    recibido durante FLUSH_INTERVAL en una sola escritura. Los lectores de
+    pipes nunca esperan al disco: si la cola supera MAX_PENDING_BYTES lo
+    nuevo se descarta y se deja constancia en el log.
+    """
+
+    def __init__(self):
+        self._pending: deque = deque()
+        self._pending_bytes = 0
+        self._dropped: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._files: Dict[str, list] = {}
+        self._thread = None
+        self._closed = False
+        self._flush_waiters = 0
+        self._written = 0
+        self._enqueued = 0
+
+    def write(self, path: str, data: bytes):
+        with self._condition:
+            if self._pending_bytes + len(data) > MAX_PENDING_BYTES:
+                self._dropped[path] = self._dropped.get(path, 0) + len(data)
+                return
+            self._pending.append((path, data))
+            self._pending_bytes += len(data)
+            self._enqueued += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+                self._thread.start()
+            if len(self._pending) == 1:
+                self._condition.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que lo encolado hasta ahora esté escrito y volcado a disco."""
+        with self._condition:
+            target = self._enqueued
+            if self._written >= target:
+                return True
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: self._written >= target, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._pending and not self._dropped and not self._closed:
+                    if not self._condition.wait(IDLE_CLOSE):
+                        self._close_idle()
+                        continue
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while not self._closed and not self._flush_waiters:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = list(self._pending)
+                self._pending.clear()
+                self._pending_bytes = 0
+                dropped, self._dropped = self._dropped, {}
+                closed = self._closed
+
+            for path, data in batch:
+                self._write(path, data)
+            for path, size in dropped.items():
+                self._write(path, f"[AtlasServer] {size} bytes de salida descartados: el disco no daba abasto\n".encode())
+            for path, (handle, _) in list(self._files.items()):
+                try:
+                    handle.flush()
+                except OSError as e:
+                    logger.warning(f"No se pudo escribir en {path}: {e}")
+
+            with self._condition:
+                self._written += len(batch)
+                self._condition.notify_all()
+            if closed:
+                self._close_idle(all_files=True)
+                return
+
+    def _write(self, path: str, data: bytes):
+        try:
+            entry = self._files.get(path)
+            if entry is None:
+                entry = [open(path, "ab", buffering=256 * 1024), 0.0]
+                self._files[path] = entry
+            entry[1] = time.monotonic()
+            entry[0].write(data)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en {path}: {e}")
+
+    def _close_idle(self, all_files: bool = False):
+        now = time.monotonic()
+        for path, (handle, last_write) in list(self._files.items()):
+            if all_files or now - last_write > IDLE_CLOSE:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+                del self._files[path]
+
+
+class OutputStream:
+    """
+    Salida capturada de un flujo (stdout o stderr) de una aplicación: las
+    últimas líneas con la hora de llegada en un buffer circular y los
+    websockets suscritos. Varias instancias pueden alimentar el mismo flujo
+    (p. ej. durante un reinicio sin cortes). Las líneas se numeran en orden de
+    llegada para que un cliente pueda reanudar tras la última que recibió;
+    `capture_id` identifica la numeración, que vuelve a empezar en cada
+    instancia (p. ej. tras reiniciar el panel).
+    """
+
+    def __init__(self, path: str, buffer_lines: int):
+        self.path = path
+        self.lines = deque(maxlen=buffer_lines)
+        # Número de la última línea recibida
+        self.sequence = 0
+        self.capture_id = uuid.uuid4().hex[:12]
+        self.readers = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.readers > 0
+
+    def resize(self, buffer_lines: int):
+        with self._lock:
+            if self.lines.maxlen != buffer_lines:
+                self.lines = deque(self.lines, maxlen=buffer_lines)
+
+    def history(self, max_lines: Optional[int] = None) -> List[Tuple[str, str]]:
+        with self._lock:
+            entries = list(self.lines)
+        return entries[-max_lines:] if max_lines else entries
+
+    def subscribe(self, max_lines: Optional[int] = None, after: Optional[int] = None,
+                  capture_id: Optional[str] = None) -> Tuple[TailSubscription, List[Tuple[str, str, int]], int]:
+        """
+        Se llama desde el event loop; las líneas nuevas se entregan en ese
+        loop. Devuelve la suscripción, las líneas anteriores como (hora,
+        línea, número) —las últimas `max_lines` o, con `after`, las
+        posteriores a ese número— y cuántas de las pedidas ya no están en el
+        buffer. Todo se toma a la vez, así que ninguna línea llega repetida.
+        Un `after` de otra captura (`capture_id` distinto) se ignora.
+        """
+        if capture_id != self.capture_id:
+            after = None
+        subscription = TailSubscription()
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), subscription))
+            first = self.sequence - len(self.lines) + 1
+            entries = [(timestamp, line, first + i) for i, (timestamp, line) in enumerate(self.lines)]
+            last = self.sequence
+        if after is None or after > last:
+            # Sin posición, o fuera de esta numeración
+            return subscription, (entries[-max_lines:] if max_lines else entries), 0
+        missed = max(0, first - after - 1)
+        return subscription, entries[max(0, after - first + 1):], missed
+
+    def unsubscribe(self, subscription: TailSubscription):
+        with self._lock:
+            self._subscribers = {entry for entry in self._subscribers if entry[1] is not subscription}
+
+    def append(self, entries: List[Tuple[str, str]]):
+        """Se llama desde los hilos lectores."""
+        timestamps = [timestamp for timestamp, _ in entries]
+        lines = [line for _, line in entries]
+        with self._lock:
+            self.lines.extend(entries)
+            positions = list(range(self.sequence + 1, self.sequence + len(entries) + 1))
+            self.sequence += len(entries)
+            subscribers = list(self._subscribers)
+        for loop, subscription in subscribers:
+            try:
+                loop.call_soon_threadsafe(subscription.push, lines, timestamps, positions)
+            except RuntimeError:
+                # El loop ya se cerró
+                self.unsubscribe(subscription)
+
+
+class OutputCapture:
+    """
+    Modo de captura "pipe": el panel lee stdout y stderr de la aplicación por
+    pipes en hilos propios, que solo decodifican, sellan la hora y reparten,
+    de modo que el proceso hijo nunca se bloquea con el pipe lleno. Cada línea
+    va al buffer circular del flujo, a los websockets suscritos y, a través
+    de un escritor con buffer, a logs/stdout.log o logs/stderr.log, así que la
+    rotación, las descargas y el tail siguen funcionando igual.
+
+    Los pipes pertenecen al proceso del panel: si el panel se detiene, la
+    aplicación deja de poder escribir su salida. Por eso solo se usa cuando
+    el panel está en marcha y el modo "file" sigue siendo el predeterminado.
+    """
+
+    def __init__(self):
+        self._streams: Dict[Tuple[int, str], OutputStream] = {}
+        self._readers: Dict[int, List[threading.Thread]] = {}
+        self._writer = _DiskWriter()
+        self._lock = threading.Lock()
+
+    def get(self, app_id: int, log_type: str) -> Optional[OutputStream]:
+        return self._streams.get((app_id, log_type))
+
+    def attach(self, app_id: int, process, logs_dir: str, buffer_lines: int = 1000):
+        """Empieza a leer los pipes stdout/stderr de `process`."""
+        threads = []
+        for log_type, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+            with self._lock:
+                stream = self._streams.get((app_id, log_type))
+                if stream is None:
+                    stream = OutputStream(os.path.join(logs_dir, f"{log_type}.log"), buffer_lines)
+                    self._streams[(app_id, log_type)] = stream
+                stream.resize(buffer_lines)
+                stream.readers += 1
+            threads.append(threading.Thread(
+                target=self._read, args=(stream, pipe, process.pid),
+                name=f"output-{app_id}-{log_type}", daemon=True
+            ))
+        with self._lock:
+            self._readers[process.pid] = threads
+        for thread in threads:
+            thread.start()
+
+    def drain(self, process, timeout: float = 1.0):
+        """
+        Espera a que lo que `process` ya escribió esté en el log en disco. Si
+        el proceso terminó, espera también a que se lean sus pipes hasta el final.
+        """
+        deadline = time.monotonic() + timeout
+        if process.poll() is not None:
+            with self._lock:
+                threads = list(self._readers.get(process.pid, ()))
+            for thread in threads:
+                thread.join(max(0.0, deadline - time.monotonic()))
+        self._writer.flush(max(0.0, deadline - time.monotonic()))
+
+    def forget(self, app_id: int):
+        """Descarta el buffer de una aplicación eliminada."""
+        with self._lock:
+            for log_type in ("stdout", "stderr"):
+                self._streams.pop((app_id, log_type), None)
+
+    def close(self):
+        self._writer.close()
+
+    def _read(self, stream: OutputStream, pipe, pid: int):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial = ""
+        fd = pipe.fileno()
+        try:
+            while True:
+                try:
+                    data = os.read(fd, READ_SIZE)
+                except OSError:
+                    data = b""
+                if not data:
+                    break
+                self._writer.write(stream.path, data)
+                parts = (partial + decoder.decode(data)).split("\n")
+                partial = parts.pop()
+                if len(partial) > MAX_LINE_LENGTH:
+                    parts.append(partial)
+                    partial = ""
+                self._publish(stream, parts)
+            self._publish(stream, [partial + decoder.decode(b"", final=True)])
+        finally:
+            pipe.close()
+            with self._lock:
+                stream.readers -= 1
+                threads = self._readers.get(pid)
+                if threads is not None and threading.current_thread() in threads:
+                    threads.remove(threading.current_thread())
+                    if not threads:
+                        del self._readers[pid]
+
+    def _publish(self, stream: OutputStream, lines: List[str]):
+        timestamp = datetime.datetime.utcnow().isoformat()
+        entries = []
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line.strip():
+                continue
+            if len(line) > MAX_LINE_LENGTH:
+                line = f"{line[:MAX_LINE_LENGTH]} … (+{len(line) - MAX_LINE_LENGTH} caracteres)"
+            entries.append((timestamp, line))
+        if entries:
+            stream.append(entries)
+
+
+output_capture = OutputCapture()
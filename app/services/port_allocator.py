@@ -0,0 +1,162 @@
+#port_allocator.py
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set
+import psutil
+from sqlalchemy.orm import Session
+from app.configs import load_server_config
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo que un puerto queda reservado si nadie lo confirma ni lo libera
+RESERVATION_TTL = 60.0
+
+
+class PortAllocator:
+    """
+    Asignador de puertos en memoria para el rango configurado.
+
+    Cada asignación hace una sola consulta de los puertos asignados en la base
+    de datos y una sola instantánea de los sockets en escucha, y mantiene un
+    bitmap de puertos ocupados que se actualiza solo con los cambios. La
+    búsqueda continúa desde el último puerto entregado (next-fit), por lo que
+    el coste amortizado es O(1). Los puertos entregados quedan reservados
+    hasta que se confirman en la base de datos, así dos arranques simultáneos
+    nunca reciben el mismo puerto.
+    """
+
+    def __init__(self, start_port: Optional[int] = None, end_port: Optional[int] = None):
+        self._fixed_range = (start_port, end_port)
+        self._lock = threading.Lock()
+        self._start = None
+        self._end = None
+        self._used = bytearray()
+        self._occupied = set()
+        self._assigned = {}
+        self._reservations = {}
+        self._cursor = 0
+
+    def allocate(self, db: Session, exclude_app_id: Optional[int] = None, app_id: Optional[int] = None) -> Optional[int]:
+        """
+        Devuelve un puerto libre y lo reserva para `app_id`. Los puertos
+        asignados en la base de datos a `exclude_app_id` se consideran libres.
+        """
+        assigned = self._load_assigned(db)
+        listening = self._snapshot_listening()
+
+        with self._lock:
+            self._update(assigned, listening)
+            size = self._end - self._start
+            for offset in range(size):
+                index = (self._cursor + offset) % size
+                port = self._start + index
+                if self._used[index] and not self._only_assigned_to(port, exclude_app_id, listening):
+                    continue
+                # Sin instantánea de sockets (p. ej. sin permisos) se comprueba el candidato directamente
+                if listening is None and not self._check_port(port):
+                    continue
+                self._reserve(port, app_id)
+                self._cursor = (index + 1) % size
+                return port
+        return None
+
+    def reserve(self, port: int, app_id: Optional[int] = None) -> bool:
+        """Reserva un puerto concreto; devuelve False si ya está reservado por otra aplicación."""
+        with self._lock:
+            holder = self._reservations.get(port)
+            if holder and holder[0] != app_id and holder[1] > time.monotonic():
+                return False
+            self._reserve(port, app_id)
+            return True
+
+    def release(self, port: Optional[int]):
+        """Libera la reserva de un puerto (una vez guardado en la base de datos o si el arranque falla)."""
+        if port is None:
+            return
+        with self._lock:
+            self._reservations.pop(port, None)
+            self._set_bit(port, port in self._occupied)
+
+    def _reserve(self, port: int, app_id: Optional[int]):
+        self._reservations[port] = (app_id, time.monotonic() + RESERVATION_TTL)
+        self._set_bit(port, True)
+
+    def _only_assigned_to(self, port: int, app_id: Optional[int], listening: Optional[Set[int]]) -> bool:
+        """True si el puerto solo está ocupado por estar asignado en la BD a `app_id`."""
+        if app_id is None:
+            return False
+        if listening and port in listening:
+            return False
+        if port in self._reservations and self._reservations[port][0] != app_id:
+            return False
+        return self._assigned.get(port) == {app_id}
+
+    def _load_assigned(self, db: Session) -> Dict[int, Set[int]]:
+        assigned = {}
+        for app_id, port, backend_port in db.query(Application.id, Application.port, Application.backend_port):
+            # El puerto interno de las aplicaciones publicadas por el panel también está ocupado
+            for value in (port, backend_port):
+                if value is not None:
+                    assigned.setdefault(value, set()).add(app_id)
+        return assigned
+
+    def _snapshot_listening(self) -> Optional[Set[int]]:
+        try:
+            return {
+                conn.laddr.port
+                for conn in psutil.net_connections(kind="inet")
+                if conn.status == psutil.CONN_LISTEN and conn.laddr
+            }
+        except (psutil.AccessDenied, PermissionError):
+            # En macOS psutil necesita privilegios para listar sockets de otros procesos
+            return None
+
+    def _check_port(self, port: int) -> bool:
+        from app.utils import check_port_available
+        return check_port_available(port)
+
+    def _update(self, assigned: Dict[int, Set[int]], listening: Optional[Set[int]]):
+        self._ensure_range()
+        now = time.monotonic()
+        expired = [port for port, (_, expires) in self._reservations.items() if expires <= now]
+        for port in expired:
+            del self._reservations[port]
+
+        occupied = set(assigned) | (listening or set())
+        # Solo se tocan los bits que cambiaron desde la última asignación
+        for port in self._occupied ^ occupied:
+            self._set_bit(port, port in occupied)
+        for port in expired:
+            self._set_bit(port, port in occupied)
+        for port in self._reservations:
+            self._set_bit(port, True)
+
+        self._occupied = occupied
+        self._assigned = assigned
+
+    def _ensure_range(self):
+        start, end = self._fixed_range
+        if start is None or end is None:
+            config = load_server_config()
+            start = start if start is not None else int(config["port_range_start"])
+            end = end if end is not None else int(config["port_range_end"])
+
+        if (start, end) != (self._start, self._end):
+            if end <= start:
+                raise ValueError(f"Rango de puertos inválido: {start}-{end}")
+            self._start, self._end = start, end
+            self._used = bytearray(end - start)
+            self._occupied = set()
+            self._cursor = 0
+            for port in self._reservations:
+                self._set_bit(port, True)
+
+    def _set_bit(self, port: int, value: bool):
+        if self._start is not None and self._start <= port < self._end:
+            self._used[port - self._start] = 1 if value else 0
+
+
+port_allocator = PortAllocator()
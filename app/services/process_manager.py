@@ -2,127 +2,131 @@
 
 import subprocess
 import os
+import signal
+import sys
+import datetime
 import psutil
 from sqlalchemy.orm import Session
 import logging
-import json
-from app.configs import NGROK_CONFIG_FILE
-from app.models import Application, Log
-from app.utils import find_available_port, check_port_available
+from app.configs import load_ngrok_config, load_server_config
+from app.models import Application
+from app.utils import check_port_available, wait_until_ready
+from app.services.port_allocator import port_allocator
+from app.services.front import front_manager
+from app.services.launch_plans import LaunchPlan, launch_plans, plan_settings, PORT
+from app.services.log_sink import log_sink
+from app.services.output_capture import output_capture
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Procesos lanzados por este proceso, por PID. Mantener la referencia evita que
+# subprocess recoja su estado de salida antes que el supervisor.
+spawned_processes = {}
+
+# Servidores disponibles por tipo de aplicación; el primero es el predeterminado
+APP_SERVERS = {
+    "flask": ("waitress", "gunicorn"),
+    "fastapi": ("uvicorn", "gunicorn"),
+    "django": ("gunicorn",),
+}
+
+
+def normalize_worker_setting(value):
+    """Valida un valor de workers/threads: vacío (predeterminado del servidor), "auto" o un entero positivo."""
+    if value is None or str(value).strip() == "":
+        return None
+    value = str(value).strip().lower()
+    if value == "auto":
+        return value
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"Valor no válido: {value}. Use 'auto' o un entero positivo")
+    return value
+
+
+def resolve_worker_settings(app_type: str, server: str, workers=None, threads=None):
+    """
+    Convierte los valores guardados en números concretos. None significa usar
+    el valor predeterminado del servidor. En modo "auto":
+      - workers: núcleos para uvicorn (también como worker de gunicorn) y
+        2 * núcleos + 1 para gunicorn síncrono, según recomienda gunicorn
+      - threads: 2 hilos por núcleo (mínimo 4) para waitress y 4 por worker en gunicorn
+    """
+    cpus = os.cpu_count() or 1
+    async_workers = server == "uvicorn" or app_type == "fastapi"
+
+    if workers == "auto":
+        workers = cpus if async_workers else 2 * cpus + 1
+    elif workers is not None:
+        workers = int(workers)
+
+    if threads == "auto":
+        threads = max(4, cpus * 2) if server == "waitress" else 4
+    elif threads is not None:
+        threads = int(threads)
+
+    return workers, threads
+
+
 class ProcessManager:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, progress=None):
         self.db = db
+        # Callback opcional que recibe el nombre de cada paso (ver LifecycleEngine)
+        self.progress = progress
+        self.last_error = None
 
-        self.ngrok_token = None
-
-        try:
-            if os.path.exists(NGROK_CONFIG_FILE):
-                with open(NGROK_CONFIG_FILE, "r") as f:
-                    config = json.load(f)
-                    self.ngrok_token = config.get("token", None)
-        except Exception as e:
-            print(f"Error al cargar la configuración de ngrok: {str(e)}")
+        # Sale de la caché de configuración: construir un ProcessManager no lee el disco
+        self.ngrok_token = load_ngrok_config().get("token", None)
         
     def start_application(self, app_id: int):
+        self._step("lookup")
         application = self.db.query(Application).filter(Application.id == app_id).first()
         if not application:
             self._add_log(app_id, "Aplicación no encontrada", "error")
             return False
         
-        if application.status == "running":
+        if application.status in ("running", "starting"):
             self._add_log(app_id, "La aplicación ya está en ejecución", "warning")
             return True
+
+        if application.status == "stopping" and self._process_alive(application.pid):
+            self._add_log(app_id, "La aplicación se está deteniendo; vuelve a intentarlo cuando termine", "error")
+            return False
         
         # Asignar un puerto si no tiene uno
+        self._step("port")
         if not application.port:
-            port = find_available_port(self.db, exclude_app_id=app_id)
+            port = port_allocator.allocate(self.db, exclude_app_id=app_id, app_id=app_id)
             if not port:
                 self._add_log(app_id, "No se encontraron puertos disponibles", "error")
                 return False
             application.port = port
         
-        # Verificar que el puerto sigue disponible
-        if not check_port_available(application.port):
-            new_port = find_available_port(self.db, exclude_app_id=app_id)
-            if not new_port:
+        if application.backend_port is not None:
+            # Publicada por el listener frontal del panel: la instancia escucha en un
+            # puerto interno y el puerto público puede estar ocupado por el propio panel
+            listen_port = self._pick_backend_port(application)
+            if not listen_port:
                 self._add_log(app_id, "No se encontraron puertos disponibles", "error")
                 return False
-            application.port = new_port
-            self._add_log(app_id, f"Puerto reasignado a {new_port}", "warning")
-        
-        # Construir el comando según el tipo de aplicación
-        cmd = []
-        env = os.environ.copy()
-        env['PYTHONUNBUFFERED'] = '1'
-        cwd = application.directory
-
-        python_cmd = "python"  # Por defecto
-    
-        if application.environment_type == "virtualenv":
-            if application.environment_path:
-                python_bin = os.path.join(application.environment_path, "bin", "python")
-                if os.path.exists(python_bin) and os.access(python_bin, os.X_OK):
-                    python_cmd = python_bin
-                else:
-                    self._add_log(app_id, f"Entorno virtual no encontrado: {application.environment_path}", "error")
+        else:
+            # Verificar que el puerto sigue disponible
+            if not check_port_available(application.port):
+                new_port = port_allocator.allocate(self.db, exclude_app_id=app_id, app_id=app_id)
+                if not new_port:
+                    self._add_log(app_id, "No se encontraron puertos disponibles", "error")
                     return False
-    
-        elif application.environment_type == "conda":
-            # Para conda, necesitamos crear un script de activación
-            if application.environment_path:
-                conda_script = f"""
-                #!/bin/bash
-                source ~/anaconda3/etc/profile.d/conda.sh || source ~/miniconda3/etc/profile.d/conda.sh
-                conda activate {application.environment_path}
-                exec "$@"
-                """
-                script_path = os.path.join(cwd, ".conda_runner.sh")
-                with open(script_path, "w") as f:
-                    f.write(conda_script)
-                os.chmod(script_path, 0o755)
-            
-                # Ahora el comando usará el script de activación
-                cmd = [script_path]
-                python_cmd = "python"
+                application.port = new_port
+                self._add_log(app_id, f"Puerto reasignado a {new_port}", "warning")
+            listen_port = application.port
         
-        if application.app_type.lower() == "flask":
-            # Formato esperado: python -m waitress --port=8000 module:app
-            module_name = os.path.splitext(application.main_file)[0].replace("/", ".")
-            if application.environment_type == "conda":
-                cmd.extend([python_cmd, "-m", "waitress", f"--port={application.port}", "--host=0.0.0.0", f"{module_name}:app"])
-            else:
-                cmd = [python_cmd, "-m", "waitress", f"--port={application.port}", "--host=0.0.0.0", f"{module_name}:app"]
-        elif application.app_type.lower() == "fastapi":
-            # Formato esperado: uvicorn module:app --port 8000
-            module_name = os.path.splitext(application.main_file)[0].replace("\\", ".").replace("/", ".")
-            if application.environment_type == "conda":
-                cmd.extend([python_cmd, "-m", "uvicorn", f"{module_name}:app", f"--port={application.port}", "--host=0.0.0.0"])
-            else:
-                cmd = [python_cmd, "-m", "uvicorn", f"{module_name}:app", f"--port={application.port}", "--host=0.0.0.0"]
-
-        elif application.app_type.lower() == "django":
-            project_dirs = [d for d in os.listdir(application.directory) 
-                   if os.path.isdir(os.path.join(application.directory, d)) 
-                   and os.path.exists(os.path.join(application.directory, d, 'wsgi.py'))]
-
-            if not project_dirs:
-                self._add_log(app_id, "No se pudo detectar el módulo WSGI de Django", "error")
-                return False
-
-            project_name = project_dirs[0]
-            env["DJANGO_SETTINGS_MODULE"] = f"{project_name}.settings"
-
-            if application.environment_type == "conda":
-                cmd.extend([python_cmd, "-m", "gunicorn", f"{project_name}.wsgi:application", "--bind", f"0.0.0.0:{application.port}"])
-            else:
-                cmd = [python_cmd, "-m", "gunicorn", f"{project_name}.wsgi:application", "--bind", f"0.0.0.0:{application.port}"]
-        else:
-            self._add_log(app_id, f"Tipo de aplicación no soportado: {application.app_type}", "error")
+        # Construir el comando según el tipo de aplicación
+        self._step("command")
+        launch = self._build_command(application, listen_port)
+        if launch is None:
+            port_allocator.release(listen_port)
             return False
+        cmd, env, cwd = launch
         
         self._add_log(app_id, f"Ejecutando comando: {' '.join(cmd)}", "info")
         self._add_log(app_id, f"En directorio: {cwd}", "info")
@@ -130,32 +134,46 @@ class ProcessManager:
         
         
         try:
-            # Crear archivos para stdout y stderr
-            logs_dir = os.path.join(cwd, "logs")
-            os.makedirs(logs_dir, exist_ok=True)
-            
-            stdout_file = open(os.path.join(logs_dir, "stdout.log"), "a")
-            stderr_file = open(os.path.join(logs_dir, "stderr.log"), "a")
-            
-            # Iniciar el proceso
-            process = subprocess.Popen(
-                cmd,
-                cwd=cwd,
-                env=env,
-                stdout=stdout_file,
-                stderr=stderr_file,
-                bufsize=0,
-                start_new_session=True  # Crea un nuevo grupo de procesos
-            )
-            
-            # Actualizar el estado de la aplicación
+            self._step("spawn")
+            process, logs_dir = self._spawn(cmd, env, cwd, application)
+
+            # La aplicación queda "starting" hasta que acepte conexiones
             application.pid = process.pid
+            application.status = "starting"
+            if application.backend_port is not None:
+                application.backend_port = listen_port
+            self.db.commit()
+            # El puerto ya consta en la base de datos; la reserva en memoria sobra
+            port_allocator.release(application.port)
+            port_allocator.release(listen_port)
+
+            self._step("readiness")
+            timeout = float(load_server_config().get("readiness_timeout", 30))
+            ready, elapsed_ms, reason = wait_until_ready(process, listen_port, application.health_check_path, timeout)
+            if not ready:
+                stderr_tail = self._read_tail(os.path.join(logs_dir, "stderr.log"), process)
+                if stderr_tail:
+                    self._add_log(app_id, f"Últimas líneas de stderr:\n{stderr_tail}", "error")
+                self._add_log(app_id, f"La aplicación no llegó a estar lista: {reason}", "error")
+                try:
+                    self._terminate_process_tree(process.pid)
+                except psutil.NoSuchProcess:
+                    pass
+                application.status = "error"
+                application.pid = None
+                self.db.commit()
+                return False
+
             application.status = "running"
+            application.startup_time_ms = round(elapsed_ms, 1)
             self.db.commit()
-            
-            self._add_log(app_id, f"Aplicación iniciada en el puerto {application.port} con PID {process.pid}", "info")
+
+            self._add_log(app_id, f"Aplicación iniciada en el puerto {application.port} con PID {process.pid} (lista en {elapsed_ms:.0f} ms)", "info")
+            if application.backend_port is not None:
+                self._publish_front(application)
 
             if application.ngrok_enabled and application.port:
+                self._step("ngrok")
                 try:
                     from pyngrok import ngrok, conf
             
@@ -182,6 +200,8 @@ class ProcessManager:
             self._add_log(app_id, f"Detalles del error: {traceback.format_exc()}", "error")
             application.status = "error"
             self.db.commit()
+            port_allocator.release(application.port)
+            port_allocator.release(listen_port)
             return False
         
         
@@ -200,44 +220,55 @@ class ProcessManager:
         return local_ip
     
     def stop_application(self, app_id: int):
+        self._step("lookup")
         application = self.db.query(Application).filter(Application.id == app_id).first()
         if not application:
+            self._add_log(app_id, "Aplicación no encontrada", "error")
             return False
+
+        if application.status == "stopping":
+            # Otra parada sigue terminando el árbol de procesos: no se toca el estado
+            if self._process_alive(application.pid):
+                self._add_log(app_id, "La aplicación ya se está deteniendo", "error")
+                return False
+            # Parada interrumpida (p. ej. el panel se cerró a mitad) y el proceso ya no existe
+            application.status = "stopped"
+            application.pid = None
+            self.db.commit()
+            return True
         
-        if application.status != "running" or not application.pid:
+        if application.status not in ("running", "starting") or not application.pid:
             application.status = "stopped"
             self.db.commit()
             return True
         
+        # Marcarla antes de enviar la señal: el supervisor ve la salida del
+        # proceso al instante y solo la registra como fallo si sigue en "running"
+        previous_status = application.status
+        application.status = "stopping"
+        self.db.commit()
+
         try:
             # Intenta terminar el proceso y todos sus hijos
-            parent = psutil.Process(application.pid)
-            children = parent.children(recursive=True)
-            
-            for child in children:
-                child.terminate()
-            
-            # Termina el proceso principal
-            parent.terminate()
-            
-            # Espera a que terminen los procesos
-            gone, alive = psutil.wait_procs(children + [parent], timeout=5)
-            
-            # Si alguno sigue vivo, lo mata forzosamente
-            for p in alive:
-                p.kill()
+            self._step("terminate")
+            self._terminate_process_tree(application.pid)
             
             application.status = "stopped"
             application.pid = None
             self.db.commit()
 
+            if application.backend_port is not None:
+                front_manager.close(app_id)
+
             if application.ngrok_url:
+                self._step("ngrok")
                 try:
                     from pyngrok import ngrok
                     # Extraer el puerto del túnel de la URL
                     public_url = application.ngrok_url
                     ngrok.disconnect(public_url)
                     application.ngrok_url = None
+                    self.db.commit()
                     self._add_log(app_id, f"Túnel ngrok cerrado: {public_url}", "info")
                 except Exception as e:
                     self._add_log(app_id, f"Error al cerrar túnel ngrok: {str(e)}", "warning")
@@ -254,6 +285,10 @@ class ProcessManager:
             return True
             
         except Exception as e:
+            self.db.rollback()
+            if application.status == "stopping":
+                application.status = previous_status
+                self.db.commit()
             self._add_log(app_id, f"Error al detener la aplicación: {str(e)}", "error")
             return False
     
@@ -261,6 +296,122 @@ class ProcessManager:
         if self.stop_application(app_id):
             return self.start_application(app_id)
         return False
+
+    def blue_green_restart(self, app_id: int):
+        """
+        Reinicio sin cortes: arranca una instancia nueva en un puerto interno,
+        espera a que esté lista, cambia el listener frontal del panel para que
+        las conexiones nuevas vayan a ella y solo entonces espera a que terminen
+        las conexiones de la instancia anterior y la detiene.
+
+        La primera vez la instancia anterior escucha directamente en el puerto
+        público: el panel abre su listener en ese mismo puerto con SO_REUSEPORT
+        antes de enviarle SIGTERM, así que siempre hay un socket aceptando
+        conexiones. Solo es posible si la instancia anterior también lo usa
+        (gunicorn se lanza con --reuse-port); si no, se aborta sin tocarla.
+        Si la instancia nueva no llega a estar lista, la anterior sigue sirviendo.
+        """
+        self._step("lookup")
+        application = self.db.query(Application).filter(Application.id == app_id).first()
+        if not application:
+            self._add_log(app_id, "Aplicación no encontrada", "error")
+            return False
+
+        if application.status != "running" or not application.pid or not application.port:
+            self._add_log(app_id, "La aplicación no está en ejecución; se arranca normalmente", "info")
+            return self.start_application(app_id)
+
+        if not front_manager.available:
+            self._add_log(app_id, "El reinicio sin cortes necesita el panel en marcha (listener frontal)", "error")
+            return False
+
+        old_pid = application.pid
+        old_backend_port = application.backend_port
+        config = load_server_config()
+
+        self._step("port")
+        new_port = port_allocator.allocate(self.db, app_id=app_id)
+        if not new_port:
+            self._add_log(app_id, "No se encontraron puertos disponibles", "error")
+            return False
+
+        self._step("command")
+        launch = self._build_command(application, new_port)
+        if launch is None:
+            port_allocator.release(new_port)
+            return False
+        cmd, env, cwd = launch
+        self._add_log(app_id, f"Reinicio sin cortes: nueva instancia en el puerto interno {new_port}", "info")
+        self._add_log(app_id, f"Ejecutando comando: {' '.join(cmd)}", "info")
+
+        try:
+            self._step("spawn")
+            process, logs_dir = self._spawn(cmd, env, cwd, application)
+
+            self._step("readiness")
+            ready, elapsed_ms, reason = wait_until_ready(
+                process, new_port, application.health_check_path, float(config.get("readiness_timeout", 30))
+            )
+            if not ready:
+                stderr_tail = self._read_tail(os.path.join(logs_dir, "stderr.log"), process)
+                if stderr_tail:
+                    self._add_log(app_id, f"Últimas líneas de stderr:\n{stderr_tail}", "error")
+                self._add_log(app_id, f"La nueva instancia no llegó a estar lista: {reason}. La anterior sigue en servicio", "error")
+                try:
+                    self._terminate_process_tree(process.pid)
+                except psutil.NoSuchProcess:
+                    pass
+                port_allocator.release(new_port)
+                return False
+        except Exception as e:
+            self._add_log(app_id, f"Error al iniciar la nueva instancia: {str(e)}", "error")
+            port_allocator.release(new_port)
+            return False
+
+        self._step("switch")
+        # El listener del panel pasa a la instancia nueva antes de tocar la anterior.
+        # La primera vez comparte el puerto con ella (SO_REUSEPORT) y el kernel reparte
+        # las conexiones entre ambos hasta que la anterior cierra el suyo
+        try:
+            front_manager.publish(app_id, application.port, new_port, reuse_port=old_backend_port is None)
+        except Exception as e:
+            self._add_log(
+                app_id,
+                f"No se pudo dirigir el puerto {application.port} a la nueva instancia ({str(e)}); "
+                "se aborta el reinicio sin cortes y la instancia anterior sigue en servicio",
+                "error"
+            )
+            try:
+                self._terminate_process_tree(process.pid)
+            except psutil.NoSuchProcess:
+                pass
+            port_allocator.release(new_port)
+            return False
+
+        # A partir de aquí la instancia nueva es la de la aplicación; el supervisor
+        # deja de vigilar la anterior y su salida no cuenta como caída
+        application.pid = process.pid
+        application.backend_port = new_port
+        application.startup_time_ms = round(elapsed_ms, 1)
+        self.db.commit()
+        port_allocator.release(new_port)
+
+        drain_timeout = float(config.get("drain_timeout", 30))
+        if old_backend_port is None:
+            self._signal_process(old_pid, signal.SIGTERM)
+
+        self._step("drain")
+        if old_backend_port is not None and not front_manager.drain(app_id, old_backend_port, drain_timeout):
+            self._add_log(app_id, f"Conexiones de la instancia anterior abiertas tras {drain_timeout:.0f} s; se cierran", "warning")
+
+        self._step("stop-old")
+        try:
+            self._terminate_process_tree(old_pid, timeout=drain_timeout if old_backend_port is None else 5)
+        except psutil.NoSuchProcess:
+            spawned_processes.pop(old_pid, None)
+
+        self._add_log(app_id, f"Reinicio sin cortes completado: PID {old_pid} sustituido por {process.pid} (lista en {elapsed_ms:.0f} ms)", "info")
+        return True
     
     def check_application_status(self, app_id: int):
         application = self.db.query(Application).filter(Application.id == app_id).first()
@@ -279,8 +430,264 @@ class ProcessManager:
             self._add_log(app_id, "El proceso ya no existe", "warning")
             self.db.commit()
     
-    def _add_log(self, app_id: int, message: str, level: str = "info"):
-        log = Log(application_id=app_id, message=message, level=level)
-        self.db.add(log)
+    def record_exit(self, app_id: int, pid: int, exit_code=None, rusage=None):
+        """
+        Registra la salida de una aplicación que estaba en ejecución.
+        Devuelve la aplicación si la salida fue inesperada, o None si el proceso
+        ya no correspondía a la aplicación o se está deteniendo desde el panel
+        (estado "stopping").
+        """
+        application = self.db.query(Application).filter(Application.id == app_id).first()
+        if not application or application.pid != pid or application.status != "running":
+            return None
+
+        application.status = "error"
+        application.pid = None
+        application.last_exit_code = exit_code
+        application.last_exit_at = datetime.datetime.utcnow()
         self.db.commit()
+
+        details = f"código {exit_code}" if exit_code is not None else "código desconocido"
+        if rusage is not None:
+            # ru_maxrss está en KB en Linux y en bytes en macOS
+            max_rss_mb = rusage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else rusage.ru_maxrss / 1024
+            details += f", CPU usuario {rusage.ru_utime:.2f} s, sistema {rusage.ru_stime:.2f} s, RSS máx. {max_rss_mb:.1f} MB"
+        self._add_log(app_id, f"El proceso {pid} terminó inesperadamente ({details})", "error")
+        return application
+
+    def _build_command(self, application: Application, port: int):
+        """
+        Devuelve (cmd, env, cwd) para lanzar la aplicación en `port`, o None si
+        no es posible, tras registrar el motivo. La detección se hace una vez y
+        se reutiliza mientras no cambien los ajustes ni los ficheros del plan.
+        """
+        plan = launch_plans.get(application)
+        if plan is None:
+            plan = self._compile_launch_plan(application)
+            if plan is None:
+                return None
+            launch_plans.put(application.id, plan)
+        return plan.command(port)
+
+    def _compile_launch_plan(self, application: Application):
+        """
+        Construye el plan de arranque con el servidor, workers e hilos
+        configurados: entorno (virtualenv/conda), módulo WSGI/ASGI y argumentos.
+        """
+        app_id = application.id
+        settings = plan_settings(application)
+        port = PORT
+        cmd = []
+        env = os.environ.copy()
+        env['PYTHONUNBUFFERED'] = '1'
+        cwd = application.directory
+        # Rutas cuyo cambio obliga a repetir la detección. El directorio de la
+        # aplicación no se vigila: logs/, __pycache__ o una base SQLite lo modifican continuamente
+        watched = []
+
+        python_cmd = "python"  # Por defecto
+    
+        if application.environment_type == "virtualenv":
+            if application.environment_path:
+                python_bin = os.path.join(application.environment_path, "bin", "python")
+                if os.path.exists(python_bin) and os.access(python_bin, os.X_OK):
+                    python_cmd = python_bin
+                    watched.append(python_bin)
+                else:
+                    self._add_log(app_id, f"Entorno virtual no encontrado: {application.environment_path}", "error")
+                    return None
+    
+        elif application.environment_type == "conda":
+            # Para conda, necesitamos crear un script de activación
+            if application.environment_path:
+                conda_script = f"""
+                #!/bin/bash
+                source ~/anaconda3/etc/profile.d/conda.sh || source ~/miniconda3/etc/profile.d/conda.sh
+                conda activate {application.environment_path}
+                exec "$@"
+                """
+                script_path = os.path.join(cwd, ".conda_runner.sh")
+                with open(script_path, "w") as f:
+                    f.write(conda_script)
+                os.chmod(script_path, 0o755)
+            
+                # Ahora el comando usará el script de activación
+                cmd = [script_path]
+                python_cmd = "python"
+                watched.append(script_path)
+
+        app_type = application.app_type.lower()
+        if app_type not in APP_SERVERS:
+            self._add_log(app_id, f"Tipo de aplicación no soportado: {application.app_type}", "error")
+            return None
+
+        server = (application.server or APP_SERVERS[app_type][0]).lower()
+        if server not in APP_SERVERS[app_type]:
+            self._add_log(app_id, f"Servidor {server} no soportado para aplicaciones {app_type}", "error")
+            return None
+
+        workers, threads = resolve_worker_settings(app_type, server, application.workers, application.threads)
+
+        if app_type == "django":
+            project_dirs = [d for d in os.listdir(application.directory) 
+                   if os.path.isdir(os.path.join(application.directory, d)) 
+                   and os.path.exists(os.path.join(application.directory, d, 'wsgi.py'))]
+
+            if not project_dirs:
+                self._add_log(app_id, "No se pudo detectar el módulo WSGI de Django", "error")
+                return None
+
+            project_name = project_dirs[0]
+            watched.append(os.path.join(application.directory, project_name, "wsgi.py"))
+            env["DJANGO_SETTINGS_MODULE"] = f"{project_name}.settings"
+            target = f"{project_name}.wsgi:application"
+        else:
+            module_name = os.path.splitext(application.main_file)[0].replace("\\", ".").replace("/", ".")
+            target = f"{module_name}:app"
+
+        if server == "waitress":
+            # Formato esperado: python -m waitress --port=8000 module:app
+            args = ["-m", "waitress", f"--port={port}", "--host=0.0.0.0"]
+            if threads:
+                args.append(f"--threads={threads}")
+            args.append(target)
+            if workers and workers > 1:
+                self._add_log(app_id, "Waitress usa un solo proceso; se ignora el número de workers (use gunicorn para varios)", "warning")
+        elif server == "uvicorn":
+            # Formato esperado: uvicorn module:app --port 8000
+            args = ["-m", "uvicorn", target, f"--port={port}", "--host=0.0.0.0"]
+            if workers:
+                args.append(f"--workers={workers}")
+        else:
+            # --reuse-port permite al panel compartir el puerto en el primer reinicio sin cortes
+            args = ["-m", "gunicorn", target, "--bind", f"0.0.0.0:{port}", "--reuse-port"]
+            if workers:
+                args.extend(["--workers", str(workers)])
+            if app_type == "fastapi":
+                # Gunicorn como gestor de procesos con workers ASGI de uvicorn
+                args.extend(["--worker-class", "uvicorn.workers.UvicornWorker"])
+            elif threads:
+                args.extend(["--threads", str(threads)])
+
+        return LaunchPlan(cmd + [python_cmd] + args, env, cwd, settings, watched)
+
+    def _spawn(self, cmd, env, cwd, application: Application):
+        """
+        Lanza el proceso en su propio grupo con stdout/stderr en logs/ del
+        directorio de la aplicación: directamente a los ficheros o, en modo
+        de captura "pipe", a través del panel (ver OutputCapture).
+        """
+        logs_dir = os.path.join(cwd, "logs")
+        os.makedirs(logs_dir, exist_ok=True)
+
+        config = load_server_config()
+        capture = self._use_pipe_capture(application, config)
+        if capture:
+            stdout_file = stderr_file = subprocess.PIPE
+        else:
+            stdout_file = open(os.path.join(logs_dir, "stdout.log"), "a")
+            stderr_file = open(os.path.join(logs_dir, "stderr.log"), "a")
+        
+        process = subprocess.Popen(
+            cmd,
+            cwd=cwd,
+            env=env,
+            stdout=stdout_file,
+            stderr=stderr_file,
+            bufsize=0,
+            start_new_session=True  # Crea un nuevo grupo de procesos
+        )
+        
+        spawned_processes[process.pid] = process
+        if capture:
+            output_capture.attach(application.id, process, logs_dir, int(config.get("output_buffer_lines", 1000)))
+        return process, logs_dir
+
+    def _use_pipe_capture(self, application: Application, config: dict) -> bool:
+        mode = application.output_capture or config.get("output_capture", "file")
+        if mode != "pipe":
+            return False
+        if not front_manager.available:
+            # Fuera del panel (p. ej. la CLI) nadie leería los pipes
+            self._add_log(application.id, "La captura por pipes solo está disponible desde el panel; la salida irá directamente a logs/", "warning")
+            return False
+        return True
+
+    def _pick_backend_port(self, application: Application):
+        """Puerto interno para una aplicación publicada por el listener frontal; reutiliza el anterior si está libre."""
+        port = application.backend_port
+        if port and check_port_available(port) and port_allocator.reserve(port, application.id):
+            return port
+        return port_allocator.allocate(self.db, app_id=application.id)
+
+    def _publish_front(self, application: Application) -> bool:
+        """Dirige el puerto público al puerto interno actual. Fuera del panel lo hará el panel al sincronizar."""
+        if not front_manager.available:
+            self._add_log(application.id, f"El puerto {application.port} se publicará cuando el panel esté en marcha", "warning")
+            return True
+        try:
+            front_manager.publish(application.id, application.port, application.backend_port)
+            return True
+        except Exception as e:
+            self._add_log(application.id, f"No se pudo publicar el puerto {application.port}: {str(e)}. El panel lo reintentará", "error")
+            return False
+
+    def _process_alive(self, pid) -> bool:
+        if not pid:
+            return False
+        try:
+            return psutil.Process(pid).status() not in (psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD)
+        except psutil.NoSuchProcess:
+            return False
+
+    def _signal_process(self, pid: int, sig: int):
+        # Solo al proceso principal: uvicorn y gunicorn propagan la parada a sus workers
+        try:
+            psutil.Process(pid).send_signal(sig)
+        except psutil.NoSuchProcess:
+            pass
+
+    def _terminate_process_tree(self, pid: int, timeout: float = 5):
+        """Termina un proceso y todos sus hijos; mata los que sigan vivos tras `timeout`."""
+        parent = psutil.Process(pid)
+        children = parent.children(recursive=True)
+        
+        for child in children:
+            child.terminate()
+        
+        # Termina el proceso principal
+        parent.terminate()
+        
+        # Espera a que terminen los procesos
+        self._step("wait")
+        gone, alive = psutil.wait_procs(children + [parent], timeout=timeout)
+        
+        # Si alguno sigue vivo, lo mata forzosamente
+        for p in alive:
+            p.kill()
+
+        spawned_processes.pop(pid, None)
+
+    def _read_tail(self, path: str, process=None, max_bytes: int = 2000, max_lines: int = 10):
+        if process is not None and process.stdout is not None:
+            # Salida capturada por pipes: esperar a que llegue al fichero
+            output_capture.drain(process)
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - max_bytes))
+                lines = f.read().decode("utf-8", errors="replace").splitlines()
+            return "\n".join(lines[-max_lines:])
+        except OSError:
+            return ""
+
+    def _step(self, name: str):
+        if self.progress is not None:
+            self.progress(name)
+
+    def _add_log(self, app_id: int, message: str, level: str = "info"):
+        if level == "error":
+            self.last_error = message
+        # Se escribe por lotes en segundo plano; no hace commit de la sesión
+        log_sink.emit(app_id, message, level)
         logger.info(f"App {app_id}: {message}")
\ No newline at end of file
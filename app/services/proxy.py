@@ -0,0 +1,495 @@
+#proxy.py
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from app.configs import load_server_config
+from app.db import SessionLocal
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Tamaño máximo de la línea inicial más las cabeceras
+MAX_HEAD_SIZE = 64 * 1024
+# Cuerpos con Content-Length hasta este tamaño se leen enteros antes de enviarlos,
+# para poder repetir la petición si la conexión del pool estaba cerrada
+RETRY_BODY_LIMIT = 64 * 1024
+
+# Cabeceras de un solo salto: no se reenvían tal cual al otro lado
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "proxy-connection", "te", "trailer", "upgrade"
+}
+
+REASONS = {400: "Bad Request", 404: "Not Found", 431: "Request Header Fields Too Large",
+           502: "Bad Gateway", 504: "Gateway Timeout"}
+
+_DIGITS = re.compile(r"[0-9]+")
+_HEX_DIGITS = re.compile(rb"[0-9A-Fa-f]+")
+
+
+class _Message:
+    """Línea inicial y cabeceras de una petición o respuesta HTTP/1.x."""
+
+    def __init__(self, head: bytes):
+        lines = head.decode("latin-1").split("\r\n")
+        self.start = lines[0].split(" ", 2)
+        if len(self.start) < 2:
+            raise ValueError("Línea inicial no válida")
+        self.headers: List[Tuple[str, str]] = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise ValueError("Cabecera no válida")
+            self.headers.append((name.strip(), value.strip()))
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def tokens(self, name: str) -> set:
+        return {t.strip().lower() for t in (self.get(name) or "").split(",") if t.strip()}
+
+    @property
+    def chunked(self) -> bool:
+        return "chunked" in self.tokens("transfer-encoding")
+
+    @property
+    def content_length(self) -> Optional[int]:
+        values = {value for key, value in self.headers if key.lower() == "content-length"}
+        if not values:
+            return None
+        # Solo dígitos: int() aceptaría "-1", "+5" o "1_0" y desincronizaría el cuerpo
+        if len(values) > 1 or not _DIGITS.fullmatch(next(iter(values))):
+            raise ValueError("Content-Length no válido")
+        return int(next(iter(values)))
+
+    def validate_request_framing(self):
+        """
+        Rechaza (ValueError) peticiones cuyo cuerpo se podría delimitar de dos
+        formas: Content-Length y Transfer-Encoding a la vez, o un
+        Transfer-Encoding que no termina en chunked.
+        """
+        self.content_length
+        transfer_encoding = self.get("transfer-encoding")
+        if transfer_encoding is None:
+            return
+        if self.get("content-length") is not None:
+            raise ValueError("Content-Length y Transfer-Encoding en la misma petición")
+        encodings = [t.strip().lower() for t in transfer_encoding.split(",") if t.strip()]
+        if not encodings or encodings[-1] != "chunked":
+            raise ValueError("Transfer-Encoding no soportado")
+
+
+class _Route:
+    def __init__(self, app_id: int, host: Optional[str], path: Optional[str], port: int):
+        self.app_id = app_id
+        self.host = host
+        self.path = path
+        self.port = port
+
+    def match(self, host: str, target: str) -> Optional[str]:
+        """Devuelve la ruta que recibe la aplicación, o None si la petición no es suya."""
+        if self.host and self.host != host:
+            return None
+        if not self.path:
+            return target
+        if target == self.path or target.startswith(self.path + "/") or target.startswith(self.path + "?"):
+            rest = target[len(self.path):]
+            return rest if rest.startswith("/") else "/" + rest
+        return None
+
+
+class UpstreamPool:
+    """Conexiones keep-alive reutilizables hacia cada puerto de aplicación."""
+
+    def __init__(self, max_idle: int = 32, idle_timeout: float = 4.0, connect_timeout: float = 5.0):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._idle: Dict[int, deque] = {}
+
+    async def acquire(self, port: int, fresh: bool = False):
+        """Devuelve (reader, writer, reutilizada). Con `fresh` abre siempre una conexión nueva."""
+        idle = None if fresh else self._idle.get(port)
+        now = time.monotonic()
+        while idle:
+            reader, writer, since = idle.pop()
+            if writer.is_closing() or reader.at_eof() or now - since > self.idle_timeout:
+                writer.close()
+                continue
+            return reader, writer, True
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port), self.connect_timeout
+        )
+        return reader, writer, False
+
+    def release(self, port: int, reader, writer):
+        idle = self._idle.setdefault(port, deque())
+        if writer.is_closing() or len(idle) >= self.max_idle:
+            writer.close()
+            return
+        idle.append((reader, writer, time.monotonic()))
+
+    def discard(self, port: int):
+        for _, writer, _ in self._idle.pop(port, ()):
+            writer.close()
+
+    def close_all(self):
+        for port in list(self._idle):
+            self.discard(port)
+
+
+class ReverseProxy:
+    """
+    Proxy inverso HTTP/1.1 opcional que publica todas las aplicaciones en un
+    único puerto. Cada aplicación puede reclamar un nombre de host
+    (`Application.proxy_host`) y/o un prefijo de ruta (`Application.proxy_path`,
+    que se elimina antes de reenviar y se indica en X-Forwarded-Prefix).
+
+    Los cuerpos se reenvían en streaming con su codificación original
+    (Content-Length o chunked), las conexiones con las aplicaciones se
+    mantienen en un pool keep-alive y las peticiones Upgrade (websockets)
+    pasan a un túnel bidireccional tras la respuesta 101.
+    """
+
+    def __init__(self, sync_interval: float = 2.0):
+        self.sync_interval = sync_interval
+        self.pool = UpstreamPool()
+        self.timeout = 60.0
+        self._routes: List[_Route] = []
+        self._server = None
+        self._task = None
+        self._connections = set()
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    async def start(self):
+        config = load_server_config()
+        if self._server is not None or not config.get("proxy_enabled"):
+            return
+        self.timeout = float(config.get("proxy_timeout", 60))
+        self.pool = UpstreamPool(
+            max_idle=int(config.get("proxy_pool_size", 32)),
+            idle_timeout=float(config.get("proxy_idle_timeout", 4))
+        )
+        loop = asyncio.get_running_loop()
+        self._routes = await loop.run_in_executor(None, self._load_routes)
+        host, port = config.get("proxy_host", "0.0.0.0"), int(config.get("proxy_port", 7070))
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_client, host=host, port=port, reuse_address=True, limit=MAX_HEAD_SIZE
+            )
+        except OSError as e:
+            logger.error(f"No se pudo iniciar el proxy en {host}:{port}: {e}")
+            return
+        self._task = loop.create_task(self._run())
+        logger.info(f"Proxy inverso escuchando en {host}:{port}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        self.pool.close_all()
+
+    def routes(self) -> List[dict]:
+        return [{"app_id": r.app_id, "host": r.host, "path": r.path, "port": r.port} for r in self._routes]
+
+    def resolve(self, host: str, target: str):
+        host = host.rsplit(":", 1)[0].lower() if host and not host.startswith("[") else (host or "").lower()
+        for route in self._routes:
+            upstream_target = route.match(host, target)
+            if upstream_target is not None:
+                return route, upstream_target
+        return None, None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                routes = await loop.run_in_executor(None, self._load_routes)
+                old_ports = {r.port for r in self._routes}
+                self._routes = routes
+                for port in old_ports - {r.port for r in routes}:
+                    self.pool.discard(port)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al actualizar las rutas del proxy")
+
+    def _load_routes(self) -> List[_Route]:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Application.id, Application.proxy_host, Application.proxy_path,
+                Application.port, Application.backend_port
+            ).filter(
+                Application.status == "running",
+                Application.port.isnot(None)
+            ).order_by(Application.id).all()
+        finally:
+            db.close()
+
+        routes = []
+        for app_id, host, path, port, backend_port in rows:
+            if not host and not path:
+                continue
+            # Directo a la instancia activa, sin pasar por el listener frontal
+            routes.append(_Route(app_id, (host or "").lower() or None, path or None, backend_port or port))
+        # Primero las rutas con host y después los prefijos más largos
+        routes.sort(key=lambda r: (r.host is None, -len(r.path or "")))
+        return routes
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        peer = writer.get_extra_info("peername")
+        client_ip = peer[0] if peer else ""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(self._read_head(reader), self.pool.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._error(writer, 431)
+                    break
+                if head is None:
+                    break
+                try:
+                    request = _Message(head)
+                    method, target, version = (request.start + ["HTTP/1.0"])[:3]
+                    # Valida cómo se delimita el cuerpo antes de reenviar nada
+                    request.validate_request_framing()
+                except ValueError:
+                    await self._error(writer, 400)
+                    break
+
+                keep_alive = await self._forward(request, method, target, version, reader, writer, client_ip)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _forward(self, request: _Message, method: str, target: str, version: str,
+                       reader, writer, client_ip: str) -> bool:
+        """Reenvía una petición y su respuesta. Devuelve True si la conexión del cliente sigue abierta."""
+        host = request.get("host", "")
+        route, upstream_target = self.resolve(host, target)
+        has_body = request.chunked or bool(request.content_length)
+        client_keep_alive = version == "HTTP/1.1" and "close" not in request.tokens("connection")
+
+        if route is None:
+            await self._error(writer, 404, keep_alive=client_keep_alive and not has_body)
+            return client_keep_alive and not has_body
+
+        upgrade = "upgrade" in request.tokens("connection") and request.get("upgrade")
+        headers = [(k, v) for k, v in request.headers
+                   if k.lower() not in HOP_BY_HOP and k.lower() not in ("expect", "x-forwarded-prefix")]
+        forwarded_for = request.get("x-forwarded-for")
+        headers = [(k, v) for k, v in headers if k.lower() != "x-forwarded-for"]
+        headers.append(("X-Forwarded-For", f"{forwarded_for}, {client_ip}" if forwarded_for else client_ip))
+        if not request.get("x-forwarded-proto"):
+            headers.append(("X-Forwarded-Proto", "http"))
+        if not request.get("x-forwarded-host") and host:
+            headers.append(("X-Forwarded-Host", host))
+        if route.path:
+            headers.append(("X-Forwarded-Prefix", route.path))
+        if upgrade:
+            headers += [("Connection", "Upgrade"), ("Upgrade", upgrade)]
+        else:
+            headers.append(("Connection", "keep-alive"))
+        upstream_head = self._serialize(f"{method} {upstream_target} HTTP/1.1", headers)
+
+        if "100-continue" in request.tokens("expect"):
+            # El proxy acepta el cuerpo en nombre de la aplicación
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        body = None
+        if has_body and not request.chunked and request.content_length <= RETRY_BODY_LIMIT:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(request.content_length), self.timeout)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return False
+
+        # Una conexión del pool puede haberse cerrado en el otro extremo: si el
+        # cuerpo no se ha enviado en streaming, se reintenta una vez con una conexión
+        # nueva; los cuerpos en streaming no se pueden repetir y usan siempre una nueva
+        retryable = not has_body or body is not None
+        for attempt in range(2):
+            try:
+                up_reader, up_writer, reused = await self.pool.acquire(route.port, fresh=attempt > 0 or not retryable)
+            except (OSError, asyncio.TimeoutError):
+                await self._error(writer, 502, keep_alive=False)
+                return False
+            try:
+                up_writer.write(upstream_head)
+                if body is not None:
+                    up_writer.write(body)
+                elif has_body:
+                    await self._copy_body(reader, up_writer, request)
+                await up_writer.drain()
+                response_head = await asyncio.wait_for(self._read_head(up_reader), self.timeout)
+                if response_head is None:
+                    raise ConnectionResetError("La aplicación cerró la conexión")
+                break
+            except asyncio.TimeoutError:
+                up_writer.close()
+                await self._error(writer, 504, keep_alive=False)
+                return False
+            except ValueError:
+                # Cuerpo chunked mal formado del cliente
+                up_writer.close()
+                await self._error(writer, 400, keep_alive=False)
+                return False
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                up_writer.close()
+                if reused and retryable and attempt == 0:
+                    continue
+                await self._error(writer, 502, keep_alive=False)
+                return False
+
+        try:
+            response = _Message(response_head)
+            status = int(response.start[1])
+            # Respuestas informativas (p. ej. 103 Early Hints) antes de la definitiva
+            while 100 <= status < 200 and status != 101:
+                writer.write(response_head)
+                response_head = await asyncio.wait_for(self._read_head(up_reader), self.timeout)
+                if response_head is None:
+                    raise ConnectionResetError("La aplicación cerró la conexión")
+                response = _Message(response_head)
+                status = int(response.start[1])
+
+            if status == 101 and upgrade:
+                writer.write(response_head)
+                await writer.drain()
+                await self._tunnel(reader, writer, up_reader, up_writer)
+                return False
+
+            no_body = method == "HEAD" or status in (204, 304)
+            framed = no_body or response.chunked or response.content_length is not None
+            upstream_reusable = framed and "close" not in response.tokens("connection")
+            keep_alive = client_keep_alive and framed
+
+            response_headers = [(k, v) for k, v in response.headers if k.lower() not in HOP_BY_HOP]
+            if not keep_alive:
+                response_headers.append(("Connection", "close"))
+            writer.write(self._serialize(" ".join(response.start), response_headers))
+            if not no_body:
+                await self._copy_body(up_reader, writer, response, until_close=not framed)
+            await writer.drain()
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            up_writer.close()
+            return False
+
+        if upstream_reusable:
+            self.pool.release(route.port, up_reader, up_writer)
+        else:
+            up_writer.close()
+        return keep_alive
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> Optional[bytes]:
+        try:
+            return await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise
+
+    async def _copy_body(self, reader, writer, message: _Message, until_close: bool = False):
+        if message.chunked:
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                size_field = line.split(b";", 1)[0].strip()
+                if not _HEX_DIGITS.fullmatch(size_field):
+                    raise ValueError("Tamaño de chunk no válido")
+                size = int(size_field, 16)
+                writer.write(line)
+                if size == 0:
+                    # Trailers opcionales hasta la línea vacía
+                    while True:
+                        trailer = await reader.readuntil(b"\r\n")
+                        writer.write(trailer)
+                        if trailer == b"\r\n":
+                            break
+                    break
+                remaining = size + 2
+                while remaining:
+                    data = await reader.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    writer.write(data)
+                    remaining -= len(data)
+                    await writer.drain()
+        elif message.content_length is not None:
+            remaining = message.content_length
+            while remaining:
+                data = await reader.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                writer.write(data)
+                remaining -= len(data)
+                await writer.drain()
+        elif until_close:
+            while True:
+                data = await reader.read(CHUNK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+
+    async def _tunnel(self, reader, writer, up_reader, up_writer):
+        async def pipe(src, dst):
+            try:
+                while True:
+                    data = await src.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    dst.write(data)
+                    await dst.drain()
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                dst.close()
+
+        await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+
+    def _serialize(self, start_line: str, headers: List[Tuple[str, str]]) -> bytes:
+        lines = [start_line] + [f"{k}: {v}" for k, v in headers]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _error(self, writer, status: int, keep_alive: bool = False):
+        body = f"{status} {REASONS[status]}\n".encode()
+        headers = [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))]
+        if not keep_alive:
+            headers.append(("Connection", "close"))
+        writer.write(self._serialize(f"HTTP/1.1 {status} {REASONS[status]}", headers) + body)
+        await writer.drain()
+
+
+reverse_proxy = ReverseProxy()
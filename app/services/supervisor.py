@@ -0,0 +1,250 @@
+#supervisor.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+import psutil
+from app.configs import load_server_config
+from app.db import SessionLocal
+from app.models import Application
+from app.services.lifecycle import lifecycle_engine
+from app.services.log_sink import log_sink
+from app.services.process_manager import ProcessManager, spawned_processes
+
+logger = logging.getLogger(__name__)
+
+RESTART_POLICIES = ("no", "on-failure", "always")
+
+
+def _exit_code_from_status(status: int) -> Optional[int]:
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return None
+
+
+class _Watch:
+    def __init__(self, app_id: int, pid: int):
+        self.app_id = app_id
+        self.pid = pid
+        self.fd = None
+        self.process = None
+
+
+class Supervisor:
+    """
+    Tarea de larga duración que vigila los procesos de las aplicaciones en ejecución.
+
+    En Linux cada PID se vigila con un pidfd registrado en el event loop, de
+    modo que la salida se notifica al instante sin sondear. En otros sistemas
+    se comprueba con psutil cada `poll_interval` segundos. Al detectar una
+    salida inesperada se registra el código de salida y el uso de recursos y
+    se aplica la política de reinicio con espera exponencial; demasiados
+    reinicios dentro de la ventana configurada se tratan como crash loop.
+    """
+
+    def __init__(self, scan_interval: float = 2.0, poll_interval: float = 1.0):
+        self.scan_interval = scan_interval
+        self.poll_interval = poll_interval
+        self._watches: Dict[int, _Watch] = {}
+        self._restarts: Dict[int, deque] = {}
+        self._pending: Dict[int, asyncio.TimerHandle] = {}
+        self._loop = None
+        self._task = None
+        self._use_pidfd = hasattr(os, "pidfd_open")
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        for pid in list(self._watches):
+            self._unwatch(pid)
+
+    async def _run(self):
+        last_scan = 0.0
+        while True:
+            try:
+                now = time.monotonic()
+                if now - last_scan >= self.scan_interval:
+                    last_scan = now
+                    running = await self._loop.run_in_executor(None, self._load_running)
+                    self._sync_watches(running)
+                if not self._use_pidfd:
+                    self._poll_watches()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el supervisor de procesos")
+            await asyncio.sleep(self.poll_interval if not self._use_pidfd else self.scan_interval)
+
+    def _load_running(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(Application.id, Application.pid).filter(
+                Application.status == "running", Application.pid.isnot(None)
+            ).all()
+            return {pid: app_id for app_id, pid in rows}
+        finally:
+            db.close()
+
+    def _sync_watches(self, running: Dict[int, int]):
+        for pid in list(self._watches):
+            if running.get(pid) != self._watches[pid].app_id:
+                self._unwatch(pid)
+        for pid, app_id in running.items():
+            if pid not in self._watches:
+                self._watch(app_id, pid)
+
+    def _watch(self, app_id: int, pid: int):
+        watch = _Watch(app_id, pid)
+        if self._use_pidfd:
+            try:
+                watch.fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                # Terminó antes de poder vigilarlo
+                self._watches[pid] = watch
+                self._on_exit(watch)
+                return
+            except OSError:
+                # Kernel sin soporte de pidfd: pasar a sondeo
+                self._use_pidfd = False
+        if watch.fd is not None:
+            self._loop.add_reader(watch.fd, self._on_exit, watch)
+        else:
+            try:
+                watch.process = psutil.Process(pid)
+            except psutil.NoSuchProcess:
+                self._watches[pid] = watch
+                self._on_exit(watch)
+                return
+        self._watches[pid] = watch
+
+    def _unwatch(self, pid: int):
+        watch = self._watches.pop(pid, None)
+        if watch is not None and watch.fd is not None:
+            self._loop.remove_reader(watch.fd)
+            os.close(watch.fd)
+
+    def _poll_watches(self):
+        for watch in list(self._watches.values()):
+            try:
+                alive = watch.process.is_running() and watch.process.status() != psutil.STATUS_ZOMBIE
+            except psutil.NoSuchProcess:
+                alive = False
+            if not alive:
+                self._on_exit(watch)
+
+    def _on_exit(self, watch: _Watch):
+        self._unwatch(watch.pid)
+        exit_code, rusage = self._reap(watch.pid)
+        self._loop.create_task(self._handle_exit(watch.app_id, watch.pid, exit_code, rusage))
+
+    def _reap(self, pid: int):
+        """Recoge el estado de salida si el proceso es hijo del panel; si no, se desconoce."""
+        process = spawned_processes.pop(pid, None)
+        if not hasattr(os, "wait4"):
+            return (process.poll() if process is not None else None), None
+        try:
+            reaped_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+        except ChildProcessError:
+            return (process.returncode if process is not None else None), None
+        if reaped_pid == 0:
+            return None, None
+        exit_code = _exit_code_from_status(status)
+        if process is not None:
+            process.returncode = exit_code
+        return exit_code, rusage
+
+    async def _handle_exit(self, app_id: int, pid: int, exit_code, rusage):
+        application = await self._loop.run_in_executor(None, self._record_exit, app_id, pid, exit_code, rusage)
+        if application is None:
+            return
+
+        config = load_server_config()
+        policy = application["restart_policy"] or config.get("restart_policy", "on-failure")
+        if policy == "no" or (policy == "on-failure" and exit_code == 0):
+            return
+
+        history = self._restarts.setdefault(app_id, deque())
+        now = time.monotonic()
+        window = float(config.get("crash_loop_window", 300))
+        while history and now - history[0] > window:
+            history.popleft()
+
+        if len(history) >= int(config.get("crash_loop_max_restarts", 5)):
+            self._log(
+                app_id,
+                f"Crash loop detectado: {len(history)} reinicios en {window:.0f} s. Reinicio automático desactivado hasta el próximo arranque manual",
+                "error"
+            )
+            history.clear()
+            return
+
+        delay = min(
+            float(config.get("restart_backoff_initial", 1)) * (2 ** len(history)),
+            float(config.get("restart_backoff_max", 60))
+        )
+        history.append(now)
+        self._log(app_id, f"Reinicio automático en {delay:.0f} s (política {policy})", "warning")
+
+        previous = self._pending.pop(app_id, None)
+        if previous is not None:
+            previous.cancel()
+        self._pending[app_id] = self._loop.call_later(
+            delay, lambda: self._loop.create_task(self._restart(app_id))
+        )
+
+    async def _restart(self, app_id: int):
+        self._pending.pop(app_id, None)
+        # Si alguien la detuvo o la arrancó mientras tanto, respetar esa decisión
+        should_restart = await self._loop.run_in_executor(None, self._still_crashed, app_id)
+        if should_restart:
+            lifecycle_engine.submit("start", app_id)
+
+    def _record_exit(self, app_id: int, pid: int, exit_code, rusage):
+        db = SessionLocal()
+        try:
+            application = ProcessManager(db).record_exit(app_id, pid, exit_code, rusage)
+            if application is None:
+                return None
+            return {"id": application.id, "restart_policy": application.restart_policy}
+        finally:
+            db.close()
+
+    def _still_crashed(self, app_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            application = db.query(Application).filter(Application.id == app_id).first()
+            if not application or application.status != "error":
+                return False
+            application.restart_count = (application.restart_count or 0) + 1
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def _log(self, app_id: int, message: str, level: str):
+        # Solo encola el registro, se puede llamar desde el event loop
+        log_sink.emit(app_id, message, level)
+        logger.info(f"App {app_id}: {message}")
+
+
+supervisor = Supervisor()
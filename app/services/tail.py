@@ -0,0 +1,454 @@
+#tail.py
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from app.services.log_rotation import segment_path, file_identity
+
+logger = logging.getLogger(__name__)
+
+# Bytes leídos por llamada al seguir un fichero
+READ_SIZE = 256 * 1024
+# Máximo leído de una vez; una ráfaga mayor se procesa en varios tramos cediendo el event loop
+MAX_READ_PER_TICK = 1024 * 1024
+# Las líneas más largas se recortan (también una línea sin salto que no deja de crecer)
+MAX_LINE_LENGTH = 16 * 1024
+# Líneas pendientes por suscriptor antes de descartar las más antiguas
+QUEUE_SIZE = 1000
+# Tamaño máximo aproximado (caracteres) de un frame y espera para agrupar líneas en uno
+FRAME_MAX_SIZE = 64 * 1024
+FRAME_INTERVAL = 0.05
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+def split_incomplete_utf8(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Separa del final de `data` una secuencia UTF-8 incompleta (hasta 3 bytes),
+    para enviar un trozo de línea sin partir un carácter multibyte.
+    """
+    for i in range(1, min(4, len(data)) + 1):
+        byte = data[-i]
+        if byte & 0xC0 == 0x80:
+            # Byte de continuación: el inicio del carácter está más atrás
+            continue
+        size = 1 if byte >= 0xF8 else 4 if byte >= 0xF0 else 3 if byte >= 0xE0 else 2 if byte >= 0xC0 else 1
+        return (data[:-i], data[-i:]) if size > i else (data, b"")
+    return data, b""
+
+
+def _load_libc():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class _Inotify:
+    """
+    Vigila el directorio de un fichero con inotify (sin dependencias, vía libc).
+    Se vigila el directorio y no el fichero para enterarse también de cuándo
+    se crea, se borra o se sustituye al rotarlo.
+    """
+
+    def __init__(self, path: str):
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if _libc.inotify_add_watch(self.fd, os.fsencode(os.path.dirname(path) or "."), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch")
+
+    def changed(self) -> bool:
+        """Consume los eventos pendientes; True si alguno afecta al fichero vigilado."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                if data[offset:offset + length].rstrip(b"\0") == self.name:
+                    changed = True
+                offset += length
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TailSubscription:
+    """
+    Líneas pendientes de enviar a un cliente. La cola está acotada: si el
+    cliente no consume a tiempo se descartan las líneas más antiguas y se
+    cuentan, para avisarle de cuántas se ha saltado en el siguiente frame.
+    Cada línea puede llevar la hora a la que se recibió (captura por pipes)
+    y su posición en el origen, desde la que un cliente puede reanudar.
+    """
+
+    def __init__(self, max_lines: int = QUEUE_SIZE):
+        self.max_lines = max_lines
+        self.skipped = 0
+        self._entries = deque()
+        self._ready = asyncio.Event()
+        self._backlog = False
+
+    def push(self, lines: List[str], timestamps: Optional[List[str]] = None, positions: Optional[list] = None):
+        """`positions`: la posición tras cada línea (p. ej. (fichero, desplazamiento) o número de línea)."""
+        entries = list(zip(
+            timestamps or [None] * len(lines),
+            lines,
+            positions or [None] * len(lines)
+        ))
+        if len(entries) >= self.max_lines:
+            self.skipped += len(self._entries) + len(entries) - self.max_lines
+            self._entries.clear()
+            entries = entries[-self.max_lines:]
+        else:
+            overflow = len(self._entries) + len(entries) - self.max_lines
+            for _ in range(max(0, overflow)):
+                self._entries.popleft()
+            self.skipped += max(0, overflow)
+        self._entries.extend(entries)
+        self._ready.set()
+
+    async def next_batch(self, max_size: int = FRAME_MAX_SIZE,
+                         interval: float = FRAME_INTERVAL) -> Tuple[List[str], Optional[List[str]], int, object]:
+        """
+        Espera a que haya líneas y devuelve (líneas, horas, saltadas, posición)
+        para un frame; `horas` es None si las líneas no llevan hora propia y
+        `posición` es la de la última línea. Tras la primera línea espera
+        `interval` para agrupar las que lleguen en ese tiempo, salvo si ya
+        había atraso del frame anterior.
+        """
+        await self._ready.wait()
+        if interval and not self._backlog:
+            await asyncio.sleep(interval)
+        lines, timestamps, size, position = [], [], 0, None
+        while self._entries and (not lines or size + len(self._entries[0][1]) <= max_size):
+            timestamp, line, position = self._entries.popleft()
+            lines.append(line)
+            timestamps.append(timestamp)
+            size += len(line)
+        skipped, self.skipped = self.skipped, 0
+        self._backlog = bool(self._entries)
+        if not self._entries:
+            self._ready.clear()
+        return lines, (timestamps if any(timestamps) else None), skipped, position
+
+
+class FileTail:
+    """
+    Sigue un fichero de log para todos sus suscriptores: cada trozo nuevo se
+    lee una sola vez en binario y se corta en líneas por el byte de salto, que
+    nunca aparece dentro de un carácter UTF-8 multibyte (ningún carácter
+    queda partido entre dos lecturas). Cada línea se reparte a las colas de
+    los suscriptores con su posición: la identidad del fichero y el
+    desplazamiento en bytes tras ella. Una ráfaga grande se lee en tramos de
+    MAX_READ_PER_TICK para no bloquear el event loop.
+
+    Con inotify se despierta en cuanto el fichero cambia; si no está
+    disponible, o como red de seguridad, comprueba el tamaño cada
+    `poll_interval` segundos.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.5, idle_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.idle_interval = idle_interval
+        self.subscribers = set()
+        self.position = 0
+        self.identity = None
+        self._file = None
+        self._inode = None
+        self._pending = b""
+        self._pending_since = 0.0
+        self._more = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._watch: Optional[_Inotify] = None
+        self._task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._open(at_end=True)
+        self._wakeup = asyncio.Event()
+        if _libc is not None:
+            try:
+                self._watch = _Inotify(self.path)
+                loop.add_reader(self._watch.fd, self._wakeup.set)
+            except (OSError, NotImplementedError) as e:
+                logger.debug(f"inotify no disponible para {self.path}, se usará sondeo: {e}")
+                if self._watch is not None:
+                    self._watch.close()
+                    self._watch = None
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watch is not None:
+            asyncio.get_running_loop().remove_reader(self._watch.fd)
+            self._watch.close()
+            self._watch = None
+        self._close()
+
+    @property
+    def committed(self) -> int:
+        """Desplazamiento tras la última línea repartida; lo que sigue llegará a los suscriptores."""
+        return self.position - len(self._pending)
+
+    def history(self, max_lines: int = 10, max_bytes: int = 2000) -> List[str]:
+        """
+        Últimas líneas anteriores a la posición desde la que se sigue el
+        fichero. Si el log se acaba de rotar y tiene pocas líneas, se
+        completan con el final del segmento anterior.
+        """
+        lines = self._read_lines(self.path, self.committed, max_bytes)
+        if len(lines) < max_lines and self.committed < max_bytes:
+            previous = segment_path(self.path, 1)
+            if previous and not previous.endswith(".gz"):
+                lines = self._read_lines(previous, os.path.getsize(previous), max_bytes) + lines
+        return lines[-max_lines:]
+
+    @staticmethod
+    def _read_lines(path: str, end: int, max_bytes: int) -> List[str]:
+        start = max(0, end - max_bytes)
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+        except OSError:
+            return []
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        if start > 0 and lines:
+            # La primera línea puede estar incompleta
+            lines = lines[1:]
+        return [line for line in lines if line.strip()]
+
+    def _open(self, at_end: bool = False):
+        self._close()
+        try:
+            self._file = open(self.path, "rb")
+        except OSError:
+            return
+        st = os.fstat(self._file.fileno())
+        self._inode = st.st_ino
+        self._update_identity()
+        self.position = st.st_size if at_end else 0
+        self._file.seek(self.position)
+        self._pending = b""
+
+    def _update_identity(self):
+        try:
+            self.identity = file_identity(self.path)
+        except OSError:
+            self.identity = f"{self._inode}-0"
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def _run(self):
+        while True:
+            if self._more:
+                # Queda parte de una ráfaga por leer: ceder el loop y seguir
+                await asyncio.sleep(0)
+            else:
+                # Con inotify solo hace falta despertar por tiempo para la red de
+                # seguridad o para enviar una línea incompleta pendiente
+                interval = self.poll_interval if self._watch is None or self._pending else self.idle_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), interval)
+                    self._wakeup.clear()
+                    if self._watch is not None and not self._watch.changed():
+                        # Evento de otro fichero del directorio (p. ej. stderr.log)
+                        continue
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                self._check()
+            except OSError as e:
+                logger.warning(f"Error al leer {self.path}: {e}")
+
+    def _check(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._file is None or st.st_ino != self._inode:
+            # El fichero se ha creado o sustituido: se lee el nuevo desde el principio
+            self._open()
+            if self._file is None:
+                return
+        elif st.st_size < self.position:
+            lines, positions = self._read_rotated_rest()
+            self._file.seek(0)
+            self.position = 0
+            self._pending = b""
+            self._update_identity()
+            notice = "🔄 Log rotado, continuando con el nuevo archivo..." if lines is not None else \
+                "🔄 Archivo de log truncado, reiniciando lectura..."
+            self._publish((lines or []) + [notice], (positions or []) + [(self.identity, 0)])
+
+        lines, positions = [], []
+        read = 0
+        while read < MAX_READ_PER_TICK:
+            data = self._file.read(READ_SIZE)
+            if not data:
+                break
+            read += len(data)
+            offset = self.committed
+            self.position += len(data)
+            parts = (self._pending + data).split(b"\n")
+            self._pending = parts.pop()
+            for part in parts:
+                offset += len(part) + 1
+                lines.append(part.decode("utf-8", errors="replace"))
+                positions.append((self.identity, offset))
+            if len(self._pending) > MAX_LINE_LENGTH:
+                part, self._pending = split_incomplete_utf8(self._pending)
+                lines.append(part.decode("utf-8", errors="replace"))
+                positions.append((self.identity, self.committed))
+        self._more = read >= MAX_READ_PER_TICK
+        if read:
+            self._pending_since = time.monotonic()
+        elif self._pending and time.monotonic() - self._pending_since >= self.poll_interval:
+            # Una línea sin salto final (p. ej. un prompt) se envía si no llega nada más;
+            # un carácter a medio escribir se queda pendiente
+            part, pending = split_incomplete_utf8(self._pending)
+            if part:
+                self._pending = pending
+                lines.append(part.decode("utf-8", errors="replace"))
+                positions.append((self.identity, self.committed))
+        if lines:
+            self._publish(lines, positions)
+
+    def _read_rotated_rest(self) -> Tuple[Optional[List[str]], Optional[list]]:
+        """
+        Si el truncado se debe a una rotación (copytruncate), lo escrito desde
+        la última lectura está al final del segmento `.1`: se devuelven esas
+        líneas y sus posiciones en el fichero anterior. (None, None) si no hay
+        un segmento reciente que lo contenga.
+        """
+        previous = segment_path(self.path, 1)
+        if previous is None or previous.endswith(".gz"):
+            return None, None
+        try:
+            st = os.stat(previous)
+            if time.time() - st.st_mtime > 60:
+                return None, None
+            if st.st_size <= self.position:
+                # Ya se leyó todo, incluso lo escrito entre la copia y el truncado
+                return [], []
+            with open(previous, "rb") as f:
+                f.seek(self.position)
+                data = f.read()
+        except OSError:
+            return None, None
+        end = self.position + len(data)
+        offset = self.committed
+        lines, positions = [], []
+        for part in (self._pending + data).split(b"\n"):
+            offset = min(offset + len(part) + 1, end)
+            lines.append(part.decode("utf-8", errors="replace"))
+            positions.append((self.identity, offset))
+        return lines, positions
+
+    def _publish(self, lines: List[str], positions: list):
+        kept, kept_positions = [], []
+        for line, position in zip(lines, positions):
+            line = line.rstrip("\r")
+            if not line.strip():
+                continue
+            if len(line) > MAX_LINE_LENGTH:
+                line = f"{line[:MAX_LINE_LENGTH]} … (+{len(line) - MAX_LINE_LENGTH} caracteres)"
+            kept.append(line)
+            kept_positions.append(position)
+        if not kept:
+            return
+        for subscription in self.subscribers:
+            subscription.push(kept, positions=kept_positions)
+
+
+class TailHub:
+    """
+    Un único FileTail por fichero, compartido por todos los websockets que lo
+    siguen. El seguimiento empieza con el primer suscriptor y se detiene al
+    irse el último.
+    """
+
+    def __init__(self):
+        self._tails: Dict[str, FileTail] = {}
+
+    def subscribe(self, path: str) -> TailSubscription:
+        """Suscripción que recibe cada línea nueva del fichero."""
+        path = os.path.realpath(path)
+        tail = self._tails.get(path)
+        if tail is None:
+            tail = FileTail(path)
+            tail.start()
+            self._tails[path] = tail
+        subscription = TailSubscription()
+        tail.subscribers.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, path: str, subscription: TailSubscription):
+        path = os.path.realpath(path)
+        tail = self._tails.get(path)
+        if tail is None:
+            return
+        tail.subscribers.discard(subscription)
+        if not tail.subscribers:
+            del self._tails[path]
+            await tail.stop()
+
+    def history(self, path: str, max_lines: int = 10) -> List[str]:
+        tail = self._tails.get(os.path.realpath(path))
+        return tail.history(max_lines) if tail is not None else []
+
+    def position(self, path: str) -> Optional[Tuple[str, int]]:
+        """
+        (identidad, desplazamiento) a partir del cual los suscriptores
+        recibirán las líneas nuevas; lo anterior se puede leer del fichero.
+        """
+        tail = self._tails.get(os.path.realpath(path))
+        if tail is None or tail.identity is None:
+            return None
+        return tail.identity, tail.committed
+
+
+tail_hub = TailHub()
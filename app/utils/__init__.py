@@ -1 +1 @@
-from .utils import get_local_ip, find_available_port, check_port_available, is_port_assigned_in_db, detect_environments, tail_file
\ No newline at end of file
+from .utils import get_local_ip, find_available_port, check_port_available, wait_until_ready, is_port_assigned_in_db, detect_environments, run_command
\ No newline at end of file
@@ -1,14 +1,15 @@
+import asyncio
 import socket
 from app.models import Application
+from app.configs import load_server_config
 from sqlalchemy.orm import Session
 from contextlib import closing
 import sys
 import os
 import subprocess
 import json
-from fastapi import WebSocket, WebSocketDisconnect
-import datetime
-import asyncio
+import time
+import http.client
 
 
 def get_local_ip():
@@ -27,6 +28,75 @@ def check_port_available(port):
     with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
         return sock.connect_ex(('localhost', port)) != 0
 
+def wait_until_ready(process, port, health_path=None, timeout=30.0, host="127.0.0.1"):
+    """
+    Espera a que un proceso recién lanzado acepte conexiones en `port`.
+
+    Sondea con TCP connect (y, si se indica `health_path`, con una petición
+    HTTP GET que no devuelva 5xx) con espera exponencial entre intentos.
+    Devuelve (listo, milisegundos transcurridos, motivo del fallo).
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = 0.05
+
+    while True:
+        returncode = process.poll()
+        if returncode is not None:
+            return False, (time.monotonic() - start) * 1000, f"el proceso terminó con código {returncode}"
+
+        try:
+            with closing(socket.create_connection((host, port), timeout=1.0)):
+                pass
+            connected = True
+        except OSError:
+            connected = False
+
+        if connected:
+            if not health_path:
+                return True, (time.monotonic() - start) * 1000, None
+            try:
+                conn = http.client.HTTPConnection(host, port, timeout=2.0)
+                try:
+                    conn.request("GET", health_path)
+                    status_code = conn.getresponse().status
+                finally:
+                    conn.close()
+                if status_code < 500:
+                    return True, (time.monotonic() - start) * 1000, None
+            except (OSError, http.client.HTTPException):
+                pass
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, (time.monotonic() - start) * 1000, f"no respondió en {timeout:.0f} s"
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+async def run_command(args, cwd=None, env=None, timeout=120.0):
+    """
+    Ejecuta un comando sin bloquear el event loop y devuelve (código de
+    salida, stdout, stderr) como texto. Si no termina en `timeout` segundos se
+    mata y se lanza TimeoutError.
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except NotImplementedError:
+        # Event loop sin soporte de subprocesos (SelectorEventLoop en Windows): usar un hilo
+        result = await asyncio.get_running_loop().run_in_executor(None, lambda: subprocess.run(
+            args, cwd=cwd, env=env, capture_output=True, text=True, timeout=timeout
+        ))
+        return result.returncode, result.stdout, result.stderr
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise TimeoutError(f"{args[0]} no terminó en {timeout:g} s")
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
 def is_port_assigned_in_db(db: Session, port: int, exclude_app_id: int = None):
     """
     Verifica si un puerto ya está asignado a alguna aplicación en la base de datos,
@@ -39,18 +109,22 @@ def is_port_assigned_in_db(db: Session, port: int, exclude_app_id: int = None):
     
     return query.count() > 0
 
-def find_available_port(db: Session, start_port=8000, end_port=9000, exclude_app_id: int = None):
+def find_available_port(db: Session, start_port=None, end_port=None, exclude_app_id: int = None):
     """
     Encuentra un puerto disponible que no esté en uso en el sistema
     y que no esté asignado a ninguna otra aplicación en la base de datos.
+    Sin rango explícito se usa el configurado en server_config.json.
     """
-    for port in range(start_port, end_port):
-        # Verificar si el puerto está disponible a nivel del sistema
-        if check_port_available(port):
-            # Verificar si el puerto ya está asignado en la base de datos
-            if not is_port_assigned_in_db(db, port, exclude_app_id):
-                return port
-    return None
+    from app.services.port_allocator import port_allocator, PortAllocator
+
+    allocator = port_allocator
+    if start_port is not None or end_port is not None:
+        config = load_server_config()
+        allocator = PortAllocator(
+            start_port if start_port is not None else config["port_range_start"],
+            end_port if end_port is not None else config["port_range_end"]
+        )
+    return allocator.allocate(db, exclude_app_id=exclude_app_id, app_id=exclude_app_id)
 
 def detect_environments(project_directory=None):
     """
@@ -131,121 +205,3 @@ def detect_environments(project_directory=None):
         pass  # Conda no está instalado o no se encuentra
         
     return environments
-
-async def tail_file(websocket: WebSocket, file_path: str, interval: float = 0.5):
-    """
-    Lee continuamente las nuevas líneas del archivo y las envía por WebSocket.
-    Versión mejorada con depuración.
-    """
-    print(f"⏳ Iniciando tail_file para {file_path}")
-    position = 0
-    
-    try:
-        # Enviar mensaje inicial para confirmar conexión
-        await websocket.send_json({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "line": "✓ Conexión establecida, monitoreando logs..."
-        })
-        
-        # Verificar si el archivo existe y establecer posición inicial
-        if os.path.exists(file_path):
-            position = os.path.getsize(file_path)
-            print(f"📄 Archivo encontrado, tamaño inicial: {position} bytes")
-            
-            # Enviar algunas líneas iniciales para verificar que funciona
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    # Leer las últimas 10 líneas aproximadamente
-                    last_pos = max(0, position - 2000)  # Leer ~2KB del final
-                    f.seek(last_pos)
-                    # Descartar la primera línea que podría estar incompleta
-                    if last_pos > 0:
-                        f.readline()
-                    # Obtener las últimas líneas
-                    last_lines = f.readlines()[-10:]
-                    
-                    for line in last_lines:
-                        line = line.rstrip('\n')
-                        if line:
-                            await websocket.send_json({
-                                "timestamp": datetime.datetime.utcnow().isoformat(),
-                                "line": f"[Histórico] {line}"
-                            })
-                    
-                    # Actualizar posición después de leer histórico
-                    position = os.path.getsize(file_path)
-            except Exception as e:
-                print(f"⚠️ Error al leer líneas históricas: {e}")
-        else:
-            print(f"⚠️ Archivo no existe: {file_path}")
-            await websocket.send_json({
-                "timestamp": datetime.datetime.utcnow().isoformat(),
-                "line": f"⚠️ El archivo de log no existe todavía: {os.path.basename(file_path)}"
-            })
-        
-        # Bucle principal de monitoreo
-        while True:
-            if os.path.exists(file_path):
-                try:
-                    current_size = os.path.getsize(file_path)
-                    
-                    # Si el archivo fue truncado
-                    if current_size < position:
-                        position = 0
-                        print(f"🔄 Archivo truncado, reiniciando desde el principio")
-                        await websocket.send_json({
-                            "timestamp": datetime.datetime.utcnow().isoformat(),
-                            "line": "🔄 Archivo de log truncado, reiniciando lectura..."
-                        })
-                    
-                    # Si hay nuevos datos
-                    if current_size > position:
-                        print(f"📝 Nuevos datos detectados: {current_size - position} bytes")
-                        
-                        # Leer usando open() estándar para evitar problemas con aiofiles
-                        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                            f.seek(position)
-                            new_content = f.read(current_size - position)
-                        
-                        # Actualizar posición
-                        position = current_size
-                        
-                        # Procesar y enviar líneas
-                        lines = new_content.splitlines()
-                        if lines:
-                            print(f"📤 Enviando {len(lines)} líneas")
-                            
-                            for line in lines:
-                                if line.strip():
-                                    try:
-                                        await websocket.send_json({
-                                            "timestamp": datetime.datetime.utcnow().isoformat(),
-                                            "line": line
-                                        })
-                                    except Exception as e:
-                                        print(f"❌ Error al enviar: {str(e)}")
-                                        raise
-                except Exception as e:
-                    print(f"❌ Error procesando archivo: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    
-                    await websocket.send_json({
-                        "timestamp": datetime.datetime.utcnow().isoformat(),
-                        "line": f"❌ Error al leer el log: {str(e)}"
-                    })
-            
-            # Esperar antes de la siguiente verificación
-            await asyncio.sleep(interval)
-            
-    except WebSocketDisconnect:
-        print("👋 Cliente WebSocket desconectado")
-    except Exception as e:
-        print(f"💥 Error fatal en tail_file: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        try:
-            await websocket.close(code=1011, reason=str(e))
-        except:
-            pass
\ No newline at end of file
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Write throughput of the panel database with the previous SQLite setup
+(rollback journal, 20+20 connection pool) and the current one (WAL,
+pragmas, read pool plus a single writer connection).
+
+Worker threads commit status updates and single log inserts as the panel
+routes and lifecycle jobs do, while reader threads page through the logs.
+Each setup runs on a fresh database in a temporary directory.
+
+    python benchmarks/db_bench.py --writers 8 --readers 4 --duration 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.db.db import Base, RoutingSession, create_sqlite_engine, READ_POOL_SIZE, READ_POOL_OVERFLOW  # noqa: E402
+from app.models import Application, Log  # noqa: E402
+
+APPS = 20
+
+
+def legacy_sessions(url):
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=sqlalchemy.pool.QueuePool,
+        pool_size=20,
+        max_overflow=20,
+        pool_timeout=60,
+        pool_recycle=3600
+    )
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def tuned_sessions(url):
+    reader = create_sqlite_engine(url, pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_OVERFLOW)
+    writer = create_sqlite_engine(url, pool_size=1, max_overflow=0)
+    return reader, sessionmaker(class_=RoutingSession, reader=reader, writer=writer, autocommit=False, autoflush=False)
+
+
+def writer_loop(Session, deadline, stats, lock):
+    rng = random.Random()
+    ops, errors, latencies = {"status": 0, "log": 0}, 0, []
+    while time.perf_counter() < deadline:
+        kind = "status" if rng.random() < 0.5 else "log"
+        app_id = rng.randint(1, APPS)
+        started = time.perf_counter()
+        db = Session()
+        try:
+            if kind == "status":
+                application = db.query(Application).filter(Application.id == app_id).first()
+                application.status = rng.choice(("running", "stopped"))
+            else:
+                db.add(Log(application_id=app_id, message="Aplicación iniciada en el puerto 8000", level="info"))
+            db.commit()
+            ops[kind] += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            # "database is locked"
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    with lock:
+        for kind, count in ops.items():
+            stats[kind] += count
+        stats["errors"] += errors
+        stats["latencies"].extend(latencies)
+
+
+def reader_loop(Session, deadline, stats, lock):
+    rng = random.Random()
+    reads = 0
+    while time.perf_counter() < deadline:
+        db = Session()
+        try:
+            db.query(Log).filter(Log.application_id == rng.randint(1, APPS)) \
+                .order_by(Log.timestamp.desc(), Log.id.desc()).limit(50).all()
+            reads += 1
+        except OperationalError:
+            with lock:
+                stats["read_errors"] += 1
+        finally:
+            db.close()
+    with lock:
+        stats["reads"] += reads
+
+
+def run(label, factory, writers, readers, duration):
+    with tempfile.TemporaryDirectory() as directory:
+        engine, Session = factory(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        db = Session()
+        for i in range(APPS):
+            db.add(Application(name=f"app{i}", directory=directory, main_file="main.py", app_type="fastapi", port=8000 + i))
+        db.commit()
+        db.close()
+
+        stats = {"status": 0, "log": 0, "errors": 0, "reads": 0, "read_errors": 0, "latencies": []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=writer_loop, args=(Session, deadline, stats, lock)) for _ in range(writers)]
+        threads += [threading.Thread(target=reader_loop, args=(Session, deadline, stats, lock)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    ms = sorted(value * 1000 for value in stats["latencies"])
+
+    def pct(p):
+        return ms[min(len(ms) - 1, int(len(ms) * p))] if ms else float("nan")
+
+    print(
+        f"{label:<7} status {stats['status'] / duration:>7.0f}/s   log {stats['log'] / duration:>7.0f}/s   "
+        f"reads {stats['reads'] / duration:>7.0f}/s   p50 {pct(0.50):7.2f} ms   p99 {pct(0.99):8.2f} ms   "
+        f"locked {stats['errors'] + stats['read_errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the previous and current SQLite setup of the panel")
+    parser.add_argument("--writers", type=int, default=8, help="Threads committing status updates and log inserts")
+    parser.add_argument("--readers", type=int, default=4, help="Threads paging through the logs")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer threads, {args.readers} reader threads, {args.duration:.0f} s per setup")
+    run("before", legacy_sessions, args.writers, args.readers, args.duration)
+    run("after", tuned_sessions, args.writers, args.readers, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Throughput and latency of an application reached directly and through the
+built-in reverse proxy.
+
+Each client keeps one HTTP/1.1 keep-alive connection open and sends GET
+requests back to back for the given duration. Only the standard library is
+used, so the same client runs against both targets.
+
+    python benchmarks/proxy_bench.py --direct-port 8000 --proxy-port 7070 --path /myapp/
+    python benchmarks/proxy_bench.py --direct-port 8000 --proxy-port 7070 --host-header myapp.local
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors.append(1)
+        return
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            if not head.startswith(b"HTTP/1.1 2"):
+                errors.append(1)
+            latencies.append(time.perf_counter() - started)
+    except (OSError, asyncio.IncompleteReadError):
+        errors.append(1)
+    finally:
+        writer.close()
+
+
+async def run(label, host, port, path, host_header, concurrency, duration):
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {host_header or f'{host}:{port}'}\r\n"
+        "User-Agent: atlasserver-bench\r\n\r\n"
+    ).encode()
+    latencies, errors = [], []
+    # Calentamiento para abrir conexiones y llenar el pool del proxy
+    await asyncio.gather(*(client(host, port, request, time.perf_counter() + 1, [], []) for _ in range(concurrency)))
+
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)))
+
+    if not latencies:
+        print(f"{label:<8} no successful requests ({len(errors)} errors)")
+        return
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+
+    def pct(p):
+        return ms[min(len(ms) - 1, int(len(ms) * p))]
+
+    print(
+        f"{label:<8} {len(ms) / duration:>9.0f} req/s   "
+        f"p50 {pct(0.50):6.2f} ms   p90 {pct(0.90):6.2f} ms   p99 {pct(0.99):6.2f} ms   "
+        f"mean {statistics.mean(ms):6.2f} ms   errors {len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct access with the AtlasServer reverse proxy")
+    parser.add_argument("--host", dest="target", default="127.0.0.1", help="Address of the panel machine")
+    parser.add_argument("--direct-port", type=int, required=True, help="Port the application listens on")
+    parser.add_argument("--proxy-port", type=int, default=7070, help="Port of the reverse proxy")
+    parser.add_argument("--path", default=None, help="Proxy path prefix of the application, e.g. /myapp/")
+    parser.add_argument("--host-header", default=None, help="Proxy host name of the application")
+    parser.add_argument("--app-path", default="/", help="Path requested on the application itself")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    proxy_path = (args.path.rstrip("/") + args.app_path) if args.path else args.app_path
+    print(f"{args.concurrency} keep-alive clients, {args.duration:.0f} s per target")
+    asyncio.run(run("direct", args.target, args.direct_port, args.app_path, None, args.concurrency, args.duration))
+    asyncio.run(run("proxy", args.target, args.proxy_port, proxy_path, args.host_header, args.concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    main()